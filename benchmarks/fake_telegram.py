@@ -0,0 +1,133 @@
+"""
+Локальный поддельный Telegram для сквозных прогонов.
+
+• отвечает на вызовы Bot API (/bot<token>/<method>) и записывает их
+  (timeline — с моментом прихода, time.perf_counter());
+• отдаёт апдейты из queue_updates() через getUpdates (long polling);
+• умеет постить апдейты на вебхук бота, замеряя время до ответа 200.
+
+Бот направляется сюда через AiohttpSession(api=TelegramAPIServer.from_base(...)).
+"""
+import asyncio
+import itertools
+import json
+import socket
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiohttp
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiohttp import web
+
+from benchmarks.fakes import BOT_TOKEN, BOT_USER
+
+_MESSAGE_METHODS = {"sendmessage", "editmessagetext", "editmessagereplymarkup"}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class FakeTelegram:
+    """Bot API-сервер на 127.0.0.1: записывает вызовы, отвечает через latency секунд."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self.requests: List[Tuple[str, Dict[str, Any]]] = []
+        self.timeline: List[Tuple[float, str, Dict[str, Any]]] = []
+        self.updates: List[Dict[str, Any]] = []
+        self._updates_arrived = asyncio.Event()
+        self.port = free_port()
+        self._ids = itertools.count(1)
+        self._runner: Optional[web.AppRunner] = None
+        self._client: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def make_bot(self) -> Bot:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(self.base_url))
+        return Bot(token=BOT_TOKEN, session=session)
+
+    def queue_updates(self, *updates: Dict[str, Any]) -> None:
+        """Апдейты для ближайшего getUpdates."""
+        self.updates += updates
+        self._updates_arrived.set()
+
+    def first_call(self, method: str, **params: str) -> Optional[float]:
+        """Момент первого вызова method (с такими значениями параметров) или None."""
+        for t, m, p in self.timeline:
+            if m == method and all(p.get(k) == v for k, v in params.items()):
+                return t
+        return None
+
+    def sent_to(self, chat_id: int, method: str = "sendmessage") -> List[Dict[str, Any]]:
+        return [p for m, p in self.requests if m == method and str(p.get("chat_id")) == str(chat_id)]
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self._api)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, "127.0.0.1", self.port).start()
+        self._client = aiohttp.ClientSession()
+
+    async def stop(self) -> None:
+        if self._client is not None:
+            await self._client.close()
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def _api(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"].lower()
+        params = dict(await request.post())
+        self.calls[method] += 1
+        self.requests.append((method, params))
+        self.timeline.append((time.perf_counter(), method, params))
+        if method == "getupdates":
+            return web.json_response({"ok": True, "result": await self._get_updates(params)})
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return web.json_response({"ok": True, "result": self._result(method, params)})
+
+    async def _get_updates(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        offset = int(params.get("offset") or 0)
+        self.updates = [u for u in self.updates if u["update_id"] >= offset]  # offset подтверждает прежние
+        if not self.updates:
+            self._updates_arrived.clear()
+            try:  # long polling, но не дольше секунды — чтобы бот быстро останавливался
+                await asyncio.wait_for(self._updates_arrived.wait(), min(float(params.get("timeout") or 0), 1.0))
+            except asyncio.TimeoutError:
+                pass
+        return self.updates
+
+    def _result(self, method: str, params: Dict[str, Any]) -> Any:
+        if method == "getme":
+            return BOT_USER.model_dump(exclude_none=True)
+        if method in _MESSAGE_METHODS:
+            chat_id = int(params.get("chat_id") or 0)
+            return {
+                "message_id": next(self._ids),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": BOT_USER.model_dump(exclude_none=True),
+                "text": params.get("text", ""),
+            }
+        return True
+
+    async def post_update(self, url: str, update: Dict[str, Any], secret: Optional[str]) -> Tuple[int, float]:
+        """Отправляет апдейт на вебхук как Telegram; возвращает (статус, секунды до ответа)."""
+        headers = {"Content-Type": "application/json"}
+        if secret:
+            headers["X-Telegram-Bot-Api-Secret-Token"] = secret
+        start = time.perf_counter()
+        async with self._client.post(url, data=json.dumps(update), headers=headers) as resp:
+            await resp.read()
+            return resp.status, time.perf_counter() - start
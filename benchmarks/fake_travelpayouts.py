@@ -0,0 +1,136 @@
+"""
+Локальный поддельный Travelpayouts (Data API) для сквозных прогонов.
+
+Отвечает на /aviasales/v3/prices_for_dates и /v2/prices/month-matrix
+детерминированными ценами, зависящими от маршрута и даты, через delay
+секунд; считает запросы по эндпоинтам. /data/ru/cities.json — справочник
+городов (cities) с ETag / Last-Modified и ответом 304 на ревалидацию;
+cities_status — подменить ответ ошибкой (500, 429 …).
+Бот направляется сюда через config.TRAVELPAYOUTS_API_URL = base_url и
+config.TRAVELPAYOUTS_DATA_URL = cities_url.
+"""
+import asyncio
+import calendar
+import json
+import zlib
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+from benchmarks.fake_telegram import free_port
+
+
+def fake_price(origin: str, destination: str, day: str) -> int:
+    """Стабильная «цена» маршрута на дату: 900 000 … 4 900 000."""
+    return 900_000 + zlib.crc32(f"{origin}{destination}{day}".encode()) % 4_000_000 // 1000 * 1000
+
+
+class FakeTravelpayouts:
+    """
+    Data API-сервер на 127.0.0.1; no_price — маршруты «откуда+куда», для
+    которых цен нет, malformed — маршруты, где в ответе битые строки (без
+    цены, не словарь, мусор в дате) вперемешку с целыми в календаре.
+    """
+
+    def __init__(self, delay: float = 0.0, no_price: tuple = (), malformed: tuple = ()):
+        self.delay = delay
+        self.no_price = set(no_price)
+        self.malformed = set(malformed)
+        self.calls: Counter = Counter()
+        self.requests: List[Dict[str, Any]] = []
+        self.cities: List[dict] = []
+        self.cities_status = 200
+        self.cities_modified = "Wed, 01 Jan 2025 00:00:00 GMT"
+        self.cities_headers: List[Dict[str, str]] = []  # заголовки запросов справочника
+        self.port = free_port()
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    @property
+    def cities_url(self) -> str:
+        return f"{self.base_url}/data/ru/cities.json"
+
+    @property
+    def cities_etag(self) -> str:
+        return f'"{zlib.crc32(json.dumps(self.cities).encode()):08x}"'
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_get("/aviasales/v3/prices_for_dates", self._prices_for_dates)
+        app.router.add_get("/v2/prices/month-matrix", self._month_matrix)
+        app.router.add_get("/data/ru/cities.json", self._cities)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, "127.0.0.1", self.port).start()
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def _cities(self, request: web.Request) -> web.Response:
+        self.calls["cities"] += 1
+        self.cities_headers.append(dict(request.headers))
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.cities_status != 200:
+            return web.json_response({"error": "unavailable"}, status=self.cities_status)
+        validators = {"ETag": self.cities_etag, "Last-Modified": self.cities_modified}
+        if request.headers.get("If-None-Match") == self.cities_etag:
+            return web.Response(status=304, headers=validators)
+        return web.json_response(self.cities, headers=validators)
+
+    async def _prices_for_dates(self, request: web.Request) -> web.Response:
+        q = request.query
+        self.calls["prices_for_dates"] += 1
+        self.requests.append(dict(q))
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if not request.headers.get("X-Access-Token"):
+            return web.json_response({"success": False, "error": "Unauthorized"}, status=401)
+        origin, destination, day = q["origin"], q["destination"], q["departure_at"]
+        data: List[Any] = []
+        if origin + destination in self.malformed:
+            data += [{"origin": origin, "destination": destination, "airline": "HY"}, "HY", {"price": "n/a"}]
+        elif origin + destination not in self.no_price:
+            data.append({
+                "origin": origin,
+                "destination": destination,
+                "price": fake_price(origin, destination, day),
+                "airline": "HY",
+                "transfers": 0,
+                "departure_at": f"{day}T08:15:00+05:00",
+                "return_at": f"{q['return_at']}T19:40:00+05:00" if q.get("return_at") else "",
+            })
+        return web.json_response({"success": True, "data": data, "currency": q.get("currency", "usd")})
+
+    async def _month_matrix(self, request: web.Request) -> web.Response:
+        q = request.query
+        self.calls["month_matrix"] += 1
+        self.requests.append(dict(q))
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if not request.headers.get("X-Access-Token"):
+            return web.json_response({"success": False, "error": "Unauthorized"}, status=401)
+        origin, destination = q["origin"], q["destination"]
+        year, month = int(q["month"][:4]), int(q["month"][5:7])
+        data = []
+        if origin + destination not in self.no_price:
+            for d in range(1, calendar.monthrange(year, month)[1] + 1):
+                day = f"{year}-{month:02d}-{d:02d}"
+                if zlib.crc32(day.encode()) % 4 == 0:
+                    continue  # по части дней поисков не было — цены нет
+                data.append({
+                    "origin": origin,
+                    "destination": destination,
+                    "depart_date": day,
+                    "value": fake_price(origin, destination, day),
+                    "number_of_changes": 0,
+                })
+        if origin + destination in self.malformed:
+            data += [{"depart_date": f"{year}-{month:02d}-03"}, {"depart_date": f"{year}-{month:02d}-xx", "value": 1},
+                     {"depart_date": None, "value": 1}, ["2030-01-01", 1]]
+        return web.json_response({"success": True, "data": data, "currency": q.get("currency", "usd")})
@@ -0,0 +1,158 @@
+"""
+Подделки для бенчмарков: сессия Bot API без сети и фабрики апдейтов.
+
+FakeSession отвечает на методы Bot API правдоподобными объектами и
+считает вызовы; апдейты подаются в dp.feed_raw_update как словари,
+поэтому объекты привязаны к боту так же, как при реальном polling.
+"""
+import asyncio
+import itertools
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import TelegramMethod
+from aiogram.types import Chat, Message, User
+
+BOT_USER = User(id=1, is_bot=True, first_name="bot", username="tickets_test_bot")
+BOT_TOKEN = "1:TEST"
+
+# методы, которые возвращают Message; остальные отвечают True
+_MESSAGE_METHODS = {"SendMessage", "EditMessageText", "EditMessageReplyMarkup"}
+
+
+class FakeSession(BaseSession):
+    """Сессия без сети: фиксирует вызовы и отвечает сразу (или через latency секунд)."""
+
+    def __init__(self, latency: float = 0.0, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self.log: List[TelegramMethod] = []
+        self.keep_log = False
+        self._ids = itertools.count(1000)
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None) -> Any:
+        name = type(method).__name__
+        self.calls[name] += 1
+        if self.keep_log:
+            self.log.append(method)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if name == "GetMe":
+            return BOT_USER
+        if name in _MESSAGE_METHODS:
+            chat_id = getattr(method, "chat_id", None) or 0
+            return Message(
+                message_id=next(self._ids),
+                date=int(time.time()),
+                chat=Chat(id=chat_id, type="private"),
+                from_user=BOT_USER,
+                text=getattr(method, "text", None),
+            )
+        return True
+
+    async def stream_content(self, *args: Any, **kwargs: Any):  # pragma: no cover - не нужен
+        raise NotImplementedError
+        yield b""
+
+    async def close(self) -> None:
+        pass
+
+
+def redirect_logs(tmp: Path) -> None:
+    """Журналы кликов/действий (и миграция старого массива) — во временную папку, а не в data/."""
+    from handlers import user_flow
+    from utils import logger as action_log
+
+    user_flow.FLOW_LOG.path = tmp / "user_logs.json"
+    action_log.LEGACY_LOGS_PATH = tmp / "user_logs.json"
+    action_log.ACTIONS_PATH = action_log.ACTIONS_LOG.path = tmp / "user_actions.jsonl"
+
+
+def isolate_lookup(tmp: Path, max_aliases: int = 5000) -> None:
+    """
+    Поиск городов без побочных эффектов: алиасы — в хранилище во временной
+    папке, справочник API — «загружен и пуст» (промах без сети и диска).
+    """
+    from utils import localization, remote_cities
+    from utils.aliases import AliasStore
+
+    localization._ALIASES = AliasStore(tmp / "user_aliases.json", max_size=max_aliases, delay=3600)
+    remote_cities.CACHE_PATH = tmp / "cities_remote.json"
+    remote_cities._index, remote_cities._meta = {}, {"fetched_at": time.time()}
+
+
+def no_prices() -> None:
+    """Экран проверки без превью цены — прогоны не ходят в настоящий Travelpayouts."""
+    import config
+
+    config.PRICES_PREVIEW = False
+
+
+def make_bot(latency: float = 0.0) -> Bot:
+    return Bot(token=BOT_TOKEN, session=FakeSession(latency=latency))
+
+
+class Updates:
+    """Фабрика сырых апдейтов с растущими update_id / message_id."""
+
+    def __init__(self) -> None:
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+
+    @staticmethod
+    def _user(user_id: int) -> Dict[str, Any]:
+        return {"id": user_id, "is_bot": False, "first_name": f"user{user_id}", "language_code": "ru"}
+
+    def _message(self, user_id: int, text: str, from_bot: bool = False,
+                 message_id: Optional[int] = None) -> Dict[str, Any]:
+        return {
+            "message_id": message_id or next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": BOT_USER.model_dump(exclude_none=True) if from_bot else self._user(user_id),
+            "text": text,
+        }
+
+    def message(self, user_id: int, text: str) -> Dict[str, Any]:
+        return {"update_id": next(self._update_ids), "message": self._message(user_id, text)}
+
+    def callback(self, user_id: int, data: str, message_id: Optional[int] = None) -> Dict[str, Any]:
+        """Нажатие кнопки; message_id — под тем же сообщением, что и прошлые нажатия."""
+        return {
+            "update_id": next(self._update_ids),
+            "callback_query": {
+                "id": str(next(self._update_ids)),
+                "from": self._user(user_id),
+                "chat_instance": str(user_id),
+                "data": data,
+                "message": self._message(user_id, "…", from_bot=True, message_id=message_id),
+            },
+        }
+
+
+def search_flow(updates: Updates, user_id: int, year: int, origin: str = "Ташкент",
+                destination: str = "Москва", month: int = 6) -> List[Dict[str, Any]]:
+    """Полный сценарий поиска: /start → язык → города → даты → пассажиры → ссылка."""
+    from keyboards.callbacks import ConfirmCb, DayCb, LangCb, MonthCb, PaxCb, YearCb
+
+    return [
+        updates.message(user_id, "/start"),
+        updates.callback(user_id, LangCb(lang="ru").pack()),
+        updates.message(user_id, origin),
+        updates.message(user_id, destination),
+        updates.callback(user_id, YearCb(year=year).pack()),
+        updates.callback(user_id, MonthCb(year=year, month=month).pack()),
+        updates.callback(user_id, DayCb(year=year, month=month, day=14).pack()),
+        updates.callback(user_id, YearCb(year=year, ret=True).pack()),
+        updates.callback(user_id, MonthCb(year=year, month=month, ret=True).pack()),
+        updates.callback(user_id, DayCb(year=year, month=month, day=21, ret=True).pack()),
+        updates.callback(user_id, PaxCb(kind="a", delta=1).pack()),
+        updates.callback(user_id, PaxCb(kind="c", delta=1).pack()),
+        updates.callback(user_id, PaxCb(kind="ok").pack()),
+        updates.callback(user_id, ConfirmCb().pack()),
+    ]
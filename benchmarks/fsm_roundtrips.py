@@ -0,0 +1,119 @@
+"""
+Сколько обращений к FSM-хранилищу делает полный сценарий поиска.
+
+Сценарий из benchmarks.fakes.search_flow прогоняется через настоящий
+Dispatcher (make_dispatcher из bot.py) с поддельной сессией Bot API;
+хранилище обёрнуто счётчиком. Сравниваются режимы без буфера
+(каждый update_data = get_data + set_data) и со StateBufferMiddleware.
+Запуск:  python -m benchmarks.fsm_roundtrips
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+from collections import Counter
+from datetime import date
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from aiogram import Dispatcher
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from bot import make_dispatcher
+from benchmarks.fakes import Updates, make_bot, no_prices, redirect_logs, search_flow
+from handlers.middlewares import StateBufferMiddleware
+from utils.fsm_storage import SQLiteStorage
+
+
+class CountingStorage(BaseStorage):
+    """Обёртка над хранилищем, считающая обращения по методам."""
+
+    def __init__(self, inner: BaseStorage):
+        self.inner = inner
+        self.calls: Counter = Counter()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        self.calls["set_state"] += 1
+        await self.inner.set_state(key, state)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        self.calls["get_state"] += 1
+        return await self.inner.get_state(key)
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        self.calls["set_data"] += 1
+        await self.inner.set_data(key, data)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        self.calls["get_data"] += 1
+        return await self.inner.get_data(key)
+
+    async def close(self) -> None:
+        await self.inner.close()
+
+    def __getattr__(self, name: str) -> Any:
+        # set_record и прочие расширения — только если они есть у inner
+        attr = getattr(self.inner, name)
+
+        async def counted(*args: Any, **kwargs: Any) -> Any:
+            self.calls[name] += 1
+            return await attr(*args, **kwargs)
+
+        return counted
+
+
+async def run(dp: Dispatcher, storage: BaseStorage, buffered: bool, users: int) -> Dict[str, Any]:
+    counting = CountingStorage(storage)
+    dp.fsm.storage = counting  # роутер подключается к диспетчеру один раз, меняем только хранилище
+    for observer in (dp.message, dp.callback_query):
+        for mw in observer.middleware:
+            if isinstance(mw, StateBufferMiddleware):
+                mw.enabled = buffered
+    bot = make_bot()
+    updates = Updates()
+    year = date.today().year + 1
+    flows = [search_flow(updates, 10_000 + u, year) for u in range(users)]
+    n_updates = sum(map(len, flows))
+
+    start = time.perf_counter()
+    for flow in flows:
+        for raw in flow:
+            await dp.feed_raw_update(bot, raw)
+    elapsed = time.perf_counter() - start
+
+    assert bot.session.calls["SendMessage"] >= users * 6, "сценарий оборвался"
+    await counting.close()
+    return {
+        "calls": counting.calls,
+        "per_flow": sum(counting.calls.values()) / users,
+        "us_per_update": elapsed / n_updates * 1e6,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        redirect_logs(Path(tmp))
+        no_prices()
+        dp = make_dispatcher(MemoryStorage())
+        results = {
+            "memory": await run(dp, MemoryStorage(), False, args.users),
+            "memory + buffer": await run(dp, MemoryStorage(), True, args.users),
+            "sqlite": await run(dp, SQLiteStorage(Path(tmp) / "a.sqlite3"), False, args.users),
+            "sqlite + buffer": await run(dp, SQLiteStorage(Path(tmp) / "b.sqlite3"), True, args.users),
+        }
+
+    methods = ["get_state", "get_data", "set_data", "set_state", "set_record"]
+    print(f"round trips per full search flow ({args.users} users)")
+    print(f"{'mode':<18}" + "".join(f"{m:>11}" for m in methods) + f"{'total':>8}{'µs/upd':>9}")
+    for name, r in results.items():
+        row = "".join(f"{r['calls'][m] / args.users:>11.1f}" for m in methods)
+        print(f"{name:<18}{row}{r['per_flow']:>8.1f}{r['us_per_update']:>9.0f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,59 @@
+"""
+Накладные расходы FSM-хранилища на один апдейт: MemoryStorage vs SQLiteStorage.
+
+Каждый «апдейт» повторяет типичный доступ хэндлера: get_state (фильтр),
+get_data, update_data, set_state. Запуск:  python -m benchmarks.fsm_storage
+"""
+import argparse
+import asyncio
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from aiogram.fsm.storage.base import BaseStorage, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from utils.fsm_storage import SQLiteStorage
+
+STATES = ["Search:lang", "Search:origin", "Search:destination", "Search:departure_date", "Search:adults"]
+
+
+async def run(storage: BaseStorage, users: int, updates: int) -> float:
+    rnd = random.Random(42)
+    keys = [StorageKey(bot_id=1, chat_id=u, user_id=u) for u in range(users)]
+    start = time.perf_counter()
+    for i in range(updates):
+        key = keys[rnd.randrange(users)]
+        await storage.get_state(key)
+        data = await storage.get_data(key)
+        await storage.update_data(key, {"step": i, "lang": "ru", "origin": "TAS", "n": len(data)})
+        await storage.set_state(key, STATES[i % len(STATES)])
+    elapsed = time.perf_counter() - start
+    await storage.close()
+    return elapsed
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--updates", type=int, default=50_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {
+            "memory": await run(MemoryStorage(), args.users, args.updates),
+            "sqlite (cold)": await run(SQLiteStorage(Path(tmp) / "fsm.sqlite3"), args.users, args.updates),
+            # второй прогон по той же базе: ключи поднимаются с диска
+            "sqlite (warm db)": await run(SQLiteStorage(Path(tmp) / "fsm.sqlite3"), args.users, args.updates),
+        }
+
+    base = results["memory"]
+    print(f"{'storage':<18}{'µs/update':>12}{'updates/s':>12}{'vs memory':>12}")
+    for name, elapsed in results.items():
+        per = elapsed / args.updates * 1e6
+        print(f"{name:<18}{per:>12.1f}{args.updates / elapsed:>12.0f}{elapsed / base:>11.2f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
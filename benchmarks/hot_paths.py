@@ -0,0 +1,329 @@
+"""
+Микробенчмарки горячих путей: поиск города, подписи, клавиатуры, ссылки, журналы.
+
+Справочник — синтетический (benchmarks/synthetic.py, --cities городов)
+или боевой data/cities.json (--real); по умолчанию через mmap-артефакт,
+как в проде (--json — индексы в памяти). get_iata меряется отдельно на
+каждом пути разрешения: alias, code, name, case, canonical, translit, folded, fuzzy, miss
+(miss — промах и по справочнику API, без сети). Для translit / fuzzy /
+miss save_alias отключён, иначе со второго вызова запрос уйдёт по пути
+alias, а негативный кэш промахов очищается перед каждым вызовом;
+cached_miss — те же промахи из кэша. Журналы (save_flow_log,
+log_action) меряются с запущенным фоновым писателем в event loop — так,
+как их зовут хэндлеры; файлы — во временной папке. Логирование — уровень INFO в NullHandler: строки
+форматируются, как в проде, но никуда не пишутся.
+
+Для каждого случая: ops/s (лучший из --repeat замеров), пиковая память
+на вызов и удерживаемые байты на вызов (tracemalloc). --save сохраняет
+результаты в --baseline, при наличии базовой линии печатается
+сравнение; --fail-over N — код выхода 1, если что-то медленнее на N%.
+Разброс между запусками на общей машине — десятки процентов: порог
+стоит брать с запасом (от 30–50%) и сравнивать на одной и той же машине.
+Запуск:  python -m benchmarks.hot_paths [--save] [--only get_iata]
+"""
+import argparse
+import asyncio
+import inspect
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Sequence
+
+from transliterate import translit
+
+from benchmarks.fakes import isolate_lookup, redirect_logs
+from benchmarks.synthetic import install_citydb, synthetic_cities
+from utils.normalize import canonical, fold
+
+BASELINE_PATH = Path(__file__).resolve().parent / "hot_paths_baseline.json"
+
+
+class Case(NamedTuple):
+    name: str
+    fn: Callable[[Any], Any]  # синхронная функция или корутина от одного аргумента
+    args: Sequence[Any]  # аргументы по кругу
+
+
+# ─────────────────────────────────────────────
+#               Замер
+# ─────────────────────────────────────────────
+async def _loop(fn: Callable, args: Sequence, n: int) -> float:
+    is_async = inspect.iscoroutinefunction(fn)
+    k = len(args)
+    start = time.perf_counter()
+    if is_async:
+        for i in range(n):
+            await fn(args[i % k])
+    else:
+        for i in range(n):
+            fn(args[i % k])
+    return time.perf_counter() - start
+
+
+async def measure(case: Case, min_time: float, repeat: int) -> Dict[str, float]:
+    # разогрев: по разу на каждый аргумент — дальше меряем установившийся режим (кэши заполнены)
+    await _loop(case.fn, case.args, len(case.args))
+    # калибровка: сколько вызовов укладывается в min_time
+    n = 1
+    while True:
+        elapsed = await _loop(case.fn, case.args, n)
+        if elapsed >= min_time / 10 or n >= 1 << 22:
+            break
+        n *= 4
+    n = max(1, int(n * min_time / max(elapsed, 1e-9)))
+    best = min([await _loop(case.fn, case.args, n) for _ in range(repeat)])
+
+    # память: пик одного вызова и прирост удерживаемой памяти за k вызовов
+    k = min(len(case.args), 1000)
+    is_async = inspect.iscoroutinefunction(case.fn)
+    peaks = [0] * k
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    for i in range(k):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        res = case.fn(case.args[i])
+        if is_async:
+            await res
+        peaks[i] = tracemalloc.get_traced_memory()[1] - before
+    retained = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    return {
+        "ops_per_s": n / best,
+        "us_per_op": best / n * 1e6,
+        "peak_bytes": sum(peaks) / len(peaks),
+        "retained_bytes": retained / k,
+    }
+
+
+# ─────────────────────────────────────────────
+#               Наборы запросов
+# ─────────────────────────────────────────────
+def _typo(word: str, rng: random.Random) -> str:
+    i = rng.randrange(1, len(word) - 1)
+    if rng.random() < 0.5:
+        return word[:i] + word[i + 1:]  # пропущенная буква
+    return word[:i - 1] + word[i] + word[i - 1] + word[i + 1:]  # переставленные
+
+
+def resolution_queries(db, cities: List[dict], rng: random.Random, n: int) -> Dict[str, List[str]]:
+    """Запросы, которые get_iata разрешает именно на своём пути (проверяется по индексу)."""
+    sample = rng.sample(cities, min(len(cities), n * 4))
+
+    def exact_kind(q: str):
+        hit = db.exact(q)
+        return hit[1] if hit else None
+
+    def canonical_hit(q: str) -> bool:
+        key = canonical(q)
+        return bool(key) and bool(db.canonical(key))
+
+    def folded_hit(q: str) -> bool:
+        key = canonical(q)
+        return bool(key) and bool(db.folded(fold(key)))
+
+    def local_miss(q: str) -> bool:
+        return (exact_kind(q) is None and not canonical_hit(q) and db.translit(translit(q, "ru")) is None
+                and not folded_hit(q))
+
+    paths: Dict[str, List[str]] = {
+        "code": [c["code"].lower() for c in sample],
+        "name": [c["name"].lower() for c in sample if exact_kind(c["name"].lower()) == "name"],
+        "case": [v.lower() for c in sample for v in (c.get("cases") or {}).values() if exact_kind(v.lower()) == "case"],
+        "canonical": [],
+        "translit": [],
+        "folded": [],
+        "fuzzy": [],
+        "miss": [],
+    }
+    for c in sample:
+        if len(c.get("name") or "") < 5:
+            continue
+        q = translit(c["name"], "ru", reversed=True).lower()
+        if exact_kind(q) is None:
+            if canonical_hit(q):
+                paths["canonical"].append(q)
+            elif db.translit(translit(q, "ru")):
+                paths["translit"].append(q)
+        q = q.replace("a", "o")  # узбекская латиница: Toshkent, Buxoro
+        if exact_kind(q) is None and not canonical_hit(q) and db.translit(translit(q, "ru")) is None and folded_hit(q):
+            paths["folded"].append(q)
+        q = _typo(c["name"].lower(), rng)
+        if local_miss(q) and db.fuzzy.match(q, cutoff=0.8):
+            paths["fuzzy"].append(q)
+    while len(paths["miss"]) < n:
+        q = "".join(rng.choice("qwxzjv0123456789") for _ in range(rng.randint(6, 12)))
+        if local_miss(q) and not db.fuzzy.match(q, cutoff=0.8):
+            paths["miss"].append(q)
+    paths["alias"] = [f"{c['name'].lower()[:5]}-{i}" for i, c in enumerate(sample[:n])]
+    return {path: rng.sample(qs, min(n, len(qs))) for path, qs in paths.items()}
+
+
+def build_cases(db, cities: List[dict], tmp: Path, n: int) -> List[Case]:
+    from handlers import user_flow
+    from utils import localization
+    from utils import logger as action_log
+    from utils.logger import log_action
+
+    rng = random.Random(5)
+    queries = resolution_queries(db, cities, rng, n)
+
+    isolate_lookup(tmp, max_aliases=len(queries["alias"]) * 2)
+    codes = [c["code"] for c in cities]
+    for q in queries["alias"]:
+        localization._ALIASES.set(q, rng.choice(codes))
+
+    save_alias = localization.save_alias
+
+    async def resolve_no_alias(q: str):
+        localization.save_alias = lambda alias, iata: None
+        localization._MISSES.clear()
+        try:
+            return await localization.get_iata(q)
+        finally:
+            localization.save_alias = save_alias
+
+    cases = [
+        Case(f"get_iata[{path}]", localization.get_iata if path in ("alias", "code", "name", "case", "canonical")
+             else resolve_no_alias, qs)
+        for path, qs in queries.items() if qs
+    ]
+    cases.append(Case("get_iata[cached_miss]", localization.get_iata, queries["miss"]))
+
+    sample_codes = rng.sample(codes, min(n, len(codes)))
+    year = date.today().year + 1
+    days = [(year, m, lang, ret, date.today()) for m in range(1, 13) for lang in ("ru", "uz") for ret in (False, True)]
+    cases += [
+        Case("city_by_iata[ru]", lambda c: localization.city_by_iata(c, "ru"), sample_codes),
+        Case("city_by_iata[uz]", lambda c: localization.city_by_iata(c, "uz"), sample_codes),
+        Case("city_by_iata[unknown]", lambda c: localization.city_by_iata(c, "ru"), ["0" + c[:2] for c in sample_codes]),
+        Case("build_year_kb", lambda a: user_flow.build_year_kb(*a), [("ru", False), ("uz", True)]),
+        Case("build_month_kb", lambda a: user_flow.build_month_kb(*a),
+             [(year, lang, ret, date.today()) for lang in ("ru", "uz") for ret in (False, True)]),
+        Case("build_day_kb", lambda a: user_flow.build_day_kb(*a), days),
+        Case("_day_kb (uncached)", lambda a: user_flow._day_kb.__wrapped__(a[0], a[1], a[2], a[3], 1), days),
+        Case("build_pax_kb", lambda a: user_flow.build_pax_kb(*a),
+             [(ad, ch, inf) for ad in range(1, 4) for ch in range(3) for inf in range(ad + 1)]),
+        Case("build_aviasales_url", lambda a: user_flow.build_aviasales_url(*a), [
+            (o, d, f"{year}-06-14", ret, 2, 1, 0, "ru")
+            for o, d in zip(sample_codes, reversed(sample_codes)) for ret in ("", f"{year}-06-21")
+        ]),
+    ]
+
+    # журналы: фоновый писатель работает, очередь не ограничиваем — меряем emit, а не отказ
+    for sink in (user_flow.FLOW_LOG, action_log.ACTIONS_LOG):
+        sink.max_queue = 1 << 30
+
+    async def flow_log(i: int):
+        user_flow.save_flow_log(10_000 + i, "day", {"date": f"{year}-06-14", "ret": False})
+        if i % 512 == 0:
+            await asyncio.sleep(0)  # даём писателю забрать пачку
+
+    async def action(i: int):
+        log_action(10_000 + i, "search", "ташкент", "TAS", {"lang": "ru"})
+        if i % 512 == 0:
+            await asyncio.sleep(0)
+
+    cases += [Case("save_flow_log", flow_log, range(4096)), Case("log_action", action, range(4096))]
+    return cases
+
+
+# ─────────────────────────────────────────────
+#               Базовая линия
+# ─────────────────────────────────────────────
+def machine() -> Dict[str, Any]:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "date": date.today().isoformat(),
+    }
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Any]) -> Dict[str, float]:
+    """Изменение ops/s относительно базовой линии, %."""
+    base = baseline.get("results", {})
+    return {
+        name: (r["ops_per_s"] / base[name]["ops_per_s"] - 1) * 100
+        for name, r in results.items() if name in base
+    }
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cities", type=int, default=10_000)
+    parser.add_argument("--real", action="store_true", help="data/cities.json вместо синтетики")
+    parser.add_argument("--json", action="store_true", help="индексы из JSON вместо mmap-артефакта")
+    parser.add_argument("--queries", type=int, default=300, help="запросов на путь")
+    parser.add_argument("--min-time", type=float, default=0.3, help="сек на замер")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", default="", help="подстрока имени случая")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save", action="store_true", help="записать результаты как базовую линию")
+    parser.add_argument("--fail-over", type=float, default=0, help="код 1, если что-то медленнее на N%%")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, handlers=[logging.NullHandler()], force=True)
+    from handlers import user_flow
+    from utils import logger as action_log
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        redirect_logs(tmp)
+        if args.real:
+            from utils.citydb import CITIES_PATH
+            cities = json.loads(CITIES_PATH.read_text(encoding="utf-8"))
+        else:
+            cities = synthetic_cities(args.cities)
+        db = install_citydb(cities, tmp, compiled=not args.json)
+        cases = [c for c in build_cases(db, cities, tmp, args.queries) if args.only in c.name]
+
+        await user_flow.FLOW_LOG.start()
+        await action_log.ACTIONS_LOG.start()
+        results = {}
+        for case in cases:
+            results[case.name] = await measure(case, args.min_time, args.repeat)
+        await user_flow.FLOW_LOG.stop()
+        await action_log.ACTIONS_LOG.stop()
+
+    baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else None
+    delta = compare(results, baseline) if baseline else {}
+    source = "data/cities.json" if args.real else f"synthetic {args.cities}"
+    print(f"cities: {source} ({len(db)} indexed, {'json' if args.json else 'mmap'}); "
+          f"python {platform.python_version()}")
+    per_path = ", ".join(f"{c.name[9:-1]} {len(c.args)}" for c in cases if c.name.startswith("get_iata["))
+    if per_path:
+        print(f"get_iata queries per path: {per_path}")
+    if baseline:
+        print(f"baseline: {args.baseline.name} ({baseline['machine']['date']}, {baseline['machine']['platform']})")
+        if baseline.get("cities") != source:
+            print(f"  ! baseline measured on {baseline.get('cities')} — comparison is rough")
+    print(f"{'case':<24}{'ops/s':>12}{'µs/op':>9}{'peak B':>9}{'kept B':>9}{'vs base':>9}")
+    for name, r in results.items():
+        d = f"{delta[name]:+.0f}%" if name in delta else ""
+        print(f"{name:<24}{r['ops_per_s']:>12,.0f}{r['us_per_op']:>9.2f}{r['peak_bytes']:>9.0f}"
+              f"{r['retained_bytes']:>9.0f}{d:>9}")
+
+    if args.save:
+        merged = {**(baseline or {}).get("results", {}), **results} if args.only else results
+        args.baseline.write_text(json.dumps(
+            {"machine": machine(), "cities": source, "results": merged}, indent=1, sort_keys=True
+        ) + "\n")
+        print(f"saved → {args.baseline}")
+    slower = [n for n, d in delta.items() if args.fail_over and d < -args.fail_over]
+    if slower:
+        print(f"slower than baseline by more than {args.fail_over:.0f}%: {', '.join(slower)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,229 @@
+"""
+Нагрузочный прогон полного сценария поиска через Dispatcher.
+
+--users виртуальных пользователей (с разгоном за --ramp секунд) проходят
+/start → язык → откуда → куда → даты → пассажиры → подтверждение с
+паузами «на подумать» (экспоненциальные, в среднем --think секунд) и
+опечатками в названиях городов (--typo-rate): опечатку поиск либо
+прощает (fuzzy), либо бот просит ввести город ещё раз — и пользователь
+вводит его правильно. Часть пользователей без обратного рейса, часть
+меняет число пассажиров. Bot API — поддельная сессия без сети
+(--api-latency на вызов), справочник городов — data/cities.json;
+журналы, алиасы — во временной папке, цены отключены.
+
+Печатает p50/p95/p99 по каждому хэндлеру (время самого хэндлера) и по
+апдейту целиком (от feed_raw_update до возврата), апдейтов/с, загрузку
+CPU и оценку потолка апдейтов/с на одно ядро, исходящих вызовов Bot API
+на завершённый поиск и пиковый RSS процесса.
+Запуск:  python -m benchmarks.loadtest --users 2000 --think 1.0 --typo-rate 0.1
+"""
+import argparse
+import asyncio
+import random
+import resource
+import statistics
+import tempfile
+import time
+from collections import defaultdict
+from datetime import date
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.methods import SendMessage, TelegramMethod
+from aiogram.types import CallbackQuery, TelegramObject
+
+from benchmarks.fakes import BOT_TOKEN, FakeSession, Updates, isolate_lookup, no_prices, redirect_logs
+from bot import make_dispatcher
+from handlers import user_flow
+from keyboards.callbacks import ConfirmCb, DayCb, LangCb, MonthCb, NoReturnCb, PaxCb, YearCb
+from states.search import Search
+
+CITIES = ["Ташкент", "Москва", "Самарканд", "Стамбул", "Дубай", "Санкт-Петербург", "Бухара", "Наманган",
+          "Фергана", "Казань", "Новосибирск", "Алматы", "Анталья", "Екатеринбург", "Нукус", "Ургенч"]
+
+
+class CountingSession(FakeSession):
+    """FakeSession, которая считает завершённые поиски (сообщения со ссылкой)."""
+
+    def __init__(self, latency: float):
+        super().__init__(latency=latency)
+        self.completed = 0
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None) -> Any:
+        if isinstance(method, SendMessage) and "aviasales" in method.text:
+            self.completed += 1
+        return await super().make_request(bot, method, timeout)
+
+
+class HandlerTimer(BaseMiddleware):
+    """Внутренний middleware: время хэндлера по его имени (callback — по префиксу data)."""
+
+    def __init__(self) -> None:
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        name = data["handler"].callback.__name__
+        if isinstance(event, CallbackQuery):
+            route = user_flow._CALLBACKS.get((event.data or "").split(":", 1)[0])
+            name = route.handler.__name__ if route else name
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            self.samples[name].append(time.perf_counter() - start)
+
+
+def typo(word: str, rng: random.Random) -> str:
+    i = rng.randrange(1, len(word) - 1)
+    return word[:i] + word[i + 1:] if rng.random() < 0.5 else word[:i] + word[i] + word[i:]
+
+
+def pct(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class Load:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.session = CountingSession(args.api_latency)
+        self.bot = Bot(token=BOT_TOKEN, session=self.session)
+        self.dp = make_dispatcher(MemoryStorage())
+        self.timer = HandlerTimer()
+        self.dp.message.middleware(self.timer)
+        self.dp.callback_query.middleware(self.timer)
+        self.updates = Updates()
+        self.update_latency: List[float] = []
+        self.retyped = 0
+
+    async def feed(self, raw: Dict[str, Any]) -> None:
+        start = time.perf_counter()
+        await self.dp.feed_raw_update(self.bot, raw)
+        self.update_latency.append(time.perf_counter() - start)
+
+    async def think(self, rng: random.Random) -> None:
+        if self.args.think:
+            await asyncio.sleep(rng.expovariate(1 / self.args.think))
+
+    async def state(self, user_id: int) -> Optional[str]:
+        return await self.dp.fsm.get_context(self.bot, user_id, user_id).get_state()
+
+    async def type_city(self, user_id: int, city: str, rng: random.Random, waiting: str) -> None:
+        text = typo(city, rng) if rng.random() < self.args.typo_rate else city
+        await self.feed(self.updates.message(user_id, text))
+        if await self.state(user_id) == waiting:  # не узнали — вводим ещё раз, без ошибки
+            self.retyped += 1
+            await self.think(rng)
+            await self.feed(self.updates.message(user_id, city))
+
+    async def user(self, user_id: int) -> None:
+        rng = random.Random(user_id)
+        u = self.updates
+        await asyncio.sleep(rng.uniform(0, self.args.ramp))
+        origin, destination = rng.sample(CITIES, 2)
+        year = date.today().year + 1
+        dep_m, dep_d = rng.randint(1, 12), rng.randint(1, 28)
+
+        steps: List[Callable[[], Awaitable[None]]] = [
+            lambda: self.feed(u.message(user_id, "/start")),
+            lambda: self.feed(u.callback(user_id, LangCb(lang=rng.choice(["ru", "uz"])).pack())),
+            lambda: self.type_city(user_id, origin, rng, Search.origin.state),
+            lambda: self.type_city(user_id, destination, rng, Search.destination.state),
+            lambda: self.feed(u.callback(user_id, YearCb(year=year).pack())),
+            lambda: self.feed(u.callback(user_id, MonthCb(year=year, month=dep_m).pack())),
+            lambda: self.feed(u.callback(user_id, DayCb(year=year, month=dep_m, day=dep_d).pack())),
+        ]
+        if rng.random() < 0.3:
+            steps.append(lambda: self.feed(u.callback(user_id, NoReturnCb().pack())))
+        else:
+            ret_m = rng.randint(dep_m, 12)
+            ret_d = rng.randint(dep_d if ret_m == dep_m else 1, 28)
+            steps += [
+                lambda: self.feed(u.callback(user_id, YearCb(year=year, ret=True).pack())),
+                lambda: self.feed(u.callback(user_id, MonthCb(year=year, month=ret_m, ret=True).pack())),
+                lambda: self.feed(u.callback(user_id, DayCb(year=year, month=ret_m, day=ret_d, ret=True).pack())),
+            ]
+        for _ in range(rng.choice([0, 0, 1, 2])):
+            kind = rng.choice(["a", "c"])
+            steps.append(lambda kind=kind: self.feed(u.callback(user_id, PaxCb(kind=kind, delta=1).pack())))
+        steps += [
+            lambda: self.feed(u.callback(user_id, PaxCb(kind="ok").pack())),
+            lambda: self.feed(u.callback(user_id, ConfirmCb().pack())),
+        ]
+        for step in steps:
+            await step()
+            await self.think(rng)
+
+
+async def sample_rss(stop: asyncio.Event, peak: List[int]) -> None:
+    """Текущий RSS из /proc раз в 0.2 с (ru_maxrss — пик за всю жизнь процесса, вместе с загрузкой)."""
+    page = resource.getpagesize()
+    while not stop.is_set():
+        try:
+            with open("/proc/self/statm") as f:
+                peak[0] = max(peak[0], int(f.read().split()[1]) * page)
+        except OSError:
+            return
+        try:
+            await asyncio.wait_for(stop.wait(), 0.2)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--think", type=float, default=1.0, help="средняя пауза между действиями, сек")
+    parser.add_argument("--ramp", type=float, default=5.0, help="разгон: старты размазаны на столько секунд")
+    parser.add_argument("--typo-rate", type=float, default=0.1, help="доля названий городов с опечаткой")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="задержка ответа Bot API, сек")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        redirect_logs(Path(tmp))
+        isolate_lookup(Path(tmp))
+        no_prices()
+        load = Load(args)
+        rss_before = int(open("/proc/self/statm").read().split()[1]) * resource.getpagesize()
+        await load.dp.emit_startup(bot=load.bot)
+
+        stop, rss = asyncio.Event(), [0]
+        sampler = asyncio.create_task(sample_rss(stop, rss))
+        wall, cpu = time.perf_counter(), time.process_time()
+        await asyncio.gather(*(load.user(100_000 + u) for u in range(args.users)))
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        stop.set()
+        await sampler
+        await load.dp.emit_shutdown(bot=load.bot)
+
+    n = len(load.update_latency)
+    done = load.session.completed
+    api_calls = sum(load.session.calls.values())
+    print(f"users {args.users}, think {args.think}s, typo rate {args.typo_rate:.0%}, "
+          f"api latency {args.api_latency * 1e3:.0f} ms")
+    print(f"completed searches: {done}/{args.users}, cities retyped after a typo: {load.retyped}")
+    print(f"updates: {n} in {wall:.1f} s → {n / wall:.0f} updates/s; CPU {cpu / wall:.0%} of one core, "
+          f"≈{n / cpu:.0f} updates/s per core at saturation")
+    if cpu / wall > 0.9:
+        print("  event loop saturated: whole-update percentiles include queueing behind other users")
+    print(f"Bot API calls: {api_calls} → {api_calls / max(done, 1):.1f} per completed search ("
+          + ", ".join(f"{m} {c / max(done, 1):.1f}" for m, c in load.session.calls.most_common()) + ")")
+    print(f"RSS: {rss_before / 2**20:.0f} MB before start, peak {rss[0] / 2**20:.0f} MB during the run")
+    print()
+    print(f"{'handler':<18}{'calls':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    rows = sorted(load.timer.samples.items(), key=lambda kv: -len(kv[1]))
+    for name, xs in rows + [("(whole update)", load.update_latency)]:
+        print(f"{name:<18}{len(xs):>8}{statistics.median(xs) * 1e3:>9.2f}"
+              f"{pct(xs, 0.95) * 1e3:>9.2f}{pct(xs, 0.99) * 1e3:>9.2f}")
+    assert done == args.users, "не все сценарии дошли до ссылки"
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
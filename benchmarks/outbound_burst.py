@@ -0,0 +1,167 @@
+"""
+Всплеск нажатий через Dispatcher: напрямую vs через ScheduledSession.
+
+Поддельная сессия ведёт себя как Telegram под нагрузкой: больше
+global_rate сообщений в секунду на бота или chat_rate в один чат —
+ответ 429 (retry_after). Каждый из --chats пользователей стоит на
+экране пассажиров и быстро жмёт «➕ взрослый» --clicks раз под одним и
+тем же сообщением (раз в --tap-interval сек), затем ✅ — экран проверки.
+Апдейты идут в dp.feed_raw_update диспетчера из bot.make_dispatcher,
+как при polling: каждый своей задачей, а изоляция диспетчера выполняет
+нажатия одного пользователя по очереди — так что слияние правок и
+приоритеты проверяются на настоящих хэндлерах.
+
+Печатает: успешные вызовы, 429, апдейты, упавшие с ошибкой, время
+ответа на нажатие (от апдейта до answerCallbackQuery), слитые правки,
+и у скольких чатов последняя клавиатура показывает верное число
+взрослых. Запуск:  python -m benchmarks.outbound_burst --chats 60 --clicks 6
+"""
+import argparse
+import asyncio
+import logging
+import tempfile
+import time
+from collections import defaultdict, deque
+from pathlib import Path
+from typing import Any, Deque, Dict, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.methods import AnswerCallbackQuery, EditMessageReplyMarkup, TelegramMethod
+
+from benchmarks.fakes import BOT_TOKEN, FakeSession, Updates, isolate_lookup, no_prices, redirect_logs
+from keyboards.callbacks import PaxCb
+from states.search import Search
+from utils.outbound import ScheduledSession
+
+PAX_MESSAGE_ID = 777  # сообщение с клавиатурой пассажиров у каждого чата
+
+
+class LimitedSession(FakeSession):
+    """FakeSession со скользящими окнами лимитов Telegram (1 секунда) и журналом ответов."""
+
+    def __init__(self, global_rate: int, chat_rate: int, latency: float):
+        super().__init__(latency=latency)
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.flood = 0
+        self.answered: Dict[str, float] = {}  # callback_query_id → когда ушёл ответ
+        self.last_markup: Dict[Any, Any] = {}  # чат → последняя отправленная клавиатура
+        self._global: Deque[float] = deque()
+        self._chats: Dict[Any, Deque[float]] = defaultdict(deque)
+
+    def _over(self, window: Deque[float], limit: int, now: float) -> bool:
+        while window and now - window[0] >= 1:
+            window.popleft()
+        return len(window) >= limit
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None) -> Any:
+        now = time.monotonic()
+        if isinstance(method, AnswerCallbackQuery):
+            self.answered[method.callback_query_id] = now
+        chat = getattr(method, "chat_id", None)
+        if chat is not None and not isinstance(method, AnswerCallbackQuery):
+            if self._over(self._global, self.global_rate, now) or self._over(self._chats[chat], self.chat_rate, now):
+                self.flood += 1
+                raise TelegramRetryAfter(method=method, message="Too Many Requests", retry_after=1)
+            self._global.append(now)
+            self._chats[chat].append(now)
+            if isinstance(method, EditMessageReplyMarkup):
+                self.last_markup[chat] = method.reply_markup
+        return await super().make_request(bot, method, timeout)
+
+
+def adults_shown(markup: Any) -> Optional[int]:
+    """Число взрослых на клавиатуре пассажиров (кнопка-счётчик в строке 👤)."""
+    if markup is None:
+        return None
+    for row in markup.inline_keyboard:
+        if len(row) == 3 and row[1].text.startswith("👤"):
+            return int(row[1].text.split()[1])
+    return None
+
+
+async def user(dp, bot: Bot, updates: Updates, chat: int, args: argparse.Namespace,
+               taps: Dict[str, float]) -> int:
+    """Нажатия одного пользователя; возвращает число апдейтов, упавших с ошибкой."""
+    key = StorageKey(bot_id=bot.id, chat_id=chat, user_id=chat)
+    await dp.storage.set_state(key, Search.adults)
+    await dp.storage.set_data(key, {
+        "lang": "ru", "origin": "TAS", "destination": "MOW", "departure_date": "2030-06-14",
+        "return_date": "", "adults": 1, "children": 0, "infants": 0,
+    })
+    lost = 0
+
+    async def tap(data: str, delay: float) -> None:
+        nonlocal lost
+        await asyncio.sleep(delay)
+        raw = updates.callback(chat, data, message_id=PAX_MESSAGE_ID)
+        taps[raw["callback_query"]["id"]] = time.monotonic()
+        try:
+            await dp.feed_raw_update(bot, raw)
+        except TelegramRetryAfter:
+            lost += 1
+
+    # как polling: каждый апдейт — своя задача; изоляция диспетчера держит их по очереди
+    plus = PaxCb(kind="a", delta=1).pack()
+    await asyncio.gather(*(tap(plus, i * args.tap_interval) for i in range(args.clicks)))
+    await tap(PaxCb(kind="ok").pack(), 0)
+    return lost
+
+
+async def run(dp, scheduled: bool, args: argparse.Namespace) -> None:
+    limited = LimitedSession(args.global_rate, args.chat_rate, args.latency)
+    session = ScheduledSession(limited, global_rate=args.global_rate, chat_rate=args.chat_rate,
+                               chat_burst=args.chat_rate) if scheduled else limited
+    bot = Bot(token=BOT_TOKEN, session=session)
+    updates = Updates()
+    taps: Dict[str, float] = {}
+    start = time.perf_counter()
+    chats = [(5000 if scheduled else 1000) + c for c in range(args.chats)]  # роутер один — чаты разные
+    lost = sum(await asyncio.gather(*(user(dp, bot, updates, c, args, taps) for c in chats)))
+    if scheduled:
+        await session.close()  # досылает очередь
+    elapsed = time.perf_counter() - start
+
+    delays = sorted(limited.answered[cid] - t for cid, t in taps.items() if cid in limited.answered)
+    pct = lambda q: delays[min(len(delays) - 1, int(q * len(delays)))] if delays else float("nan")  # noqa: E731
+    expected = min(9, 1 + args.clicks)
+    correct = sum(adults_shown(limited.last_markup.get(c)) == expected for c in chats)
+    ok = sum(limited.calls.values())
+    print(f"{'scheduled' if scheduled else 'direct':<10} ok {ok:>5}  429s {limited.flood:>5}  "
+          f"failed updates {lost:>4}  done in {elapsed:>6.2f} s")
+    print(f"{'':<10} callback answered: p50 {pct(0.5) * 1e3:.0f} ms, p95 {pct(0.95) * 1e3:.0f} ms, "
+          f"max {delays[-1] * 1e3 if delays else float('nan'):.0f} ms; "
+          f"final keyboard shows {expected} adults in {correct}/{len(chats)} chats")
+    if scheduled:
+        snap = session.snapshot()
+        print(f"{'':<10} queue: max depth {snap['max_depth']:.0f}, merged edits {snap['merged']:.0f}, "
+              f"wait p50 {snap['wait_p50'] * 1e3:.0f} ms, p95 {snap['wait_p95'] * 1e3:.0f} ms")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats", type=int, default=60)
+    parser.add_argument("--clicks", type=int, default=6)
+    parser.add_argument("--tap-interval", type=float, default=0.05, help="сек между нажатиями одного пользователя")
+    parser.add_argument("--global-rate", type=int, default=30)
+    parser.add_argument("--chat-rate", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.03)
+    args = parser.parse_args()
+    # 429 и трейсбеки прямого режима видны в счётчиках — в выводе они только мешают
+    logging.basicConfig(handlers=[logging.NullHandler()], force=True)
+    with tempfile.TemporaryDirectory() as tmp:
+        redirect_logs(Path(tmp))
+        isolate_lookup(Path(tmp))
+        no_prices()
+        from bot import make_dispatcher
+
+        dp = make_dispatcher(MemoryStorage())
+        await run(dp, False, args)
+        await run(dp, True, args)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,130 @@
+"""
+Превью цены на экране проверки против поддельного Travelpayouts.
+
+• --users одновременных запросов одной цены → один запрос в апстрим;
+• повторный запрос — из кэша, без апстрима;
+• медленный апстрим: ответ за бюджет без цены, цена дозагружается в кэш;
+• битые строки в ответе: цены нет, календарь — из целых строк, результат
+  кэшируется как обычный промах;
+• --users полных сценариев через Dispatcher: у каждого в сообщении
+  проверки есть строка цены, в сетке дней — пометки 💰, а запросов в
+  апстрим — по одному на маршрут×даты и маршрут×месяц (календари
+  ближайших месяцев предзагружаются при показе клавиатуры месяцев).
+Запуск:  python -m benchmarks.prices_e2e --users 100 --delay 0.05
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+from typing import List
+
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+import config
+from benchmarks.fake_travelpayouts import FakeTravelpayouts
+from benchmarks.fakes import Updates, make_bot, redirect_logs, search_flow
+from bot import make_dispatcher
+from utils import prices
+from utils.http import close_session
+
+
+def _buttons(method) -> List[InlineKeyboardButton]:
+    markup = getattr(method, "reply_markup", None)
+    return [btn for row in markup.inline_keyboard for btn in row] if isinstance(markup, InlineKeyboardMarkup) else []
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--delay", type=float, default=0.05, help="задержка ответа апстрима, сек")
+    args = parser.parse_args()
+
+    tp = FakeTravelpayouts(delay=args.delay, malformed=("TASBAD",))
+    await tp.start()
+    config.TRAVELPAYOUTS_API_URL = tp.base_url
+    year = date.today().year + 1
+    day = f"{year}-06-14"
+
+    # 1. singleflight
+    fares = await asyncio.gather(*(prices.cheapest("TAS", "MOW", day) for _ in range(args.users)))
+    assert tp.calls["prices_for_dates"] == 1, tp.calls
+    assert len(set(fares)) == 1 and fares[0] is not None
+    print(f"{args.users} concurrent lookups → {tp.calls['prices_for_dates']} upstream call, "
+          f"price {prices.format_price(fares[0].price, fares[0].currency)}")
+
+    # 2. кэш
+    start = time.perf_counter()
+    assert await prices.cheapest("TAS", "MOW", day) == fares[0]
+    assert tp.calls["prices_for_dates"] == 1
+    print(f"cached lookup: {(time.perf_counter() - start) * 1e6:.0f} µs, no upstream call")
+
+    # 3. бюджет: апстрим медленнее бюджета
+    tp.delay, budget = 0.5, 0.1
+    start = time.perf_counter()
+    fare = await prices.cheapest_within("TAS", "IST", day, budget=budget)
+    waited = time.perf_counter() - start
+    assert fare is None and waited < budget + 0.05, waited
+    await asyncio.sleep(tp.delay)
+    late = await prices.cheapest_within("TAS", "IST", day, budget=budget)
+    assert late is not None and tp.calls["prices_for_dates"] == 2
+    print(f"slow upstream: answered in {waited * 1e3:.0f} ms without price, "
+          f"price cached {tp.delay * 1e3:.0f} ms later")
+    tp.delay = args.delay
+
+    # 4. битый ответ: экран не падает, промах кэшируется
+    assert await prices.cheapest("TAS", "BAD", day) is None
+    assert await prices.cheapest("TAS", "BAD", day) is None
+    days = await prices.month_prices("TAS", "BAD", year, 6)
+    assert days and await prices.month_prices("TAS", "BAD", year, 6) == days
+    assert tp.calls["prices_for_dates"] == 3 and tp.calls["month_matrix"] == 1, tp.calls
+    print(f"malformed rows: no price, {len(days)} good days kept, {prices.stats['bad_rows']} rows skipped, "
+          f"both results cached")
+    bad_calls = tp.calls["month_matrix"]
+
+    # 5. полные сценарии: один маршрут и даты у всех
+    with tempfile.TemporaryDirectory() as tmp:
+        redirect_logs(Path(tmp))
+        prices._CACHE.clear()
+        prices._MONTHS.clear()
+        before = tp.calls["prices_for_dates"]
+        dp = make_dispatcher(MemoryStorage())
+        bot = make_bot()
+        bot.session.keep_log = True
+        updates = Updates()
+        # февраль — внутри окна предзагрузки (январь…март следующего года)
+        flows = [search_flow(updates, 30_000 + u, year, month=2) for u in range(args.users)]
+
+        async def user(flow):
+            for raw in flow:
+                await dp.feed_raw_update(bot, raw)
+
+        await asyncio.gather(*(user(f) for f in flows))
+        reviews = [m for m in bot.session.log if "Проверьте данные" in (getattr(m, "text", None) or "")]
+        with_price = sum("💸" in m.text for m in reviews)
+        upstream = tp.calls["prices_for_dates"] - before
+        day_grids = [
+            buttons for buttons in map(_buttons, bot.session.log)
+            if any(btn.callback_data.startswith("d:") for btn in buttons)
+        ]
+        marked = sum(any("💰" in btn.text for btn in buttons) for buttons in day_grids)
+        await bot.session.close()
+
+    print(f"flows: {args.users}, review screens with price: {with_price}/{len(reviews)}, "
+          f"upstream calls: {upstream}")
+    print(f"day grids with 💰: {marked}/{len(day_grids)}, month-matrix calls: {tp.calls['month_matrix']} "
+          f"(departure Jan–Mar + return Feb–Apr)")
+    print(f"cache: {prices._CACHE.stats}, singleflight: {prices._FLIGHTS.stats}, client: {prices.stats}")
+    assert len(reviews) == args.users and with_price == args.users
+    assert upstream == 1, upstream
+    assert len(day_grids) == 2 * args.users and marked == len(day_grids)
+    assert tp.calls["month_matrix"] - bad_calls == 6, tp.calls
+
+    await close_session()
+    await tp.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,149 @@
+"""
+Резервный справочник городов (utils.remote_cities) против поддельного Travelpayouts.
+
+• холодный старт: --users одновременных промахов → одна загрузка;
+• свежий справочник (моложе REMOTE_CITIES_TTL) — без запросов;
+• TTL истёк: ответ по старому справочнику сразу, ревалидация в фоне с
+  If-None-Match / If-Modified-Since → 304, срок продлён без перекачки;
+• справочник изменился (новый ETag) — 200, новый индекс;
+• рестарт: справочник читается с диска, без сети;
+• апстрим лежит: find() — UNAVAILABLE (не «не найдено»), повтор в
+  течение RETRY_AFTER в сеть не ходит, после паузы — новая попытка;
+  get_iata такой промах не кэширует.
+Запуск:  python -m benchmarks.remote_cities_e2e --users 100 --delay 0.05
+"""
+import argparse
+import asyncio
+import logging
+import tempfile
+import time
+from pathlib import Path
+
+import config
+from benchmarks.fake_travelpayouts import FakeTravelpayouts
+from benchmarks.fakes import isolate_lookup
+from utils import remote_cities
+from utils.http import close_session
+
+CITIES = [
+    {"code": "TAS", "name": "Ташкент", "name_translations": {"en": "Tashkent"}},
+    {"code": "QZX", "name": "Кызыл-Кия", "name_translations": {"en": "Kyzyl-Kiya"}},
+]
+
+
+def reset(tmp: Path, keep_disk: bool = False) -> None:
+    """Процесс «только что запущен»: ни индекса, ни загрузок; дисковый кэш — по keep_disk."""
+    remote_cities.CACHE_PATH = tmp / "cities_remote.json"
+    remote_cities.META_PATH = tmp / "cities_remote.meta.json"
+    if not keep_disk:
+        remote_cities.CACHE_PATH.unlink(missing_ok=True)
+        remote_cities.META_PATH.unlink(missing_ok=True)
+    remote_cities._index, remote_cities._meta = None, {}
+    remote_cities._inflight = remote_cities._disk_task = None
+    remote_cities._failed_at = 0.0
+
+
+async def settle() -> None:
+    """Дождаться фонового обновления, если оно идёт."""
+    if remote_cities._inflight is not None:
+        await remote_cities._inflight
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--delay", type=float, default=0.05, help="задержка ответа апстрима, сек")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+
+    tp = FakeTravelpayouts(delay=args.delay)
+    tp.cities = list(CITIES)
+    await tp.start()
+    config.TRAVELPAYOUTS_DATA_URL = tp.cities_url
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+
+        # 1. холодный старт: загрузки склеиваются
+        reset(tmp)
+        start = time.perf_counter()
+        found = await asyncio.gather(*(remote_cities.find("кызыл-кия", "кызыл-кия") for _ in range(args.users)))
+        assert set(found) == {"QZX"}, set(found)
+        assert tp.calls["cities"] == 1, tp.calls
+        assert tp.cities_headers[-1].get("X-Access-Token") == config.TRAVELPAYOUTS_API_KEY
+        print(f"cold start: {args.users} concurrent misses → {tp.calls['cities']} download "
+              f"in {(time.perf_counter() - start) * 1e3:.0f} ms")
+        assert await remote_cities.find("нигде", "нигде") is None  # не найдено ≠ недоступен
+
+        # 2. свежий справочник — без запросов
+        await remote_cities.find("tashkent", "ташкент")
+        assert tp.calls["cities"] == 1, tp.calls
+        print("fresh dataset: lookups without upstream calls")
+
+        # 3. TTL истёк, данные те же: старый индекс сразу, в фоне 304
+        remote_cities._meta["fetched_at"] -= config.REMOTE_CITIES_TTL + 1
+        start = time.perf_counter()
+        assert await remote_cities.find("tashkent", "ташкент") == "TAS"
+        stale_answer = time.perf_counter() - start
+        assert stale_answer < args.delay, stale_answer
+        await settle()
+        revalidation = tp.cities_headers[-1]
+        assert tp.calls["cities"] == 2, tp.calls
+        assert revalidation.get("If-None-Match") == tp.cities_etag
+        assert revalidation.get("If-Modified-Since") == tp.cities_modified
+        assert remote_cities._is_fresh()
+        await remote_cities.find("tashkent", "ташкент")
+        assert tp.calls["cities"] == 2, tp.calls
+        print(f"expired TTL: answered from stale data in {stale_answer * 1e6:.0f} µs, "
+              f"revalidated in background → 304, TTL renewed")
+
+        # 4. справочник изменился: новый ETag → 200 и новый индекс
+        tp.cities.append({"code": "NEW", "name": "Новый город", "name_translations": {}})
+        remote_cities._meta["fetched_at"] -= config.REMOTE_CITIES_TTL + 1
+        assert await remote_cities.find("новый город", "новый город") is None  # пока старый индекс
+        await settle()
+        assert await remote_cities.find("новый город", "новый город") == "NEW"
+        assert tp.calls["cities"] == 3, tp.calls
+        print("changed dataset: new ETag → 200, index replaced")
+
+        # 5. рестарт: с диска, без сети
+        reset(tmp, keep_disk=True)
+        assert await remote_cities.find("новый город", "новый город") == "NEW"
+        assert tp.calls["cities"] == 3, tp.calls
+        print("restart: dataset read from disk cache, no upstream call")
+
+        # 6. апстрим лежит: UNAVAILABLE, пауза RETRY_AFTER, потом повтор
+        reset(tmp)
+        tp.cities_status = 500
+        assert await remote_cities.find("tashkent", "ташкент") is remote_cities.UNAVAILABLE
+        failed_calls = tp.calls["cities"]
+        assert await remote_cities.find("tashkent", "ташкент") is remote_cities.UNAVAILABLE
+        assert tp.calls["cities"] == failed_calls, tp.calls
+        tp.cities_status = 200
+        remote_cities._failed_at -= remote_cities.RETRY_AFTER
+        assert await remote_cities.find("tashkent", "ташкент") == "TAS"
+        assert tp.calls["cities"] == failed_calls + 1, tp.calls
+        print(f"upstream down: UNAVAILABLE, no retry within {remote_cities.RETRY_AFTER} s, "
+              f"recovered after the pause")
+
+        # 7. get_iata: недоступный справочник не попадает в негативный кэш
+        from utils import localization
+
+        isolate_lookup(tmp)
+        localization.save_alias = lambda alias, iata: None
+        reset(tmp)
+        tp.cities_status = 500
+        localization._db()
+        assert await localization._resolve("кызыл кия qq") == (None, "unavailable")
+        tp.cities_status = 200
+        remote_cities._failed_at -= remote_cities.RETRY_AFTER
+        code, path = await localization._resolve("кызыл кия qq")
+        assert path != "cached_miss", path
+        print(f"get_iata: unavailable dataset not cached as a miss (next lookup: {path})")
+
+    await close_session()
+    await tp.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,126 @@
+"""
+Время старта бота: от запуска процесса до первого getUpdates и до ответа на город.
+
+Запускает `python bot.py` (long polling) отдельным процессом против
+поддельного Telegram; первый же getUpdates отдаёт /start, выбор языка и
+город — ответ на город показывает, когда справочник городов готов на самом
+деле. Журналы и алиасы дочернего процесса — во временной папке; цены,
+прогрев и очередь исходящих выключены (с очередью ответ на город ждал бы
+лимит «сообщение в секунду в чат», а не справочник). Режимы:
+  lazy  — как в проде: справочник грузится в фоне со старта, хэндлеры ждут;
+  eager — справочник грузится до старта polling (как раньше при импорте);
+  floor — процесс, который только импортирует aiogram: ниже не опуститься.
+--json — без mmap-артефакта data/cities.bin (индексы строятся из cities.json).
+Запуск:  python -m benchmarks.startup --runs 3 [--json]
+"""
+import argparse
+import asyncio
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from benchmarks.fake_telegram import FakeTelegram
+from benchmarks.fakes import Updates
+from keyboards.callbacks import LangCb
+
+ROOT = Path(__file__).resolve().parent.parent
+CITY_REPLY = "Введите город прилёта:"
+
+# дочерний процесс: токен и изоляция от data/, затем bot.py как есть
+_CHILD = """
+import runpy, sys
+from pathlib import Path
+import config
+from benchmarks.fakes import BOT_TOKEN, isolate_lookup, redirect_logs
+config.TELEGRAM_TOKEN = BOT_TOKEN
+redirect_logs(Path(sys.argv[1]))
+isolate_lookup(Path(sys.argv[1]))
+if "json" in sys.argv:
+    from utils import citydb
+    citydb.open_compiled = lambda *args, **kwargs: None
+if "eager" in sys.argv:
+    from utils import localization
+    localization._load_db()
+runpy.run_path("bot.py", run_name="__main__")
+"""
+_FLOOR = "import aiogram.types, aiohttp"
+
+
+async def run_once(mode: str, use_json: bool, timeout: float) -> Dict[str, Optional[float]]:
+    tg = FakeTelegram()
+    await tg.start()
+    u = Updates()
+    tg.queue_updates(u.message(1, "/start"), u.callback(1, LangCb(lang="ru").pack()), u.message(1, "Ташкент"))
+    env = {
+        **os.environ, "PYTHONPATH": str(ROOT), "TELEGRAM_API_URL": tg.base_url, "BOT_MODE": "polling",
+        "WORKERS": "0", "PRICES_PREVIEW": "0", "WARMER": "0", "METRICS": "0", "DIAGNOSTICS": "0",
+        "FSM_STORAGE": "memory", "OUTBOUND_SCHEDULER": "0",
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        args = [sys.executable, "-c", _FLOOR] if mode == "floor" else \
+            [sys.executable, "-c", _CHILD, tmp, mode] + (["json"] if use_json else [])
+        log = open(Path(tmp) / "bot.log", "w")
+        start = time.perf_counter()
+        proc = subprocess.Popen(args, cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+        deadline = start + timeout
+        if mode == "floor":
+            while proc.poll() is None and time.perf_counter() < deadline:
+                await asyncio.sleep(0.005)
+            result = {"process": time.perf_counter() - start}
+        else:
+            while tg.first_call("sendmessage", text=CITY_REPLY) is None and time.perf_counter() < deadline:
+                if proc.poll() is not None:
+                    break
+                await asyncio.sleep(0.005)
+            first_poll = tg.first_call("getupdates")
+            city = tg.first_call("sendmessage", text=CITY_REPLY)
+            result = {
+                "first getUpdates": first_poll - start if first_poll else None,
+                "city answered": city - start if city else None,
+            }
+            proc.send_signal(signal.SIGINT)
+        try:
+            proc.wait(15)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        log.close()
+        if None in result.values():
+            print((Path(tmp) / "bot.log").read_text()[-3000:], file=sys.stderr)
+    await tg.stop()
+    return result
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--modes", nargs="+", default=["floor", "lazy", "eager"], choices=["floor", "lazy", "eager"])
+    parser.add_argument("--json", action="store_true", help="без data/cities.bin — индексы из cities.json")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    results: Dict[str, List[Dict[str, Optional[float]]]] = {m: [] for m in args.modes}
+    for _ in range(args.runs):  # режимы вперемешку — дрейф машины делится поровну
+        for mode in args.modes:
+            results[mode].append(await run_once(mode, args.json, args.timeout))
+
+    print(f"python {sys.version.split()[0]}, {args.runs} runs, dataset: "
+          + ("cities.json (no cities.bin)" if args.json else "cities.bin if fresh, else cities.json"))
+    print(f"{'mode':<8}{'milestone':<20}{'median s':>10}{'min s':>8}{'max s':>8}")
+    for mode, runs in results.items():
+        for milestone in runs[0]:
+            xs = [r[milestone] for r in runs]
+            if None in xs:
+                print(f"{mode:<8}{milestone:<20}{'failed':>10}")
+                continue
+            print(f"{mode:<8}{milestone:<20}{statistics.median(xs):>10.2f}{min(xs):>8.2f}{max(xs):>8.2f}")
+    assert all(None not in r.values() for runs in results.values() for r in runs), "бот не ответил"
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
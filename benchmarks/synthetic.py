@@ -0,0 +1,92 @@
+"""
+Синтетический справочник городов в формате data/cities.json.
+
+Имена собираются из русских слогов, у каждого города — переводы
+(en, uz), шесть падежей и уникальный трёхбуквенный IATA-код, так что
+по размеру и составу индексов он близок к боевому (~10 тыс. городов).
+Детерминирован по seed: результаты бенчмарков сравнимы между запусками.
+
+install_citydb() подменяет справочник utils.localization на синтетический
+(mmap-артефакт во временной папке, как в проде, или индекс из JSON).
+"""
+import itertools
+import json
+import random
+import string
+from pathlib import Path
+from typing import Dict, List
+
+_ONSETS = ["б", "в", "г", "д", "ж", "з", "к", "л", "м", "н", "п", "р", "с", "т", "ф", "х", "ц", "ч", "ш", "щ", ""]
+_VOWELS = ["а", "о", "у", "е", "и", "ы", "я", "ю", "ё", "э"]
+_CODAS = ["", "", "н", "р", "к", "л", "й", "м", "с", "т"]
+_ENDINGS = ["ск", "ов", "ань", "град", "абад", "ино", "кент", "поль", "ар", "ия"]
+
+# упрощённая латиница для name_translations (намеренно не та же, что у transliterate)
+_EN = {
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "yo", "ж": "zh", "з": "z",
+    "и": "i", "й": "y", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o", "п": "p", "р": "r",
+    "с": "s", "т": "t", "у": "u", "ф": "f", "х": "kh", "ц": "ts", "ч": "ch", "ш": "sh",
+    "щ": "shch", "ы": "y", "ь": "", "ъ": "", "э": "e", "ю": "yu", "я": "ya",
+}
+# узбекская латиница: x вместо kh, o‘/g‘ и т.п.
+_UZ = {**_EN, "х": "x", "ц": "s", "щ": "sh", "ё": "yo", "о": "o", "у": "u", "й": "y", "ы": "i"}
+
+
+def _latin(name: str, table: Dict[str, str]) -> str:
+    return "".join(table.get(ch, ch) for ch in name.lower()).capitalize()
+
+
+def _cases(name: str) -> Dict[str, str]:
+    stem = name[:-1] if name[-1] in "аяь" else name
+    return {
+        "su": name,
+        "ro": stem + "а",
+        "da": stem + "у",
+        "vi": "в " + name,
+        "tv": stem + "ом",
+        "pr": stem + "е",
+    }
+
+
+def synthetic_cities(n: int = 10_000, seed: int = 1) -> List[dict]:
+    rng = random.Random(seed)
+    codes = ["".join(c) for c in itertools.product(string.ascii_uppercase, repeat=3)]
+    rng.shuffle(codes)
+    seen = set()
+    cities = []
+    while len(cities) < n:
+        parts = [rng.choice(_ONSETS) + rng.choice(_VOWELS) + rng.choice(_CODAS) for _ in range(rng.randint(1, 3))]
+        name = ("".join(parts) + rng.choice(_ENDINGS)).capitalize()
+        if name in seen:
+            continue
+        seen.add(name)
+        cities.append({
+            "name_translations": {"en": _latin(name, _EN), "uz": _latin(name, _UZ)},
+            "cases": _cases(name),
+            "country_code": rng.choice(["UZ", "RU", "KZ", "TR", "AE", "KG", "TJ"]),
+            "code": codes[len(cities)],
+            "time_zone": "Asia/Tashkent",
+            "name": name,
+            "coordinates": {"lat": rng.uniform(-60, 70), "lon": rng.uniform(-180, 180)},
+            "has_flightable_airport": rng.random() < 0.3,
+        })
+    return cities
+
+
+def write_cities(path: Path, cities: List[dict]) -> Path:
+    path.write_text(json.dumps(cities, ensure_ascii=False), encoding="utf-8")
+    return path
+
+
+def install_citydb(cities: List[dict], tmp: Path, compiled: bool = True):
+    """Справочник utils.localization ← cities; возвращает новый индекс."""
+    from utils import citydb, localization
+
+    src = write_cities(tmp / "cities.json", cities)
+    index = citydb.CityIndex(cities)
+    if compiled:
+        index = citydb.MappedCityIndex(citydb.compile_index(index, tmp / "cities.bin", src))
+    localization._DB = index
+    for prepare in localization._PREPARE:  # как фоновая загрузка: клавиатуры пассажиров и т.п.
+        prepare()
+    return index
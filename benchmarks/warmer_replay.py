@@ -0,0 +1,156 @@
+"""
+Прогрев кэша цен: доля попаданий в пик с прогревом и без.
+
+Пишет синтетический журнал кликов (маршруты и даты по закону Ципфа —
+немного популярных направлений и длинный хвост), прогоняет один цикл
+CacheWarmer против поддельного Travelpayouts и затем «пик»: --peak
+показов экрана проверки и сетки дней с поездками из того же
+распределения. Печатает долю ответов из кэша холодным и прогретым
+кэшем, расход бюджета апстрима и проверяет паузу прогрева под трафиком.
+Запуск:  python -m benchmarks.warmer_replay --routes 200 --users 3000 --peak 2000
+"""
+import argparse
+import asyncio
+import json
+import random
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import List
+
+import config
+from benchmarks.fake_travelpayouts import FakeTravelpayouts
+from utils import prices
+from utils.http import close_session
+from utils.warmer import CacheWarmer, Trip
+
+CITIES = ["TAS", "SKD", "BHK", "NMA", "FEG", "UGC", "NCU", "TMJ", "KSQ", "AZN",
+          "MOW", "LED", "IST", "DXB", "ALA", "TSE", "KZN", "SVX", "OVB", "ICN"]
+
+
+def make_trips(n_routes: int, rng: random.Random) -> List[Trip]:
+    """Пул поездок: n_routes маршрутов, у каждого несколько популярных дат."""
+    today = date.today()
+    routes = list({(a, b) for a in CITIES for b in CITIES if a != b})
+    rng.shuffle(routes)
+    trips = []
+    for origin, destination in routes[:n_routes]:
+        for _ in range(3):
+            dep = today + timedelta(days=rng.randint(5, 80))
+            ret = dep + timedelta(days=rng.randint(3, 14)) if rng.random() < 0.6 else None
+            trips.append(Trip(origin, destination, dep.isoformat(), ret.isoformat() if ret else ""))
+    return trips
+
+
+def zipf_pick(trips: List[Trip], rng: random.Random, s: float = 1.1) -> Trip:
+    weights = [1 / (i + 1) ** s for i in range(len(trips))]
+    return rng.choices(trips, weights)[0]
+
+
+def write_log(path: Path, trips: List[Trip], users: int, rng: random.Random) -> None:
+    now = datetime.utcnow()
+    weights = [1 / (i + 1) ** 1.1 for i in range(len(trips))]
+    with path.open("w", encoding="utf-8") as f:
+        for u, trip in enumerate(rng.choices(trips, weights, k=users)):
+            ts = (now - timedelta(hours=rng.uniform(0, 72))).isoformat()
+            d, r = date.fromisoformat(trip.depart), trip.ret and date.fromisoformat(trip.ret)
+            url = (f"https://aviasales.uz/search/{trip.origin}{d:%d%m}{trip.destination}"
+                   f"{f'{r:%d%m}' if r else ''}1?adults=1&children=0&infants=0&language=ru")
+            for step, payload in (("origin", {"iata": trip.origin}),
+                                  ("destination", {"iata": trip.destination}),
+                                  ("link_sent", {"url": url})):
+                f.write(json.dumps({"user_id": u, "ts": ts, "step": step, "payload": payload}) + "\n")
+
+
+async def peak(trips: List[Trip], n: int, seed: int) -> List[float]:
+    """n показов экрана проверки + сетки дней; по каждому — доля ответов из кэша (0 / 0.5 / 1)."""
+    rng = random.Random(seed)
+    hits = []
+    for _ in range(n):
+        t = zipf_pick(trips, rng)
+        dep = date.fromisoformat(t.depart)
+        fare_hit = prices.fresh_for(*t) > 0
+        month_hit = prices.month_fresh_for(t.origin, t.destination, dep.year, dep.month) > 0
+        hits.append((fare_hit + month_hit) / 2)
+        await prices.cheapest(*t)
+        await prices.month_prices(t.origin, t.destination, dep.year, dep.month, budget=5)
+    return hits
+
+
+def ratio(hits: List[float]) -> str:
+    head = hits[:len(hits) // 10]
+    return f"{sum(head) / len(head):.0%} first 10% / {sum(hits) / len(hits):.0%} overall"
+
+
+def reset() -> None:
+    prices._CACHE.clear()
+    prices._MONTHS.clear()
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--routes", type=int, default=200)
+    parser.add_argument("--users", type=int, default=3000, help="поисков в журнале")
+    parser.add_argument("--peak", type=int, default=2000, help="показов в пик")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--budget", type=int, default=150)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    trips = make_trips(args.routes, rng)
+    tp = FakeTravelpayouts()
+    await tp.start()
+    config.TRAVELPAYOUTS_API_URL = tp.base_url
+
+    with tempfile.TemporaryDirectory() as tmp:
+        log = Path(tmp) / "user_logs.json"
+        write_log(log, trips, args.users, rng)
+
+        reset()
+        cold = await peak(trips, args.peak, args.seed)
+        cold_calls = sum(tp.calls.values())
+
+        reset()
+        tp.calls.clear()
+        warmer = CacheWarmer(log, traffic=lambda: 0, top_n=args.top, budget=args.budget, spacing=0)
+        start = time.perf_counter()
+        await warmer.cycle()
+        warm_time = time.perf_counter() - start
+        spent = sum(tp.calls.values())
+        warm = await peak(trips, args.peak, args.seed)
+        warm_calls = sum(tp.calls.values()) - spent
+
+        # пауза: трафик 50 соб/с при пороге 5 — прогрев не должен сделать ни одного запроса
+        reset()
+        tp.calls.clear()
+        events = 0
+
+        def traffic() -> int:
+            return events
+
+        busy = CacheWarmer(log, traffic=traffic, top_n=args.top, budget=args.budget, spacing=0, pause_rate=5)
+        await busy.start()
+        for _ in range(30):
+            events += 5
+            await asyncio.sleep(0.1)
+        paused_calls = sum(tp.calls.values())
+        await busy.stop()
+
+    print(f"log: {args.users} searches over {args.routes} routes; warmer top {args.top}, budget {args.budget}")
+    print(f"warm-up cycle: {spent} upstream calls in {warm_time:.2f} s, {warmer.stats}")
+    print(f"peak of {args.peak} views, cache hits:")
+    print(f"  cold {ratio(cold)}, {cold_calls} upstream calls")
+    print(f"  warm {ratio(warm)}, {warm_calls} upstream calls")
+    print(f"under live traffic: {paused_calls} upstream calls in 3 s, paused {busy.stats['paused']}×")
+    assert spent <= args.budget
+    assert sum(warm) > sum(cold)
+    assert paused_calls == 0 and busy.stats["paused"] >= 1
+
+    await close_session()
+    await tp.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,101 @@
+"""
+Сквозной прогон вебхук-режима против поддельного Telegram.
+
+Поднимает FakeTelegram и aiohttp-приложение бота (make_webhook_app),
+проверяет setWebhook с секретом и отказ 401 при чужом секрете, затем
+параллельно прогоняет полные сценарии поиска users пользователей и
+сверяет, что каждый получил ссылку. Печатает время ответа вебхука
+(p50/p99), пропускную способность и пик одновременных апдейтов.
+Запуск:  python -m benchmarks.webhook_e2e --users 200 --concurrency 32 --api-latency 0.02
+"""
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+from typing import List
+
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiohttp import web
+
+import config
+from benchmarks.fake_telegram import FakeTelegram, free_port
+from benchmarks.fakes import Updates, no_prices, redirect_logs, search_flow
+from bot import make_dispatcher
+from utils.webhook import WEBHOOK_HANDLER, make_webhook_app
+
+
+def percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32, help="WEBHOOK_MAX_CONCURRENCY")
+    parser.add_argument("--api-latency", type=float, default=0.02, help="задержка ответа Bot API, сек")
+    args = parser.parse_args()
+
+    tg = FakeTelegram(latency=args.api_latency)
+    await tg.start()
+    port = free_port()
+    config.WEBHOOK_BASE_URL = f"http://127.0.0.1:{port}"
+    config.WEBHOOK_SECRET = ""  # пусть сгенерируется случайный — проверим, что он ушёл в setWebhook
+    config.WEBHOOK_MAX_CONCURRENCY = args.concurrency
+    url = config.WEBHOOK_BASE_URL + config.WEBHOOK_PATH
+
+    with tempfile.TemporaryDirectory() as tmp:
+        redirect_logs(Path(tmp))
+        no_prices()
+
+        bot = tg.make_bot()
+        app = make_webhook_app(make_dispatcher(MemoryStorage()), bot)
+        handler = app[WEBHOOK_HANDLER]
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()  # здесь же startup-хуки и setWebhook
+        await web.TCPSite(runner, "127.0.0.1", port).start()
+
+        (_, hook), = [r for r in tg.requests if r[0] == "setwebhook"]
+        secret = hook["secret_token"]
+        assert hook["url"] == url, hook
+        status, _ = await tg.post_update(url, Updates().message(1, "/start"), "wrong-secret")
+        assert status == 401, status
+
+        updates = Updates()
+        year = date.today().year + 1
+        flows = [search_flow(updates, 20_000 + u, year) for u in range(args.users)]
+        acks: List[float] = []
+
+        async def user(flow):
+            for raw in flow:
+                status, elapsed = await tg.post_update(url, raw, secret)
+                assert status == 200, status
+                acks.append(elapsed)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(user(f) for f in flows))
+        while handler.in_flight:
+            await asyncio.sleep(0.01)
+        elapsed = time.perf_counter() - start
+        stats = dict(handler.stats)
+        await runner.cleanup()
+    await tg.stop()
+
+    done = sum(
+        any("aviasales" in p.get("text", "") for p in tg.sent_to(20_000 + u)) for u in range(args.users)
+    )
+    n = len(acks)
+    print(f"updates: {n}, users: {args.users}, flows finished: {done}/{args.users}")
+    print(f"webhook ack: p50 {statistics.median(acks) * 1e3:.1f} ms, p99 {percentile(acks, 0.99) * 1e3:.1f} ms")
+    print(f"throughput: {n / elapsed:.0f} updates/s ({elapsed:.2f} s)")
+    print(f"in flight: peak {stats['peak']} / limit {args.concurrency}, waited for slot {stats['waited']}")
+    print(f"rejected: {stats['rejected']}, failed: {stats['failed']}, api calls: {sum(tg.calls.values())}")
+    assert done == args.users, "не все сценарии дошли до ссылки"
+    assert stats["peak"] <= args.concurrency
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
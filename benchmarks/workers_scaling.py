@@ -0,0 +1,99 @@
+"""
+Пропускная способность супервизора с N воркерами (шардирование по user_id).
+
+Для каждого N из --workers поднимается Supervisor, все сценарии поиска
+(benchmarks.fakes.search_flow) раздаются воркерам, а время считается до
+момента, когда последний пользователь получил ссылку от поддельного
+Telegram. В конце проверяется перезапуск: воркер убивается, супервизор
+поднимает его заново, и новый сценарий на этом шарде доходит до конца.
+Запуск:  python -m benchmarks.workers_scaling --workers 1 2 4 --users 400
+"""
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+
+import config
+from benchmarks.fake_telegram import FakeTelegram
+from benchmarks.fakes import BOT_TOKEN, Updates, no_prices, redirect_logs, search_flow
+from utils.workers import Supervisor
+
+
+def init_worker(tmp: Path) -> None:
+    logging.getLogger().setLevel(logging.WARNING)
+    redirect_logs(tmp)
+    no_prices()
+    config.OUTBOUND_SCHEDULER = False  # у поддельного Telegram нет лимитов — меряем сами воркеры
+
+
+async def wait_for(predicate, timeout: float, what: str) -> None:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise TimeoutError(what)
+        await asyncio.sleep(0.02)
+
+
+def links(tg: FakeTelegram) -> int:
+    return sum("aviasales" in p.get("text", "") for m, p in tg.requests if m == "sendmessage")
+
+
+async def run(n: int, users: int, tmp: Path, check_restart: bool) -> float:
+    tg = FakeTelegram()
+    await tg.start()
+    supervisor = Supervisor(
+        n, BOT_TOKEN, api_base=tg.base_url, health_timeout=5,
+        initializer=init_worker, initargs=(tmp,),
+    )
+    supervisor.start()
+    try:
+        await wait_for(supervisor.ready, 60, "воркеры не поднялись")
+        updates = Updates()
+        year = date.today().year + 1
+        flows = [search_flow(updates, 30_000 + u, year) for u in range(users)]
+
+        start = time.perf_counter()
+        for step in zip(*flows):  # пользователи идут «вперемешку», как в жизни
+            for raw in step:
+                await supervisor.route(raw)
+        await wait_for(lambda: links(tg) >= users, 300, "не все сценарии завершились")
+        elapsed = time.perf_counter() - start
+
+        if check_restart:
+            victim = supervisor.workers[0]
+            victim.process.kill()
+            await wait_for(lambda: supervisor.stats["restarts"] >= 1 and supervisor.ready(), 60, "нет рестарта")
+            before = links(tg)
+            for raw in search_flow(updates, n * 1000, year):  # user_id % n == 0 → воркер 0
+                await supervisor.route(raw)
+            await wait_for(lambda: links(tg) > before, 60, "после рестарта сценарий не дошёл")
+            print(f"  restart check: worker 0 killed → restarted, flow on its shard finished")
+    finally:
+        await supervisor.stop()
+        await tg.stop()
+    return elapsed
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--users", type=int, default=400)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    n_updates = args.users * 14
+    print(f"{os.cpu_count()} CPU, {args.users} users, {n_updates} updates")
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for i, n in enumerate(args.workers):
+            results[n] = await run(n, args.users, Path(tmp), check_restart=i == len(args.workers) - 1)
+            base = results[args.workers[0]]
+            print(f"workers={n:<3} {n_updates / results[n]:>8.0f} updates/s  {base / results[n]:>5.2f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,11 +1,174 @@
 import asyncio
 import logging
+from pathlib import Path
+from typing import Optional
 from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.fsm.storage.base import BaseStorage
+from aiogram.fsm.storage.memory import SimpleEventIsolation
 from aiogram.fsm.storage.memory import MemoryStorage
 import config
 from handlers import user_flow
+from handlers.middlewares import HandlerMetricsMiddleware, ReadinessMiddleware, StateBufferMiddleware
+from utils import logger as action_log
+from utils import metrics, prices
+from utils.http import close_session
+from utils.outbound import ScheduledSession
+from utils.warmer import CacheWarmer
+from utils import localization
+from utils.localization import flush_aliases, lookup_stats
+
+
+def make_storage() -> BaseStorage:
+    """FSM-хранилище по config.FSM_STORAGE."""
+    if config.FSM_STORAGE == "sqlite":
+        from utils.fsm_storage import SQLiteStorage
+
+        return SQLiteStorage(
+            Path(config.FSM_DB_PATH),
+            ttl=config.FSM_TTL,
+            flush_interval=config.FSM_FLUSH_INTERVAL,
+        )
+    return MemoryStorage()
+
+
+def make_bot(api_base: str = "", token: Optional[str] = None) -> Bot:
+    """Bot с HTML по умолчанию; api_base — свой Bot API сервер (или поддельный в бенчмарках)."""
+    api_base = api_base or config.TELEGRAM_API_URL
+    session = AiohttpSession(api=TelegramAPIServer.from_base(api_base)) if api_base else AiohttpSession()
+    if config.OUTBOUND_SCHEDULER:
+        session = ScheduledSession(
+            session,
+            global_rate=config.OUTBOUND_GLOBAL_RATE,
+            chat_rate=config.OUTBOUND_CHAT_RATE,
+            chat_burst=config.OUTBOUND_CHAT_BURST,
+        )
+        if config.METRICS:
+            metrics.watch("outbound", "Очередь исходящих запросов к Bot API", session.snapshot)
+    if config.METRICS:
+        session.middleware(metrics.RequestMetrics())
+    return Bot(
+        token=token or config.TELEGRAM_TOKEN,
+        session=session,
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML),
+    )
+
+
+def watch_components(storage: BaseStorage) -> None:
+    """Статистика журналов, кэшей и FSM-хранилища в /metrics (читается при каждом запросе)."""
+    journal_help = "Журналы событий: принято, записано, отброшено, ротаций"
+    metrics.watch("journal", journal_help, lambda: user_flow.FLOW_LOG.stats, journal="flow")
+    metrics.watch("journal", journal_help, lambda: action_log.ACTIONS_LOG.stats, journal="actions")
+    metrics.watch("prices", "Цены Travelpayouts: запросы в апстрим и кэши", prices.snapshot)
+    metrics.watch("lookup", "Справочник городов и алиасы", lookup_stats)
+    keyboards_help = "lru_cache клавиатур: hits, misses, currsize"
+    for fn in (user_flow.build_year_kb, user_flow._month_kb, user_flow._day_kb):
+        metrics.watch("keyboard_cache", keyboards_help, lambda fn=fn: fn.cache_info()._asdict(), keyboard=fn.__name__)
+    if isinstance(getattr(storage, "stats", None), dict):
+        metrics.watch("fsm_storage", "FSM-хранилище: загрузки, сбросы, истечения", lambda: storage.stats)
+
+
+def add_diagnostics(dp: Dispatcher) -> None:
+    """Лаг цикла, стек при зависании, профили медленных хэндлеров (DIAGNOSTICS=1)."""
+    from utils.diagnostics import LoopMonitor, SlowUpdateProfiler
+
+    monitor = LoopMonitor(interval=config.DIAG_LAG_INTERVAL, warn=config.DIAG_LAG_WARN, stall=config.DIAG_STALL)
+    dp.startup.register(monitor.start)
+    dp.shutdown.register(monitor.stop)
+    profiler = SlowUpdateProfiler(
+        Path(config.DIAG_PROFILE_DIR),
+        threshold=config.DIAG_SLOW_UPDATE,
+        rate=config.DIAG_PROFILE_RATE,
+        keep=config.DIAG_PROFILE_KEEP,
+        callback_name=user_flow.callback_handler_name,
+    )
+    dp.message.middleware(profiler)
+    dp.callback_query.middleware(profiler)
+    if config.METRICS:
+        metrics.watch("loop_monitor", "Лаг цикла событий: замеры, опоздания, зависания", lambda: monitor.stats)
+        metrics.watch("slow_updates", "Профилировщик медленных апдейтов", lambda: profiler.stats)
+
+
+def make_dispatcher(storage: BaseStorage, workers: int = 1) -> Dispatcher:
+    """
+    Диспетчер со всеми роутерами, middleware и хуками (его же берут бенчмарки).
+    workers — сколько процессов с таким диспетчером работает рядом (WORKERS):
+    у каждого свой кэш цен и свой прогрев, поэтому бюджет прогрева и порог
+    паузы делятся между ними — в апстрим за цикл уходит не больше WARMER_BUDGET,
+    а трафик каждый воркер видит только своего шарда.
+    """
+    # апдейты одного пользователя не обрабатываются параллельно (вебхук шлёт их вперемешку)
+    dp = Dispatcher(storage=storage, events_isolation=SimpleEventIsolation())
+    dp.startup.register(localization.start_loading)  # справочник грузится, пока бот подключается
+    if config.METRICS:  # снаружи буфера FSM: время хэндлера вместе с итоговой записью
+        handler_metrics = HandlerMetricsMiddleware(user_flow.callback_handler_name)
+        dp.message.middleware(handler_metrics)
+        dp.callback_query.middleware(handler_metrics)
+        watch_components(storage)
+        dp.startup.register(metrics.start)
+        dp.shutdown.register(metrics.stop)
+    if config.DIAGNOSTICS:
+        add_diagnostics(dp)
+    gate = ReadinessMiddleware(localization.ready, localization.wait_ready)
+    dp.message.middleware(gate)
+    dp.callback_query.middleware(gate)  # экран проверки тоже читает справочник
+    state_buffer = StateBufferMiddleware()  # одно чтение / одна запись FSM на апдейт
+    dp.message.middleware(state_buffer)
+    dp.callback_query.middleware(state_buffer)
+    dp.include_router(user_flow.router)
+    dp.startup.register(user_flow.FLOW_LOG.start)
+    dp.startup.register(action_log.start)
+    dp.shutdown.register(user_flow.FLOW_LOG.stop)  # дописать очередь кликов
+    dp.shutdown.register(action_log.ACTIONS_LOG.stop)
+    if config.WARMER and config.PRICES_PREVIEW:
+        warmer = CacheWarmer(
+            user_flow.FLOW_LOG.path,
+            traffic=lambda: user_flow.FLOW_LOG.stats["emitted"],
+            interval=config.WARMER_INTERVAL,
+            top_n=config.WARMER_TOP_ROUTES,
+            window_days=config.WARMER_WINDOW_DAYS,
+            months=config.PRICES_PREFETCH_MONTHS,
+            budget=max(1, config.WARMER_BUDGET // workers),
+            spacing=config.WARMER_SPACING,
+            pause_rate=config.WARMER_PAUSE_RATE / workers,
+        )
+        dp.startup.register(warmer.start)
+        dp.shutdown.register(warmer.stop)  # до close_session: прогрев ходит через общую сессию
+    dp.shutdown.register(flush_aliases)
+    dp.shutdown.register(close_session)
+    return dp
+
+
+async def run_supervisor(bot: Bot) -> None:
+    """WORKERS > 0: этот процесс только принимает апдейты и раздаёт их воркерам."""
+    from utils.workers import Supervisor
+
+    supervisor = Supervisor(
+        config.WORKERS,
+        bot.token,
+        api_base=config.TELEGRAM_API_URL,
+        health_timeout=config.WORKER_HEALTH_TIMEOUT,
+        queue_size=config.WORKER_QUEUE_SIZE,
+    )
+    supervisor.start()
+    if config.METRICS:
+        metrics.watch("supervisor", "Супервизор: роздано апдейтов, перезапусков, полных очередей", lambda: supervisor.stats)
+        await metrics.start()
+    try:
+        if config.BOT_MODE == "webhook":
+            from utils.webhook import serve
+
+            await serve(supervisor.webhook_app(bot), config.WEBHOOK_HOST, config.WEBHOOK_PORT)
+        else:
+            await supervisor.poll(bot)
+    finally:
+        await supervisor.stop()
+        await metrics.stop()
+        await bot.session.close()
+
 
 async def main() -> None:
     logging.basicConfig(
@@ -13,12 +176,18 @@ async def main() -> None:
         format="%(asctime)s [%(levelname)s] %(message)s",
     )
 
-    bot = Bot(
-        token=config.TELEGRAM_TOKEN,
-        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
-    )
-    dp = Dispatcher(storage=MemoryStorage())
-    dp.include_router(user_flow.router)
+    bot = make_bot()
+    if config.WORKERS > 0:
+        await run_supervisor(bot)
+        return
+    await localization.start_loading()  # ещё до deleteWebhook/getMe
+    dp = make_dispatcher(make_storage())
+
+    if config.BOT_MODE == "webhook":
+        from utils.webhook import make_webhook_app, serve
+
+        await serve(make_webhook_app(dp, bot), config.WEBHOOK_HOST, config.WEBHOOK_PORT)
+        return
 
     await bot.delete_webhook(drop_pending_updates=True)
     await dp.start_polling(bot)
@@ -1,9 +1,99 @@
 import os
 
 TELEGRAM_TOKEN = os.getenv("7820675546:AAEGzgVULjYbcgcuBhVGD7TDg2YYV_R3GZQ")
-TRAVELPAYOUTS_API_KEY = os.getenv("773c5f598a965aeea0b4c63f2d30d45a")
+TRAVELPAYOUTS_API_KEY = os.getenv("TRAVELPAYOUTS_API_KEY", "773c5f598a965aeea0b4c63f2d30d45a")
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "")  # свой Bot API сервер; пусто — api.telegram.org
 
 LANGS = [
     'ru',
     'uz',
 ]
+
+# Travelpayouts: справочник городов (резервный поиск IATA)
+TRAVELPAYOUTS_DATA_URL = os.getenv(
+    "TRAVELPAYOUTS_DATA_URL", "https://api.travelpayouts.com/data/ru/cities.json"
+)
+REMOTE_CITIES_TTL = int(os.getenv("REMOTE_CITIES_TTL", 24 * 3600))  # сек
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", 10))  # сек, на весь запрос
+
+# Журнал кликов (data/user_logs.json): батч-запись в фоне
+FLOW_LOG_BATCH = int(os.getenv("FLOW_LOG_BATCH", 200))  # записей в пачке
+FLOW_LOG_INTERVAL = float(os.getenv("FLOW_LOG_INTERVAL", 1.0))  # сек между сбросами
+FLOW_LOG_MAX_QUEUE = int(os.getenv("FLOW_LOG_MAX_QUEUE", 10_000))  # дальше — drop
+FLOW_LOG_MAX_BYTES = int(os.getenv("FLOW_LOG_MAX_BYTES", 50 * 1024 * 1024))  # 0 — без ротации
+FLOW_LOG_ROTATE_INTERVAL = float(os.getenv("FLOW_LOG_ROTATE_INTERVAL", 0))  # сек, 0 — выкл.
+FLOW_LOG_BACKUPS = int(os.getenv("FLOW_LOG_BACKUPS", 5))
+
+# Пользовательские алиасы (data/user_aliases.json)
+ALIASES_MAX = int(os.getenv("ALIASES_MAX", 5000))  # сверх — вытесняем редкие
+ALIASES_FLUSH_DELAY = float(os.getenv("ALIASES_FLUSH_DELAY", 2.0))  # сек, debounce записи
+
+# Ненайденные города: негативный кэш и лимит обращений к API на пользователя
+IATA_MISS_CACHE_SIZE = int(os.getenv("IATA_MISS_CACHE_SIZE", 10_000))  # промахов (строк ввода) в памяти
+IATA_MISS_TTL = float(os.getenv("IATA_MISS_TTL", 600))  # сек, потом ищем заново (справочник API мог обновиться)
+IATA_REMOTE_RATE = float(os.getenv("IATA_REMOTE_RATE", 0.1))  # обращений к API в секунду на пользователя
+IATA_REMOTE_BURST = float(os.getenv("IATA_REMOTE_BURST", 3))  # запас на всплеск
+
+# FSM-хранилище: memory (по умолчанию) или sqlite (переживает рестарт)
+FSM_STORAGE = os.getenv("FSM_STORAGE", "memory")
+FSM_DB_PATH = os.getenv("FSM_DB_PATH", "data/fsm.sqlite3")
+FSM_TTL = float(os.getenv("FSM_TTL", 24 * 3600))  # сек простоя до сброса сессии
+FSM_FLUSH_INTERVAL = float(os.getenv("FSM_FLUSH_INTERVAL", 1.0))  # сек
+
+# Режим работы: polling (по умолчанию) или webhook (aiohttp-сервер)
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_BASE_URL = os.getenv("WEBHOOK_BASE_URL", "")  # https://bot.example.com; пусто — setWebhook не вызываем
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/tg/webhook")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", 8080))
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")  # пусто — случайный на каждый запуск
+WEBHOOK_MAX_CONCURRENCY = int(os.getenv("WEBHOOK_MAX_CONCURRENCY", 64))  # апдейтов в обработке одновременно
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", 40))  # параметр setWebhook
+
+# Несколько процессов: супервизор раздаёт апдейты воркерам по user_id
+WORKERS = int(os.getenv("WORKERS", 0))  # 0 — один процесс без супервизора
+WORKER_MAX_CONCURRENCY = int(os.getenv("WORKER_MAX_CONCURRENCY", 64))  # апдейтов в обработке на воркер
+WORKER_HEALTH_TIMEOUT = float(os.getenv("WORKER_HEALTH_TIMEOUT", 15))  # сек без «пульса» до перезапуска
+WORKER_QUEUE_SIZE = int(os.getenv("WORKER_QUEUE_SIZE", 1000))  # апдейтов в очереди воркера
+
+# Исходящие запросы к Bot API: очередь с лимитами Telegram
+OUTBOUND_SCHEDULER = os.getenv("OUTBOUND_SCHEDULER", "1") == "1"  # 0 — слать напрямую
+OUTBOUND_GLOBAL_RATE = float(os.getenv("OUTBOUND_GLOBAL_RATE", 30))  # сообщений/с на бота
+OUTBOUND_CHAT_RATE = float(os.getenv("OUTBOUND_CHAT_RATE", 1))  # сообщений/с в один чат
+OUTBOUND_CHAT_BURST = float(os.getenv("OUTBOUND_CHAT_BURST", 3))  # запас на всплеск в чате
+
+# Цены Travelpayouts (превью на экране проверки)
+PRICES_PREVIEW = os.getenv("PRICES_PREVIEW", "1") == "1"  # 0 — экран проверки без цены
+TRAVELPAYOUTS_API_URL = os.getenv("TRAVELPAYOUTS_API_URL", "https://api.travelpayouts.com")
+PRICES_CURRENCY = os.getenv("PRICES_CURRENCY", "uzs")
+PRICES_TTL = float(os.getenv("PRICES_TTL", 1800))  # сек
+PRICES_NEGATIVE_TTL = float(os.getenv("PRICES_NEGATIVE_TTL", 300))  # сек, «цены нет» / ошибка
+PRICES_CACHE_SIZE = int(os.getenv("PRICES_CACHE_SIZE", 5000))  # маршрутов×дат в памяти
+PRICES_BUDGET = float(os.getenv("PRICES_BUDGET", 1.5))  # сек, дольше экран проверки не ждёт цену
+PRICES_MONTH_BUDGET = float(os.getenv("PRICES_MONTH_BUDGET", 0.5))  # сек, ожидание календаря цен перед сеткой дней
+PRICES_PREFETCH_MONTHS = int(os.getenv("PRICES_PREFETCH_MONTHS", 3))  # ближайших месяцев грузим при показе клавиатуры месяцев
+PRICES_CHEAP_DAYS = int(os.getenv("PRICES_CHEAP_DAYS", 3))  # сколько самых дешёвых дней помечать 💰
+
+# Прогрев кэша цен для популярных направлений (по журналу кликов)
+WARMER = os.getenv("WARMER", "1") == "1"
+WARMER_INTERVAL = float(os.getenv("WARMER_INTERVAL", 900))  # сек между циклами
+WARMER_TOP_ROUTES = int(os.getenv("WARMER_TOP_ROUTES", 20))  # сколько маршрутов греть
+WARMER_WINDOW_DAYS = float(os.getenv("WARMER_WINDOW_DAYS", 14))  # за какой период считать популярность
+WARMER_BUDGET = int(os.getenv("WARMER_BUDGET", 60))  # запросов в апстрим за цикл
+WARMER_SPACING = float(os.getenv("WARMER_SPACING", 0.2))  # сек между запросами прогрева
+WARMER_PAUSE_RATE = float(os.getenv("WARMER_PAUSE_RATE", 5))  # кликов/с, выше — прогрев ждёт
+
+# Метрики в формате Prometheus (utils/metrics.py)
+METRICS = os.getenv("METRICS", "0") == "1"  # 0 — не собираем и не слушаем порт
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")  # только локально; наружу — через прокси/агент
+METRICS_PORT = int(os.getenv("METRICS_PORT", 9108))  # воркеры: METRICS_PORT + 1 + номер
+
+# Диагностика блокировок цикла событий (utils/diagnostics.py)
+DIAGNOSTICS = os.getenv("DIAGNOSTICS", "0") == "1"
+DIAG_LAG_INTERVAL = float(os.getenv("DIAG_LAG_INTERVAL", 0.1))  # сек между замерами лага
+DIAG_LAG_WARN = float(os.getenv("DIAG_LAG_WARN", 0.1))  # сек, лаг больше — в лог
+DIAG_STALL = float(os.getenv("DIAG_STALL", 0.5))  # сек без пульса — снимаем стек потока цикла
+DIAG_SLOW_UPDATE = float(os.getenv("DIAG_SLOW_UPDATE", 1.0))  # сек, хэндлер дольше — в лог (и профиль на диск)
+DIAG_PROFILE_RATE = float(os.getenv("DIAG_PROFILE_RATE", 0.1))  # доля апдейтов под cProfile; 1.0 — все (вдвое медленнее)
+DIAG_PROFILE_DIR = os.getenv("DIAG_PROFILE_DIR", "data/profiles")
+DIAG_PROFILE_KEEP = int(os.getenv("DIAG_PROFILE_KEEP", 50))  # сколько последних профилей хранить
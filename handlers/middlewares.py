@@ -0,0 +1,158 @@
+import time
+from typing import Any, Awaitable, Callable, Dict, Mapping, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import StateType
+from aiogram.types import CallbackQuery, TelegramObject
+
+from utils import metrics
+
+_UNSET = object()
+
+
+class BufferedFSMContext(FSMContext):
+    """
+    FSMContext на время одного апдейта.
+
+    Состояние берём из raw_state (его уже прочитал FSMContextMiddleware),
+    данные читаем из хранилища не больше одного раза; все set_/update_
+    меняют только локальную копию. commit() пишет итог одним заходом,
+    а если хэндлер упал — изменения просто выбрасываются.
+    """
+
+    def __init__(self, inner: FSMContext, raw_state: Optional[str] = _UNSET):
+        super().__init__(storage=inner.storage, key=inner.key)
+        self._state = raw_state
+        self._data: Optional[Dict[str, Any]] = None
+        self._state_dirty = False
+        self._data_dirty = False
+
+    async def _load(self) -> Dict[str, Any]:
+        if self._data is None:
+            self._data = await self.storage.get_data(key=self.key)
+        return self._data
+
+    async def get_state(self) -> Optional[str]:
+        if self._state is _UNSET:
+            self._state = await self.storage.get_state(key=self.key)
+        return self._state
+
+    async def set_state(self, state: StateType = None) -> None:
+        self._state = state.state if isinstance(state, State) else state
+        self._state_dirty = True
+
+    async def get_data(self) -> Dict[str, Any]:
+        return (await self._load()).copy()
+
+    async def set_data(self, data: Mapping[str, Any]) -> None:
+        self._data = dict(data)
+        self._data_dirty = True
+
+    async def update_data(self, data: Optional[Mapping[str, Any]] = None, **kwargs: Any) -> Dict[str, Any]:
+        if data:
+            kwargs.update(data)
+        merged = await self._load()
+        merged.update(kwargs)
+        self._data_dirty = True
+        return merged.copy()
+
+    async def get_value(self, key: str, default: Any = None) -> Any:
+        return (await self._load()).get(key, default)
+
+    async def clear(self) -> None:
+        self._state, self._data = None, {}
+        self._state_dirty = self._data_dirty = True
+
+    async def commit(self) -> None:
+        if not (self._state_dirty or self._data_dirty):
+            return
+        write = getattr(self.storage, "set_record", None)
+        if write is not None and self._state_dirty and self._data_dirty:
+            await write(self.key, self._state, self._data)  # один заход вместо двух
+        else:
+            if self._data_dirty:
+                await self.storage.set_data(key=self.key, data=self._data)
+            if self._state_dirty:
+                await self.storage.set_state(key=self.key, state=self._state)
+        self._state_dirty = self._data_dirty = False
+
+
+class StateBufferMiddleware(BaseMiddleware):
+    """
+    Подменяет data["state"] на BufferedFSMContext: одна загрузка данных
+    и одна итоговая запись на апдейт, откат при исключении в хэндлере.
+    enabled=False — прозрачный режим (для сравнения в бенчмарке).
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        state = data.get("state")
+        if not self.enabled or state is None or isinstance(state, BufferedFSMContext):
+            return await handler(event, data)
+        buffered = BufferedFSMContext(state, data.get("raw_state", _UNSET))
+        data["state"] = buffered
+        result = await handler(event, data)
+        await buffered.commit()
+        return result
+
+
+class ReadinessMiddleware(BaseMiddleware):
+    """
+    Хэндлеры ждут, пока догрузится справочник городов (грузится в фоне
+    со старта бота). После готовности — одна проверка флага на апдейт.
+    """
+
+    def __init__(self, ready: Callable[[], bool], wait: Callable[[], Awaitable[None]]):
+        self.ready = ready
+        self.wait = wait
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if not self.ready():
+            await self.wait()
+        return await handler(event, data)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """
+    Время и исключения хэндлера → utils.metrics, с меткой-именем хэндлера.
+
+    Все кнопки обслуживает один dispatch_callback, поэтому для callback_query
+    имя берётся через callback_name(data) — по таблице префиксов.
+    Регистрируется только при METRICS=1.
+    """
+
+    def __init__(self, callback_name: Callable[[Optional[str]], str]):
+        self.callback_name = callback_name
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if isinstance(event, CallbackQuery):
+            name = self.callback_name(event.data)
+        else:
+            name = data["handler"].callback.__name__
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            metrics.HANDLER_ERRORS.inc(name)
+            raise
+        finally:
+            metrics.HANDLER_SECONDS.observe(time.perf_counter() - start, name)
@@ -1,11 +1,15 @@
-import json
+import calendar
 import logging
 from datetime import datetime, date
+from functools import lru_cache
 from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional, Tuple, Type
 
 from aiogram import Router, F
 from aiogram.filters import CommandStart
+from aiogram.filters.callback_data import CallbackData
 from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State
 from aiogram.types import (
     Message,
     CallbackQuery,
@@ -15,9 +19,25 @@ from aiogram.types import (
 )
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
+import config
+from keyboards.callbacks import (
+    BackCb,
+    ConfirmCb,
+    DayCb,
+    LangCb,
+    MonthCb,
+    NoopCb,
+    NoReturnCb,
+    PaxCb,
+    RestartCb,
+    YearCb,
+)
 from states.search import Search
-from utils.localization import get_iata, city_by_iata
+from utils import outbound
+from utils.journal import EventSink
+from utils.localization import get_iata, city_by_iata, on_load
 from utils.logger import log_action  # action-логи в JSON
+from utils.prices import cheapest_days, cheapest_within, format_price, month_prices, prefetch_months
 
 logger = logging.getLogger(__name__)
 router = Router()
@@ -36,45 +56,68 @@ MONTHS_UZ = [
 ]
 
 LOG_PATH = Path(__file__).resolve().parent.parent / "data" / "user_logs.json"
-LOG_PATH.touch(exist_ok=True)
+
+# Клики пишет фоновый батч-писатель (старт/стоп — в bot.py); файл он же и создаст
+FLOW_LOG = EventSink(
+    LOG_PATH,
+    batch_size=config.FLOW_LOG_BATCH,
+    flush_interval=config.FLOW_LOG_INTERVAL,
+    max_queue=config.FLOW_LOG_MAX_QUEUE,
+    max_bytes=config.FLOW_LOG_MAX_BYTES,
+    rotate_interval=config.FLOW_LOG_ROTATE_INTERVAL,
+    backups=config.FLOW_LOG_BACKUPS,
+)
 
 
 def save_flow_log(user_id: int, step: str, payload: dict):
-    """Бросаем клик в файл-лог (каждая строка — JSON)."""
-    with LOG_PATH.open("a", encoding="utf-8") as f:
-        json.dump(
-            {
-                "user_id": user_id,
-                "ts": datetime.utcnow().isoformat(),
-                "step": step,
-                "payload": payload,
-            },
-            f,
-            ensure_ascii=False,
-        )
-        f.write("\n")
+    """Бросаем клик в очередь файл-лога (каждая строка — JSON)."""
+    FLOW_LOG.emit(
+        {
+            "user_id": user_id,
+            "ts": datetime.utcnow().isoformat(),
+            "step": step,
+            "payload": payload,
+        }
+    )
 
 # ─────────────────────────────────────────────
 #          Inline-клавиатуры-конструкторы
 # ─────────────────────────────────────────────
+# Разметки неизменяемы для нас, поэтому кэшируем: различных клавиатур —
+# несколько сотен (год × месяц × язык × поток × «отсечка» по дате).
+# Отсечка зависит от date.today(), поэтому при смене дня кэши сбрасываются.
+_kb_day = date.today()
+
+
+def _reset_if_new_day() -> None:
+    global _kb_day
+    today = date.today()
+    if today != _kb_day:
+        _kb_day = today
+        _month_kb.cache_clear()
+        _day_kb.cache_clear()
+
+
+@lru_cache(maxsize=None)
 def build_lang_kb() -> InlineKeyboardMarkup:
     kb = InlineKeyboardBuilder()
-    kb.button(text="🇷🇺 Русский", callback_data="lang_ru")
-    kb.button(text="🇺🇿 Oʻzbek",  callback_data="lang_uz")
+    kb.button(text="🇷🇺 Русский", callback_data=LangCb(lang="ru"))
+    kb.button(text="🇺🇿 Oʻzbek",  callback_data=LangCb(lang="uz"))
     kb.adjust(2)
     return kb.as_markup()
 
 
+@lru_cache(maxsize=None)
 def build_year_kb(lang: str, return_flow: bool = False) -> InlineKeyboardMarkup:
     """Года не фильтруем (проще) – ведь list уже ‘будущее’."""
     kb = InlineKeyboardBuilder()
     for y in YEARS:
-        kb.button(text=str(y), callback_data=f"y_{y}{'_ret' if return_flow else ''}")
+        kb.button(text=str(y), callback_data=YearCb(year=y, ret=return_flow))
     if return_flow:
         kb.row(
             InlineKeyboardButton(
                 text="❌ Без обратного" if lang == "ru" else "❌ Qaytishsiz",
-                callback_data="no_ret",
+                callback_data=NoReturnCb().pack(),
             )
         )
     kb.adjust(2)
@@ -92,23 +135,29 @@ def build_month_kb(
     • если min_date = 2025-07-03, то в 2025 показываем Jul…Dec,
       а в 2026 – Jan…Dec (всё норм).
     """
+    _reset_if_new_day()
+    min_date = min_date or date.today()
+    return _month_kb(year, lang, return_flow, min_date.replace(day=1))
+
+
+@lru_cache(maxsize=512)
+def _month_kb(year: int, lang: str, return_flow: bool, min_month: date) -> InlineKeyboardMarkup:
     names = MONTHS_RU if lang == "ru" else MONTHS_UZ
     kb = InlineKeyboardBuilder()
 
-    min_date = min_date or date.today()
     for idx, name in enumerate(names, start=1):
-        if date(year, idx, 1) < min_date.replace(day=1):
+        if date(year, idx, 1) < min_month:
             continue  # месяц в прошлом – пропускаем
         kb.button(
             text=name,
-            callback_data=f"m_{year}_{idx}{'_ret' if return_flow else ''}",
+            callback_data=MonthCb(year=year, month=idx, ret=return_flow),
         )
 
     kb.adjust(3, 3, 3, 3)
     kb.row(
         InlineKeyboardButton(
             text="⬅ Назад" if lang == "ru" else "⬅ Orqaga",
-            callback_data=f"back_year{'_ret' if return_flow else ''}",
+            callback_data=BackCb(to="y", ret=return_flow).pack(),
         )
     )
     return kb.as_markup()
@@ -120,53 +169,88 @@ def build_day_kb(
     lang: str,
     return_flow: bool = False,
     min_date: date | None = None,
+    fares: Dict[int, int] | None = None,
 ) -> InlineKeyboardMarkup:
     """
     В «живом» месяце скрываем прошлые дни.
     Для возврата min_date = departure_date (+1 день опционально).
+    fares — календарь цен месяца {день: цена}: самые дешёвые дни помечаем 💰.
     """
-    import calendar
-
+    _reset_if_new_day()
     min_date = min_date or date.today()
+    # ключ кэша — первый показываемый день месяца, а не сама дата
+    if (min_date.year, min_date.month) == (year, month):
+        first_day = min_date.day
+    else:
+        first_day = 1 if min_date < date(year, month, 1) else 32
+    cheap = cheapest_days(fares, first_day) if fares else frozenset()
+    return _day_kb(year, month, lang, return_flow, first_day, cheap)
+
+
+@lru_cache(maxsize=1024)
+def _day_kb(
+    year: int, month: int, lang: str, return_flow: bool, first_day: int, cheap: frozenset = frozenset()
+) -> InlineKeyboardMarkup:
     days_cnt = calendar.monthrange(year, month)[1]
     kb = InlineKeyboardBuilder()
 
-    for d in range(1, days_cnt + 1):
-        cand = date(year, month, d)
-        if cand < min_date:
-            continue  # скрываем прошедший день
+    for d in range(first_day, days_cnt + 1):
         kb.button(
-            text=str(d),
-            callback_data=f"d_{year}_{month}_{d}{'_ret' if return_flow else ''}",
+            text=f"{d}💰" if d in cheap else str(d),
+            callback_data=DayCb(year=year, month=month, day=d, ret=return_flow),
         )
 
     kb.adjust(7)
     kb.row(
         InlineKeyboardButton(
             text="⬅ Назад" if lang == "ru" else "⬅ Orqaga",
-            callback_data=f"back_month_{year}{'_ret' if return_flow else ''}",
+            callback_data=BackCb(to="m", year=year, ret=return_flow).pack(),
         )
     )
     return kb.as_markup()
 
 
-def build_pax_kb(ad: int, ch: int, inf: int, lang: str) -> InlineKeyboardMarkup:
+_PAX_KBS: Dict[Tuple[int, int, int], InlineKeyboardMarkup] = {}
+
+
+def build_pax_kb(ad: int, ch: int, inf: int) -> InlineKeyboardMarkup:
+    kb = _PAX_KBS.get((ad, ch, inf))
+    return kb if kb is not None else _make_pax_kb(ad, ch, inf)
+
+
+def _make_pax_kb(ad: int, ch: int, inf: int) -> InlineKeyboardMarkup:
     kb = InlineKeyboardBuilder()
 
     def add_row(kind, icon, qty):
         kb.row(
-            InlineKeyboardButton(text="➖", callback_data=f"{kind}_-"),
-            InlineKeyboardButton(text=f"{icon} {qty}", callback_data="noop"),
-            InlineKeyboardButton(text="➕", callback_data=f"{kind}_+"),
+            InlineKeyboardButton(text="➖", callback_data=PaxCb(kind=kind, delta=-1).pack()),
+            InlineKeyboardButton(text=f"{icon} {qty}", callback_data=NoopCb().pack()),
+            InlineKeyboardButton(text="➕", callback_data=PaxCb(kind=kind, delta=1).pack()),
         )
 
     add_row("a", "👤", ad)
     add_row("c", "🧒", ch)
     add_row("i", "👶", inf)
 
-    kb.row(InlineKeyboardButton(text="✅ OK", callback_data="pax_ok"))
+    kb.row(InlineKeyboardButton(text="✅ OK", callback_data=PaxCb(kind="ok").pack()))
     return kb.as_markup()
 
+
+@on_load
+def build_pax_kbs() -> None:
+    """
+    Все допустимые составы (≤ 9 пассажиров, 👶 ≤ 👤) строим заранее —
+    pax_handler не даёт выйти за эти пределы. Язык на разметку не влияет.
+    Строятся в фоновой загрузке справочника на старте, а не при импорте.
+    """
+    global _PAX_KBS
+    _PAX_KBS = {
+        (ad, ch, inf): _make_pax_kb(ad, ch, inf)
+        for ad in range(1, 10)
+        for ch in range(0, 10 - ad)
+        for inf in range(0, min(ad, 9 - ad - ch) + 1)
+    }
+
 # ─────────────────────────────────────────────
 #            Служебные функции
 # ─────────────────────────────────────────────
@@ -189,15 +273,59 @@ def build_aviasales_url(
         f"?adults={adults}&children={children}&infants={infants}&language={lang}"
     )
 
-def _city_label(iata: str, lang: str) -> str:
-    """
-    Возвращает «Город (IATA)», но не дублирует код,
-    если city_by_iata уже вернул его в скобках.
-    """
-    raw = city_by_iata(iata, lang)
-    if f"({iata})" in raw.upper():      # код уже присутствует
-        return raw
-    return f"{raw} ({iata})"
+# ─────────────────────────────────────────────
+#     Callback-кнопки: таблица «префикс → хэндлер»
+# ─────────────────────────────────────────────
+# Вместо цепочки фильтров-лямбд (каждое нажатие прогонялось через все
+# startswith) — один хэндлер на все callback_query: префикс до «:»
+# ищется в словаре, данные разбираются фабрикой из keyboards/callbacks.py.
+class _Route(NamedTuple):
+    factory: Type[CallbackData]
+    handler: Callable[..., Awaitable[Any]]
+    states: frozenset  # пусто — кнопка работает в любом состоянии
+
+
+_CALLBACKS: Dict[str, _Route] = {}
+
+
+def on_callback(factory: Type[CallbackData], *states: State):
+    """Регистрирует хэндлер кнопки: handler(callback, cb, state)."""
+    def register(handler):
+        _CALLBACKS[factory.__prefix__] = _Route(factory, handler, frozenset(s.state for s in states))
+        return handler
+    return register
+
+
+@router.callback_query()
+async def dispatch_callback(callback: CallbackQuery, state: FSMContext, raw_state: Optional[str]):
+    data = callback.data or ""
+    route = _CALLBACKS.get(data.partition(":")[0])
+    try:
+        cb = route.factory.unpack(data) if route else None
+    except (TypeError, ValueError):  # не то число полей / не прошло валидацию
+        cb = None
+    if cb is None:
+        logger.warning(f"[CB] Некорректные данные кнопки от {callback.from_user.id}: {data!r}")
+        return await stale_button(callback, state)
+    if route.states and raw_state not in route.states:
+        return await callback.answer()  # кнопка с прошлого шага — молча гасим «часики»
+    await route.handler(callback, cb, state)
+
+
+def callback_handler_name(data: Optional[str]) -> str:
+    """Имя хэндлера, который обработает кнопку (для метрик); неизвестный префикс — stale_button."""
+    route = _CALLBACKS.get((data or "").partition(":")[0])
+    return route.handler.__name__ if route else stale_button.__name__
+
+
+async def stale_button(callback: CallbackQuery, state: FSMContext):
+    """Кнопка из старой версии бота или подделанные данные."""
+    lang = (await state.get_data()).get("lang", "ru")
+    await callback.answer(
+        "Кнопка устарела, начните заново: /start" if lang == "ru"
+        else "Tugma eskirgan, qaytadan boshlang: /start",
+        show_alert=True,
+    )
 
 # ─────────────────────────────────────────────
 #                   Хэндлеры
@@ -210,25 +338,25 @@ async def cmd_start(msg: Message, state: FSMContext):
     save_flow_log(msg.from_user.id, "start", {})
 
 # 1️⃣ язык
-@router.callback_query(lambda c: c.data.startswith("lang_"), Search.lang)
-async def choose_lang(callback: CallbackQuery, state: FSMContext):
-    lang = "ru" if callback.data == "lang_ru" else "uz"
+@on_callback(LangCb, Search.lang)
+async def choose_lang(callback: CallbackQuery, cb: LangCb, state: FSMContext):
+    lang = cb.lang
     await state.update_data(lang=lang)
     await state.set_state(Search.origin)
+    await callback.answer()
 
     await callback.message.edit_reply_markup(reply_markup=None)
     prompt = "Введите город вылета:" if lang == "ru" else "Qayerdan uchasiz?"
     await callback.message.answer(prompt, reply_markup=ReplyKeyboardRemove())
 
     save_flow_log(callback.from_user.id, "lang", {"lang": lang})
-    await callback.answer()
 
 # 2️⃣ origin
 @router.message(Search.origin)
 async def set_origin(msg: Message, state: FSMContext):
     data = await state.get_data()
     lang = data["lang"]
-    iata = get_iata(msg.text)
+    iata = await get_iata(msg.text, msg.from_user.id)
     if not iata:
         await msg.answer(
             "Введите корректный город." if lang == "ru" else "Shahar nomini to'g'ri kiriting."
@@ -245,7 +373,7 @@ async def set_origin(msg: Message, state: FSMContext):
 async def set_destination(msg: Message, state: FSMContext):
     data = await state.get_data()
     lang = data["lang"]
-    iata = get_iata(msg.text)
+    iata = await get_iata(msg.text, msg.from_user.id)
     if not iata:
         await msg.answer(
             "Город не найден, попробуйте ещё." if lang == "ru" else "Shahar topilmadi, qayta kiriting."
@@ -263,136 +391,119 @@ async def set_destination(msg: Message, state: FSMContext):
 # ─────────────────────────────────────────────
 #        4-6: год / мес / день + BACK
 # ─────────────────────────────────────────────
-@router.callback_query(lambda c: c.data.startswith(("y_", "m_", "d_", "back_", "no_ret")))
-async def date_nav(callback: CallbackQuery, state: FSMContext):
-    cd = callback.data
+async def _date_context(state: FSMContext, is_ret: bool) -> Tuple[str, date]:
+    """Язык и «минимально допустимая» дата для текущего потока (вылет / возврат)."""
     st_data = await state.get_data()
     lang = st_data.get("lang", "ru")
-    is_ret = cd.endswith("_ret") or cd == "no_ret"
-
-    # вычисляем «минимально допустимую» дату для текущего потока
     dep_date_obj = (
         date.fromisoformat(st_data["departure_date"])
         if st_data.get("departure_date")
         else date.today()
     )
-    min_date = dep_date_obj if is_ret else date.today()
-
-    # ───── год ─────
-    if cd.startswith("y_"):
-        _, y, *_ = cd.split("_")
-        y = int(y)
-        await state.update_data(**({"dep_year": y} if not is_ret else {"ret_year": y}))
-        await callback.message.edit_reply_markup(
-            reply_markup=build_month_kb(y, lang, is_ret, min_date)
-        )
-        save_flow_log(callback.from_user.id, "year", {"y": y, "ret": is_ret})
-        return await callback.answer()
-
-    # ───── месяц ─────
-    if cd.startswith("m_"):
-        _, y, m, *_ = cd.split("_")
-        y, m = int(y), int(m)
-        await state.update_data(**({"dep_month": m} if not is_ret else {"ret_month": m}))
-        await callback.message.edit_reply_markup(
-            reply_markup=build_day_kb(y, m, lang, is_ret, min_date)
-        )
-        save_flow_log(callback.from_user.id, "month", {"y": y, "m": m, "ret": is_ret})
-        return await callback.answer()
-
-    # ───── день ─────
-    if cd.startswith("d_"):
-        _, y, m, d, *_ = cd.split("_")
-        y, m, d = int(y), int(m), int(d)
-        date_str = f"{y}-{m:02}-{d:02}"
-
-        if not is_ret:
-            await state.update_data(departure_date=date_str)
-            await state.set_state(Search.return_date)
-            await callback.message.answer(
-                "Выберите год обратного рейса или ❌ если он не нужен:"
-                if lang == "ru"
-                else "Qaytish yili yoki ❌ kerak bo'lmasa:",
-                reply_markup=build_year_kb(lang, return_flow=True),
-            )
-        else:
-            await state.update_data(return_date=date_str)
-            await ask_passengers(callback.message, state)
+    return lang, dep_date_obj if is_ret else date.today()
 
-        save_flow_log(callback.from_user.id, "day", {"date": date_str, "ret": is_ret})
-        return await callback.answer()
 
-    # ───── BACK (к годам) ─────
-    if cd.startswith("back_year"):
-        await callback.message.edit_reply_markup(
-            reply_markup=build_year_kb(lang, "_ret" in cd)
-        )
-        return await callback.answer()
-
-    # ───── BACK (к месяцам) ─────
-    if cd.startswith("back_month_"):
-        parts = cd.split("_")
-        y = int(parts[2])
-        await callback.message.edit_reply_markup(
-            reply_markup=build_month_kb(y, lang, "_ret" in cd, min_date)
-        )
-        return await callback.answer()
+async def _fare_route(state: FSMContext, is_ret: bool) -> Tuple[str, str] | None:
+    """Направление для календаря цен: туда — origin→destination, обратно — наоборот."""
+    if not config.PRICES_PREVIEW:
+        return None
+    st_data = await state.get_data()
+    if not st_data.get("origin") or not st_data.get("destination"):
+        return None
+    route = st_data["origin"], st_data["destination"]
+    return route[::-1] if is_ret else route
 
-    # ───── без возврата ─────
-    if cd == "no_ret":
-        await state.update_data(return_date="")
-        await ask_passengers(callback.message, state)
-        save_flow_log(callback.from_user.id, "no_ret", {})
-        return await callback.answer()
 
-# ─────────────────────────────────────────────
-#        7: пассажиры
-# ─────────────────────────────────────────────
-async def send_review(msg: Message, state: FSMContext):
-    """
-    Отправляет красивое превью перед подтверждением:
-      • маршрут
-      • даты (туда / обратно)
-      • состав пассажиров
-      • кнопка «Подтвердить»
-    """
-    data = await state.get_data()
-    lang = data["lang"]
+async def _prefetch_fares(state: FSMContext, year: int, is_ret: bool, min_date: date) -> None:
+    """Клавиатура месяцев на экране — заранее тянем цены ближайших видимых месяцев."""
+    route = await _fare_route(state, is_ret)
+    if route is None or year < min_date.year:
+        return
+    first = min_date.month if year == min_date.year else 1
+    last = min(12, first + config.PRICES_PREFETCH_MONTHS - 1)
+    prefetch_months(*route, ((year, m) for m in range(first, last + 1)))
 
-    # — текст —
-    head = (
-        "🔍 <b>Проверьте данные перед переходом</b>\n"
-        "и убедитесь, что они верны на сайте.\n"
-        if lang == "ru"
-        else
-        "🔍 <b>Saytga o‘tishdan oldin ma’lumotlarni tekshiring</b>\n"
-        "va ularning to‘g‘riligiga ishonch hosil qiling.\n"
-    )
 
-    route = (
-        f"📍 {city_by_iata(data['origin'], lang)} → "
-        f"{city_by_iata(data['destination'], lang)}\n"
-    )
+async def _day_fares(state: FSMContext, year: int, month: int, is_ret: bool) -> Dict[int, int]:
+    route = await _fare_route(state, is_ret)
+    return await month_prices(*route, year, month) if route else {}
 
-    dates = f"🛫 {data['departure_date']}"
-    if data.get("return_date"):
-        dates += f"  🛬 {data['return_date']}"
-    dates += "\n"
 
-    pax = f"👤 {data['adults']}  🧒 {data['children']}  👶 {data['infants']}"
+# ───── год ─────
+@on_callback(YearCb)
+async def choose_year(callback: CallbackQuery, cb: YearCb, state: FSMContext):
+    lang, min_date = await _date_context(state, cb.ret)
+    await state.update_data(**({"dep_year": cb.year} if not cb.ret else {"ret_year": cb.year}))
+    await callback.answer()
+    await _prefetch_fares(state, cb.year, cb.ret, min_date)
+    await outbound.submit(callback.bot, callback.message.edit_reply_markup(
+        reply_markup=build_month_kb(cb.year, lang, cb.ret, min_date)
+    ))
+    save_flow_log(callback.from_user.id, "year", {"y": cb.year, "ret": cb.ret})
+
+
+# ───── месяц ─────
+@on_callback(MonthCb)
+async def choose_month(callback: CallbackQuery, cb: MonthCb, state: FSMContext):
+    lang, min_date = await _date_context(state, cb.ret)
+    await state.update_data(**({"dep_month": cb.month} if not cb.ret else {"ret_month": cb.month}))
+    await callback.answer()
+    fares = await _day_fares(state, cb.year, cb.month, cb.ret)
+    await outbound.submit(callback.bot, callback.message.edit_reply_markup(
+        reply_markup=build_day_kb(cb.year, cb.month, lang, cb.ret, min_date, fares)
+    ))
+    save_flow_log(callback.from_user.id, "month", {"y": cb.year, "m": cb.month, "ret": cb.ret})
+
+
+# ───── день ─────
+@on_callback(DayCb)
+async def choose_day(callback: CallbackQuery, cb: DayCb, state: FSMContext):
+    try:
+        date_str = date(cb.year, cb.month, cb.day).isoformat()
+    except ValueError:  # 31 февраля и т.п. — такой кнопки мы не рисовали
+        return await stale_button(callback, state)
+    lang, _ = await _date_context(state, cb.ret)
+    await callback.answer()
 
-    text = head + route + dates + pax
+    if not cb.ret:
+        await state.update_data(departure_date=date_str)
+        await state.set_state(Search.return_date)
+        await callback.message.answer(
+            "Выберите год обратного рейса или ❌ если он не нужен:"
+            if lang == "ru"
+            else "Qaytish yili yoki ❌ kerak bo'lmasa:",
+            reply_markup=build_year_kb(lang, return_flow=True),
+        )
+    else:
+        await state.update_data(return_date=date_str)
+        await ask_passengers(callback.message, state)
 
-    # — клавиатура —
-    kb = InlineKeyboardBuilder()
-    kb.button(
-        text="✅ Подтвердить" if lang == "ru" else "✅ Tasdiqlash",
-        callback_data="confirm",
-    )
+    save_flow_log(callback.from_user.id, "day", {"date": date_str, "ret": cb.ret})
 
-    await msg.answer(text, reply_markup=kb.as_markup(), parse_mode="HTML")
 
+# ───── BACK (к годам / к месяцам) ─────
+@on_callback(BackCb)
+async def go_back(callback: CallbackQuery, cb: BackCb, state: FSMContext):
+    lang, min_date = await _date_context(state, cb.ret)
+    await callback.answer()
+    if cb.to == "y":
+        kb = build_year_kb(lang, cb.ret)
+    else:
+        await _prefetch_fares(state, cb.year, cb.ret, min_date)
+        kb = build_month_kb(cb.year, lang, cb.ret, min_date)
+    await outbound.submit(callback.bot, callback.message.edit_reply_markup(reply_markup=kb))
+
+
+# ───── без возврата ─────
+@on_callback(NoReturnCb)
+async def no_return(callback: CallbackQuery, cb: NoReturnCb, state: FSMContext):
+    await state.update_data(return_date="")
+    await callback.answer()
+    await ask_passengers(callback.message, state)
+    save_flow_log(callback.from_user.id, "no_ret", {})
 
+# ─────────────────────────────────────────────
+#        7: пассажиры
 # ─────────────────────────────────────────────
 async def ask_passengers(msg: Message | CallbackQuery, state: FSMContext):
     # стартовые значения
@@ -412,24 +523,20 @@ async def ask_passengers(msg: Message | CallbackQuery, state: FSMContext):
         "👶 <i>Go‘dak (0 – 1)</i>"
     )
 
-    kb   = build_pax_kb(1, 0, 0, lang)
+    kb   = build_pax_kb(1, 0, 0)
     send = msg.edit_text if isinstance(msg, CallbackQuery) else msg.answer
     await send(text, reply_markup=kb, parse_mode="HTML")
 
     await state.set_state(Search.adults)
 
 
-@router.callback_query(
-    lambda c: c.data in {"a_+", "a_-", "c_+", "c_-", "i_+", "i_-", "pax_ok"},
-    Search.adults,
-)
-async def pax_handler(callback: CallbackQuery, state: FSMContext):
+@on_callback(PaxCb, Search.adults)
+async def pax_handler(callback: CallbackQuery, cb: PaxCb, state: FSMContext):
     data = await state.get_data()
     lang = data["lang"]
-    act  = callback.data
 
     # ───── подтверждение ─────
-    if act == "pax_ok":
+    if cb.kind == "ok":
         total = data["adults"] + data["children"] + data["infants"]
         if total > 9 or data["infants"] > data["adults"]:
             await callback.answer(
@@ -439,13 +546,12 @@ async def pax_handler(callback: CallbackQuery, state: FSMContext):
             )
             return
         await state.set_state(Search.confirm)
-        await send_review(callback.message, state)
-        return await callback.answer()
+        await callback.answer()
+        return await send_review(callback.message, state)
 
     # ───── инкременты / декременты ─────
-    key   = {"a": "adults", "c": "children", "i": "infants"}[act[0]]
-    delta = 1 if "+" in act else -1
-    new   = max(0 if key != "adults" else 1, data[key] + delta)
+    key   = {"a": "adults", "c": "children", "i": "infants"}[cb.kind]
+    new   = max(0 if key != "adults" else 1, data[key] + cb.delta)
 
     # прогноз после изменения
     totals = data.copy()
@@ -462,11 +568,15 @@ async def pax_handler(callback: CallbackQuery, state: FSMContext):
 
     # всё ок – сохраняем и перерисовываем клаву
     await state.update_data(**{key: new})
-    await callback.message.edit_reply_markup(
-        reply_markup=build_pax_kb(
-            totals["adults"], totals["children"], totals["infants"], lang
-        )
-    )
+    await callback.answer()
+    await outbound.submit(callback.bot, callback.message.edit_reply_markup(
+        reply_markup=build_pax_kb(totals["adults"], totals["children"], totals["infants"])
+    ))
+
+
+@on_callback(NoopCb)
+async def noop(callback: CallbackQuery, cb: NoopCb, state: FSMContext):
+    """Кнопка-счётчик: просто гасим «часики»."""
     await callback.answer()
 
 # ─────────────────────────────────────────────
@@ -493,11 +603,10 @@ def _fmt_date(d_str: str, lang: str) -> str:
 
 def _city_label(iata: str, lang: str) -> str:
     """
-    «Город (IATA)» — без удвоения кода,
-    если city_by_iata уже вернул его в скобках.
+    «Город (IATA)» — подпись заранее отрисована при загрузке cities.json;
+    для неизвестного кода city_by_iata вернёт сам код.
     """
-    raw = city_by_iata(iata, lang)
-    return raw if f"({iata})" in raw.upper() else f"{raw} ({iata})"
+    return city_by_iata(iata, lang)
 
 
 async def send_review(msg: Message, state: FSMContext):
@@ -533,6 +642,21 @@ async def send_review(msg: Message, state: FSMContext):
         f"• go‘dak: {data['infants']}"
     )
 
+    # 🔻 цена — из кэша или апстрима, но не дольше PRICES_BUDGET; не успели — без строки
+    fare = None
+    if config.PRICES_PREVIEW:
+        fare = await cheapest_within(
+            data["origin"], data["destination"], data["departure_date"], data.get("return_date", "")
+        )
+    price_line = ""
+    if fare:
+        amount = format_price(fare.price, fare.currency)
+        price_line = (
+            f"💸 <b>Цена:</b> от {amount} за взрослого\n"
+            if lang == "ru"
+            else f"💸 <b>Narx:</b> {amount} dan (1 katta uchun)\n"
+        )
+
     # ───────── текст + подписи кнопок ─────────
     if lang == "ru":
         text = (
@@ -540,6 +664,7 @@ async def send_review(msg: Message, state: FSMContext):
             "и убедитесь, что они верны на сайте.\n"
             f"📍 <b>Ваш маршрут:</b> {route_line}\n"
             f"📅 <b>Даты:</b> {date_line}\n"
+            f"{price_line}"
             f"🧑‍💼 <b>Пассажиры:</b>\n{pax_ru}\n\n"
             "Всё верно?"
         )
@@ -550,6 +675,7 @@ async def send_review(msg: Message, state: FSMContext):
             "va ularning to‘g‘riligiga ishonch hosil qiling.\n"
             f"📍 <b>Yo‘nalish:</b> {route_line}\n"
             f"📅 <b>Sana(lar):</b> {date_line}\n"
+            f"{price_line}"
             f"🧑‍💼 <b>Yo‘lovchilar:</b>\n{pax_uz}\n\n"
             "Hammasi to‘g‘rimi?"
         )
@@ -559,8 +685,8 @@ async def send_review(msg: Message, state: FSMContext):
     kb = InlineKeyboardMarkup(
         inline_keyboard=[
             [
-                InlineKeyboardButton(text=btn_confirm, callback_data="confirm"),
-                InlineKeyboardButton(text=btn_restart, callback_data="restart"),
+                InlineKeyboardButton(text=btn_confirm, callback_data=ConfirmCb().pack()),
+                InlineKeyboardButton(text=btn_restart, callback_data=RestartCb().pack()),
             ]
         ]
     )
@@ -571,8 +697,8 @@ async def send_review(msg: Message, state: FSMContext):
 # ─────────────────────────────────────────────
 #               Confirm (кнопка ✅)
 # ─────────────────────────────────────────────
-@router.callback_query(lambda c: c.data == "confirm", Search.confirm)
-async def confirm(callback: CallbackQuery, state: FSMContext):
+@on_callback(ConfirmCb, Search.confirm)
+async def confirm(callback: CallbackQuery, cb: ConfirmCb, state: FSMContext):
     data = await state.get_data()
     lang = data["lang"]
 
@@ -601,6 +727,7 @@ async def confirm(callback: CallbackQuery, state: FSMContext):
         )
         lead = "🔗 Sizning havola:"
 
+    await callback.answer()
     await callback.message.answer(
         f"{lead}\n{url}{help_block}",
         parse_mode="HTML",
@@ -609,16 +736,15 @@ async def confirm(callback: CallbackQuery, state: FSMContext):
 
     save_flow_log(callback.from_user.id, "link_sent", {"url": url})
     await state.clear()
-    await callback.answer()
 
 
 # ─────────────────────────────────────────────
 #            «Начать заново» хэндлер
 # ─────────────────────────────────────────────
-@router.callback_query(lambda c: c.data == "restart")
-async def restart(callback: CallbackQuery, state: FSMContext):
+@on_callback(RestartCb)
+async def restart(callback: CallbackQuery, cb: RestartCb, state: FSMContext):
     """Полностью сбрасываем шаги и запускаем сценарий заново."""
     await state.clear()
-    await cmd_start(callback.message, state)
     await callback.answer()
+    await cmd_start(callback.message, state)
 
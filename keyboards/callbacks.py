@@ -0,0 +1,64 @@
+"""
+callback_data inline-кнопок: типизированные фабрики aiogram.
+
+Формат — «префикс:поле:поле» (например d:2026:7:14:1 — день обратного
+рейса), префикс из одной буквы служит ключом таблицы диспетчеризации в
+handlers/user_flow.py. Самая длинная строка (d:2026:12:31:1) — 14 байт при лимите 64.
+Поля валидируются pydantic при unpack(): битые и устаревшие данные
+отсекаются до хэндлера.
+"""
+from typing import Literal
+
+from aiogram.filters.callback_data import CallbackData
+from pydantic import Field
+
+
+class LangCb(CallbackData, prefix="l"):
+    lang: Literal["ru", "uz"]
+
+
+class YearCb(CallbackData, prefix="y"):
+    year: int = Field(ge=2000, le=2100)
+    ret: bool = False
+
+
+class MonthCb(CallbackData, prefix="m"):
+    year: int = Field(ge=2000, le=2100)
+    month: int = Field(ge=1, le=12)
+    ret: bool = False
+
+
+class DayCb(CallbackData, prefix="d"):
+    year: int = Field(ge=2000, le=2100)
+    month: int = Field(ge=1, le=12)
+    day: int = Field(ge=1, le=31)
+    ret: bool = False
+
+
+class BackCb(CallbackData, prefix="b"):
+    """⬅ Назад: to="y" — к годам, to="m" — к месяцам года year."""
+    to: Literal["y", "m"]
+    year: int = 0
+    ret: bool = False
+
+
+class NoReturnCb(CallbackData, prefix="n"):
+    pass
+
+
+class PaxCb(CallbackData, prefix="p"):
+    """kind: a / c / i — взрослые / дети / младенцы, delta: +1 / -1; kind="ok" — готово."""
+    kind: Literal["a", "c", "i", "ok"]
+    delta: int = Field(default=0, ge=-1, le=1)
+
+
+class ConfirmCb(CallbackData, prefix="c"):
+    pass
+
+
+class RestartCb(CallbackData, prefix="r"):
+    pass
+
+
+class NoopCb(CallbackData, prefix="_"):
+    """Кнопка-надпись (счётчик пассажиров): нажатие ничего не делает."""
@@ -0,0 +1,199 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from utils.journal import locked
+
+logger = logging.getLogger(__name__)
+
+
+def _read_json(path: Path) -> dict:
+    try:
+        with path.open(encoding='utf-8') as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except FileNotFoundError:
+        return {}
+    except json.JSONDecodeError as e:
+        logger.error(f"[ALIAS] {path.name} повреждён, читаю как пустой: {e}")
+        return {}
+
+
+def _atomic_write_json(path: Path, data: dict, **kwargs) -> None:
+    """Запись через временный файл + rename: читатели не видят половину файла."""
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with tmp.open('w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, **kwargs)
+    os.replace(tmp, path)
+
+
+class AliasStore:
+    """
+    Пользовательские алиасы «ввод → IATA» (data/user_aliases.json).
+
+    • set() сразу меняет словарь в памяти, а запись на диск откладывается
+      на delay секунд и объединяет все изменения за это время;
+    • запись атомарная (tmp + rename) и идёт под файловой блокировкой:
+      перед записью читаем файл заново и сливаем изменения других
+      процессов, поэтому одновременные писатели не теряют обновлений;
+    • для выученных алиасов храним статистику [hits, last_seen] в
+      user_aliases.stats.json; при превышении max_size вытесняются
+      самые редкие и давние. Алиасы без статистики (добавленные вручную
+      в JSON) не вытесняются.
+    """
+
+    def __init__(self, path: Path, *, max_size: int = 5000, delay: float = 2.0):
+        self.path = path
+        self.stats_path = path.with_name(f"{path.stem}.stats{path.suffix}")
+        self.max_size = max_size
+        self.delay = delay
+        self.aliases: Dict[str, str] = {}
+        self._stats: Dict[str, List[float]] = {}
+        self._pending: Dict[str, str] = {}
+        self._pending_hits: Dict[str, int] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def load(self) -> 'AliasStore':
+        self.aliases = {k.lower(): v for k, v in _read_json(self.path).items()}
+        self._stats = _read_json(self.stats_path)
+        return self
+
+    def __len__(self) -> int:
+        return len(self.aliases)
+
+    def __contains__(self, alias: str) -> bool:
+        return alias in self.aliases
+
+    def get(self, alias: str) -> Optional[str]:
+        iata = self.aliases.get(alias)
+        if iata is not None and alias in self._stats:
+            self._touch(alias)
+            self._schedule()
+        return iata
+
+    def set(self, alias: str, iata: str) -> None:
+        alias = alias.lower()
+        self.aliases[alias] = iata
+        self._pending[alias] = iata
+        self._stats.setdefault(alias, [0, 0])
+        self._touch(alias)
+        self._schedule()
+
+    def _touch(self, alias: str) -> None:
+        stat = self._stats[alias]
+        stat[0] += 1
+        stat[1] = time.time()
+        self._pending_hits[alias] = self._pending_hits.get(alias, 0) + 1
+
+    # ───── отложенная запись ─────
+    def _schedule(self) -> None:
+        if self._flush_handle is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush_sync()  # вне event loop — пишем сразу
+            return
+        self._flush_handle = loop.call_later(self.delay, self._start_flush)
+
+    def _start_flush(self) -> None:
+        self._flush_handle = None
+        self._flush_task = asyncio.create_task(self.flush())
+
+    async def flush(self) -> None:
+        """Сбрасывает накопленные изменения (вызывается и при остановке бота)."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        task = self._flush_task
+        if task is not None and task is not asyncio.current_task() and not task.done():
+            await asyncio.shield(task)  # идущая запись уже забрала свою часть очереди
+        batch = self._take()
+        if batch is None:
+            return
+        # в потоке — только файлы: set()/get() тем временем меняют словари в цикле,
+        # поэтому поток получает снимок, а результат сливается обратно здесь
+        try:
+            written = await asyncio.to_thread(self._write, *batch)
+        except OSError as e:
+            self._requeue(*batch, e)
+            return
+        self._apply(batch[0], *written)
+
+    def flush_sync(self) -> None:
+        """То же, что flush(), синхронно (вне event loop)."""
+        batch = self._take()
+        if batch is None:
+            return
+        try:
+            written = self._write(*batch)
+        except OSError as e:
+            self._requeue(*batch, e)
+            return
+        self._apply(batch[0], *written)
+
+    def _take(self) -> Optional[Tuple[Dict[str, str], Dict[str, int], Dict[str, float]]]:
+        """Забирает очередь изменений: (новые алиасы, попадания, время последнего попадания)."""
+        pending, self._pending = self._pending, {}
+        hits, self._pending_hits = self._pending_hits, {}
+        if not pending and not hits:
+            return None
+        seen = {alias: self._stats.get(alias, [0, 0])[1] for alias in hits}
+        return pending, hits, seen
+
+    def _write(
+        self, pending: Dict[str, str], hits: Dict[str, int], seen: Dict[str, float],
+    ) -> Tuple[Dict[str, str], Dict[str, List[float]], int]:
+        """Чтение, слияние и запись файлов под блокировкой; состояние объекта не трогает."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with locked(self.path):
+            aliases = {k.lower(): v for k, v in _read_json(self.path).items()}
+            stats = _read_json(self.stats_path)
+            aliases.update(pending)
+            for alias, n in hits.items():
+                if alias not in aliases:
+                    continue
+                old = stats.get(alias, [0, 0])
+                stats[alias] = [old[0] + n, max(old[1], seen[alias])]
+            evicted = self._evict(aliases, stats)
+            _atomic_write_json(self.path, aliases, indent=2)
+            _atomic_write_json(self.stats_path, stats)
+        return aliases, stats, evicted
+
+    def _requeue(
+        self, pending: Dict[str, str], hits: Dict[str, int], seen: Dict[str, float], error: OSError,
+    ) -> None:
+        # вернём изменения в очередь — попробуем при следующей записи
+        self._pending = {**pending, **self._pending}
+        for alias, n in hits.items():
+            self._pending_hits[alias] = self._pending_hits.get(alias, 0) + n
+        logger.error(f"[ALIAS] Ошибка записи {self.path.name}: {error}")
+
+    def _apply(
+        self, pending: Dict[str, str], aliases: Dict[str, str], stats: Dict[str, List[float]], evicted: int,
+    ) -> None:
+        # подхватываем алиасы, добавленные другими процессами; изменения,
+        # сделанные во время записи, остаются поверх и ждут следующей
+        fresh = self._pending.keys() | self._pending_hits.keys()
+        self.aliases = {**aliases, **self._pending}
+        self._stats = {**stats, **{a: self._stats[a] for a in fresh if a in self._stats}}
+        logger.info(
+            f"[ALIAS] Сохранено {len(pending)} алиасов, всего {len(aliases)}"
+            + (f", вытеснено {evicted}" if evicted else "")
+        )
+
+    def _evict(self, aliases: Dict[str, str], stats: Dict[str, List[float]]) -> int:
+        """Вытесняет выученные алиасы сверх max_size: сначала редкие и давние."""
+        excess = len(aliases) - self.max_size
+        if excess <= 0:
+            return 0
+        learned = sorted((s[0], s[1], a) for a, s in stats.items() if a in aliases)
+        for _, _, alias in learned[:excess]:
+            del aliases[alias]
+            del stats[alias]
+        return min(excess, len(learned))
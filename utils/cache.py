@@ -0,0 +1,82 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+MISS = object()  # отличаем «нет в кэше» от закэшированного None
+
+
+class TTLCache:
+    """
+    Словарь с временем жизни записей и LRU-вытеснением сверх max_size.
+
+    Значение None тоже кэшируется («ничего не нашли») — обычно с меньшим
+    ttl, чтобы промахи апстрима не повторялись на каждый запрос.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "evicted": 0}
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = MISS) -> Any:
+        item = self._data.get(key)
+        if item is None or item[0] < time.monotonic():
+            if item is not None:
+                del self._data[key]
+            self.stats["misses"] += 1
+            return default
+        self._data.move_to_end(key)
+        self.stats["hits"] += 1
+        return item[1]
+
+    def fresh_for(self, key: Hashable) -> float:
+        """Сколько секунд записи осталось жить (0 — нет или протухла); статистику не трогает."""
+        item = self._data.get(key)
+        return max(0.0, item[0] - time.monotonic()) if item else 0.0
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            self.stats["evicted"] += 1
+
+    def clear(self) -> None:
+        self._data.clear()
+
+
+class SingleFlight:
+    """
+    Склейка одинаковых запросов: пока для ключа идёт загрузка, остальные
+    вызывающие ждут её же результат, а не идут в апстрим сами.
+
+    Загрузка — отдельная задача под shield: отмена одного ожидающего
+    (например, по таймауту) не отменяет её для остальных.
+    """
+
+    def __init__(self) -> None:
+        self.stats: Dict[str, int] = {"calls": 0, "shared": 0}
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+    def inflight(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    def start(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        """Запустить загрузку (или вернуть уже идущую), не дожидаясь её — для предзагрузки."""
+        task = self._inflight.get(key)
+        if task is None:
+            self.stats["calls"] += 1
+            task = asyncio.create_task(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.stats["shared"] += 1
+        return task
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        return await asyncio.shield(self.start(key, fn))
@@ -0,0 +1,418 @@
+"""
+Справочник городов: индексы для поиска IATA и подписей.
+
+Два источника с одинаковым интерфейсом:
+• CityIndex       — строится из data/cities.json (словари в памяти);
+• MappedCityIndex — читает скомпилированный data/cities.bin через mmap:
+  JSON не парсится, страницы файла общие для всех процессов бота.
+
+Сборка артефакта:  python -m utils.citydb
+"""
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+from array import array
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import config
+from utils.fuzzy import FuzzyIndex
+from utils.normalize import canonical, fold
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+CITIES_PATH = BASE_DIR / 'data' / 'cities.json'
+COMPILED_PATH = BASE_DIR / 'data' / 'cities.bin'
+
+MAGIC = b'CITYDB\x00\x00'
+FORMAT_VERSION = 3  # 2: канонические ключи; 3: + грубые ключи (fdkeys/fdvals), неоднозначные
+# magic, версия, mtime_ns и размер исходного JSON, число секций
+_HEADER = struct.Struct('<8sIqqI')
+# имя секции, смещение, длина
+_SECTION = struct.Struct('<8sQQ')
+
+KINDS = ('code', 'name', 'translation', 'case')
+AMBIGUOUS = ''  # под нормализованным ключом несколько городов — ответа нет, поиск идёт дальше
+
+
+def city_names(city: dict, with_cases: bool = True) -> List[Tuple[str, str]]:
+    """Все написания города в порядке приоритета: (тип, значение)."""
+    names = [('code', city.get('code', '')), ('name', city.get('name', ''))]
+    names += [('translation', v) for v in (city.get('name_translations') or {}).values()]
+    if with_cases:
+        names += [('case', v) for v in (city.get('cases') or {}).values()]
+    return [(kind, v) for kind, v in names if isinstance(v, str) and v]
+
+
+def render_label(city: dict, lang: str) -> str:
+    """«Город (XXX)» на нужном языке (uz → перевод, если есть)."""
+    if lang == 'uz':
+        title = city.get('name_translations', {}).get('uz', city.get('name'))
+    else:
+        title = city.get('name')
+    return f"{title} ({city['code']})"
+
+
+def _unambiguous(candidates: Dict[str, Dict[str, bool]]) -> Dict[str, str]:
+    """
+    ключ → IATA. Несколько городов под одним ключом: если аэропорт есть
+    ровно у одного — он, иначе AMBIGUOUS (первый по файлу не выигрывает —
+    нормализация слишком груба, чтобы угадывать).
+    """
+    resolved = {}
+    for key, codes in candidates.items():
+        if len(codes) > 1:
+            flightable = [code for code, has_airport in codes.items() if has_airport]
+            resolved[key] = flightable[0] if len(flightable) == 1 else AMBIGUOUS
+        else:
+            resolved[key] = next(iter(codes))
+    return resolved
+
+
+def _compact_record(city: dict) -> dict:
+    """Запись города без падежей — они нужны только индексу."""
+    return {k: v for k, v in city.items() if k != 'cases'}
+
+
+# ─────────────────────────────────────────────
+#          Индексы в памяти (из JSON)
+# ─────────────────────────────────────────────
+class CityIndex:
+    """
+    Индексы строятся один раз при загрузке:
+    • exact    — код / имя / переводы / падежи → (IATA, тип совпадения);
+    • translit — имя / переводы → IATA (для поиска после транслитерации);
+    • canonical / folded — строгая и грубая формы имени / переводов → IATA
+      (utils.normalize; падежи не входят — их формы совпадают с чужими
+      именами); неоднозначный ключ → AMBIGUOUS;
+    • IATA → запись города и готовые подписи «Город (XXX)» для config.LANGS;
+    • fuzzy    — триграммный индекс по всем написаниям.
+    Побеждает первый город в списке, как и при линейном проходе.
+    """
+
+    def __init__(self, cities: List[dict]):
+        self._exact: Dict[str, Tuple[str, str]] = {}
+        self._translit: Dict[str, str] = {}
+        canonical_codes: Dict[str, Dict[str, bool]] = {}
+        folded_codes: Dict[str, Dict[str, bool]] = {}
+        self._by_iata: Dict[str, dict] = {}
+        self._labels: Dict[str, Dict[str, str]] = {}
+        for city in cities:
+            code = city.get('code')
+            if not code:
+                continue
+            for kind, value in city_names(city):
+                self._exact.setdefault(value.lower(), (code, kind))
+                if kind in ('name', 'translation'):
+                    self._translit.setdefault(value.lower(), code)
+                    key = canonical(value)
+                    if key:
+                        has_airport = bool(city.get('has_flightable_airport'))
+                        canonical_codes.setdefault(key, {}).setdefault(code, has_airport)
+                        folded_codes.setdefault(fold(key), {}).setdefault(code, has_airport)
+            if code not in self._by_iata:
+                self._by_iata[code] = city
+                self._labels[code] = {lang: render_label(city, lang) for lang in config.LANGS}
+        self._canonical = _unambiguous(canonical_codes)
+        self._folded = _unambiguous(folded_codes)
+
+        self.fuzzy = FuzzyIndex.build(
+            (value.lower(), city['code'])
+            for city in cities if city.get('code')
+            for _, value in city_names(city)
+        )
+
+    def __len__(self) -> int:
+        return len(self._by_iata)
+
+    def exact(self, key: str) -> Optional[Tuple[str, str]]:
+        return self._exact.get(key)
+
+    def translit(self, key: str) -> Optional[str]:
+        return self._translit.get(key)
+
+    def canonical(self, key: str) -> Optional[str]:
+        return self._canonical.get(key)
+
+    def folded(self, key: str) -> Optional[str]:
+        return self._folded.get(key)
+
+    def label(self, iata: str, lang: str) -> Optional[str]:
+        labels = self._labels.get(iata)
+        if labels is None:
+            return None
+        return labels.get(lang) or render_label(self._by_iata[iata], lang)
+
+    def record(self, iata: str) -> Optional[dict]:
+        return self._by_iata.get(iata)
+
+    def codes(self) -> Iterator[str]:
+        return iter(self._by_iata)
+
+
+# ─────────────────────────────────────────────
+#          Компиляция в бинарный артефакт
+# ─────────────────────────────────────────────
+class _Strings:
+    """Таблица интернированных строк: offsets[u32] + utf-8 blob."""
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.encoded: List[bytes] = []
+
+    def add(self, s: str) -> int:
+        sid = self.ids.get(s)
+        if sid is None:
+            sid = self.ids[s] = len(self.encoded)
+            self.encoded.append(s.encode('utf-8'))
+        return sid
+
+    def sorted_ids(self, keys) -> array:
+        """id ключей в порядке байтов utf-8 (= порядок кодовых точек)."""
+        return array('I', sorted((self.add(k) for k in keys), key=lambda i: self.encoded[i]))
+
+
+def compile_index(index: CityIndex, dst: Path = COMPILED_PATH, src: Path = CITIES_PATH) -> Path:
+    strings = _Strings()
+    sections: Dict[bytes, bytes] = {}
+
+    ex_keys = strings.sorted_ids(index._exact)
+    ex_vals = array('I')
+    for sid in ex_keys:
+        code, kind = index._exact[strings.encoded[sid].decode('utf-8')]
+        ex_vals.append(strings.add(code) << 2 | KINDS.index(kind))
+    sections[b'exkeys'], sections[b'exvals'] = ex_keys.tobytes(), ex_vals.tobytes()
+
+    tr_keys = strings.sorted_ids(index._translit)
+    tr_vals = array('I', (
+        strings.add(index._translit[strings.encoded[sid].decode('utf-8')]) for sid in tr_keys
+    ))
+    sections[b'trkeys'], sections[b'trvals'] = tr_keys.tobytes(), tr_vals.tobytes()
+
+    for prefix, mapping in ((b'cn', index._canonical), (b'fd', index._folded)):
+        keys = strings.sorted_ids(mapping)
+        vals = array('I', (strings.add(mapping[strings.encoded[sid].decode('utf-8')]) for sid in keys))
+        sections[prefix + b'keys'], sections[prefix + b'vals'] = keys.tobytes(), vals.tobytes()
+
+    # IATA → подписи по языкам (подряд) + компактная запись города
+    codes = strings.sorted_ids(index._by_iata)
+    labels, records = array('I'), array('I')
+    for sid in codes:
+        code = strings.encoded[sid].decode('utf-8')
+        labels.extend(strings.add(index._labels[code][lang]) for lang in config.LANGS)
+        records.append(strings.add(json.dumps(
+            _compact_record(index._by_iata[code]), ensure_ascii=False, separators=(',', ':'),
+        )))
+    sections[b'iatas'], sections[b'labels'] = codes.tobytes(), labels.tobytes()
+    sections[b'records'] = records.tobytes()
+
+    # нечёткий индекс: ключи по id, блоки (длина, начало) по триграммам
+    fuzzy = index.fuzzy
+    sections[b'fzkeys'] = array('I', (strings.add(k) for k in fuzzy.keys)).tobytes()
+    sections[b'fzvals'] = array('I', (strings.add(v) for v in fuzzy.values)).tobytes()
+    grams = strings.sorted_ids(fuzzy.postings)
+    gram_off, blk_len, blk_start, ids = array('I'), array('I'), array('I'), array('I')
+    for sid in grams:
+        lengths, starts, gram_ids = fuzzy.postings[strings.encoded[sid].decode('utf-8')]
+        gram_off.append(len(blk_len))
+        blk_len.extend(lengths)
+        blk_start.extend(len(ids) + s for s in starts[:-1])
+        ids.extend(gram_ids)
+    gram_off.append(len(blk_len))
+    blk_start.append(len(ids))  # сторож: конец последнего блока
+    sections[b'fzgrams'], sections[b'fzgoff'] = grams.tobytes(), gram_off.tobytes()
+    sections[b'fzblen'], sections[b'fzbstart'] = blk_len.tobytes(), blk_start.tobytes()
+    sections[b'fzids'] = ids.tobytes()
+
+    offsets = array('I', [0])
+    for b in strings.encoded:
+        offsets.append(offsets[-1] + len(b))
+    sections[b'stroffs'], sections[b'strblob'] = offsets.tobytes(), b''.join(strings.encoded)
+    sections[b'meta'] = json.dumps({
+        'langs': config.LANGS, 'byteorder': sys.byteorder, 'cities': len(index),
+    }).encode('utf-8')
+
+    st = src.stat()
+    pos = _HEADER.size + _SECTION.size * len(sections)
+    table, body = [], []
+    for name, data in sections.items():
+        pad = -pos % 8
+        body.append(b'\x00' * pad + data)
+        table.append(_SECTION.pack(name, pos + pad, len(data)))
+        pos += pad + len(data)
+
+    tmp = dst.with_suffix('.tmp')
+    with tmp.open('wb') as f:
+        f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, st.st_mtime_ns, st.st_size, len(sections)))
+        f.write(b''.join(table))
+        f.write(b''.join(body))
+    os.replace(tmp, dst)
+    return dst
+
+
+# ─────────────────────────────────────────────
+#          Чтение артефакта через mmap
+# ─────────────────────────────────────────────
+class _StrSeq:
+    """Последовательность строк по массиву id (для FuzzyIndex.keys/values)."""
+
+    def __init__(self, db: 'MappedCityIndex', ids: memoryview):
+        self._db, self._ids = db, ids
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __getitem__(self, i: int) -> str:
+        return self._db._str(self._ids[i])
+
+
+class _GramPostings:
+    """триграмма → (длины, начала блоков, id) поверх mmap, как dict.get."""
+
+    def __init__(self, db: 'MappedCityIndex'):
+        self._db = db
+
+    def get(self, gram: str):
+        db = self._db
+        pos = db._find(db._sec['fzgrams'], gram.encode('utf-8'))
+        if pos < 0:
+            return None
+        goff = db._sec['fzgoff']
+        b0, b1 = goff[pos], goff[pos + 1]
+        return db._sec['fzblen'][b0:b1], db._sec['fzbstart'][b0:b1 + 1], db._sec['fzids']
+
+
+class MappedCityIndex:
+    """Тот же интерфейс, что у CityIndex, но поверх mmap-файла."""
+
+    def __init__(self, path: Path):
+        with path.open('rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.src_mtime_ns, self.src_size, count = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"неподдерживаемый формат {path.name}: {magic!r} v{version}")
+
+        view = memoryview(self._mm)
+        raw: Dict[str, memoryview] = {}
+        offsets: Dict[str, int] = {}
+        for i in range(count):
+            name, off, size = _SECTION.unpack_from(self._mm, _HEADER.size + i * _SECTION.size)
+            name = name.rstrip(b'\x00').decode()
+            raw[name], offsets[name] = view[off:off + size], off
+
+        self.meta = json.loads(bytes(raw.pop('meta')))
+        raw.pop('strblob')
+        self._blob_off = offsets['strblob']  # строки читаем срезами mmap → bytes
+        self._sec = {name: mv.cast('I') for name, mv in raw.items()}
+        self._stroffs = self._sec['stroffs']
+        self._langs = self.meta['langs']
+        self.fuzzy = FuzzyIndex(
+            _StrSeq(self, self._sec['fzkeys']),
+            _StrSeq(self, self._sec['fzvals']),
+            _GramPostings(self),
+        )
+
+    def __len__(self) -> int:
+        return self.meta['cities']
+
+    def _bytes(self, sid: int) -> bytes:
+        start = self._blob_off + self._stroffs[sid]
+        return self._mm[start:self._blob_off + self._stroffs[sid + 1]]
+
+    def _str(self, sid: int) -> str:
+        return self._bytes(sid).decode('utf-8')
+
+    def _find(self, keys: memoryview, key: bytes) -> int:
+        """Бинарный поиск по отсортированному массиву id строк."""
+        lo, hi = 0, len(keys)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._bytes(keys[mid]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(keys) and self._bytes(keys[lo]) == key:
+            return lo
+        return -1
+
+    def exact(self, key: str) -> Optional[Tuple[str, str]]:
+        pos = self._find(self._sec['exkeys'], key.encode('utf-8'))
+        if pos < 0:
+            return None
+        val = self._sec['exvals'][pos]
+        return self._str(val >> 2), KINDS[val & 3]
+
+    def translit(self, key: str) -> Optional[str]:
+        pos = self._find(self._sec['trkeys'], key.encode('utf-8'))
+        return self._str(self._sec['trvals'][pos]) if pos >= 0 else None
+
+    def canonical(self, key: str) -> Optional[str]:
+        pos = self._find(self._sec['cnkeys'], key.encode('utf-8'))
+        return self._str(self._sec['cnvals'][pos]) if pos >= 0 else None
+
+    def folded(self, key: str) -> Optional[str]:
+        pos = self._find(self._sec['fdkeys'], key.encode('utf-8'))
+        return self._str(self._sec['fdvals'][pos]) if pos >= 0 else None
+
+    def label(self, iata: str, lang: str) -> Optional[str]:
+        pos = self._find(self._sec['iatas'], iata.encode('utf-8'))
+        if pos < 0:
+            return None
+        if lang in self._langs:
+            return self._str(self._sec['labels'][pos * len(self._langs) + self._langs.index(lang)])
+        return render_label(self.record(iata), lang)
+
+    def record(self, iata: str) -> Optional[dict]:
+        pos = self._find(self._sec['iatas'], iata.encode('utf-8'))
+        return json.loads(self._str(self._sec['records'][pos])) if pos >= 0 else None
+
+    def codes(self) -> Iterator[str]:
+        return (self._str(sid) for sid in self._sec['iatas'])
+
+
+# ─────────────────────────────────────────────
+#                  Загрузка
+# ─────────────────────────────────────────────
+def open_compiled(src: Path = CITIES_PATH, compiled: Path = COMPILED_PATH) -> Optional[MappedCityIndex]:
+    """mmap-артефакт, если он есть и собран из текущего cities.json."""
+    if not compiled.exists():
+        return None
+    try:
+        db = MappedCityIndex(compiled)
+    except (OSError, ValueError, struct.error) as e:
+        logger.warning(f"[CITYDB] {compiled.name} не читается: {e}")
+        return None
+    if db.meta.get('langs') != config.LANGS or db.meta.get('byteorder') != sys.byteorder:
+        logger.warning(f"[CITYDB] {compiled.name} собран для другой конфигурации, пересоберите")
+        return None
+    if src.exists():
+        st = src.stat()
+        if (st.st_mtime_ns, st.st_size) != (db.src_mtime_ns, db.src_size):
+            logger.warning(f"[CITYDB] {compiled.name} старше {src.name}, читаю JSON")
+            return None
+    return db
+
+
+def load(src: Path = CITIES_PATH, compiled: Path = COMPILED_PATH):
+    """Скомпилированный справочник, а если его нет или он устарел — JSON."""
+    db = open_compiled(src, compiled)
+    if db is not None:
+        logger.info(f"[CITYDB] {compiled.name}: {len(db)} городов (mmap)")
+        return db
+    with src.open(encoding='utf-8') as f:
+        cities = json.load(f)
+    db = CityIndex(cities)
+    logger.info(f"[CITYDB] {src.name}: {len(db)} городов (JSON)")
+    return db
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    with CITIES_PATH.open(encoding='utf-8') as f:
+        index = CityIndex(json.load(f))
+    path = compile_index(index)
+    logger.info(f"[CITYDB] Собран {path} ({path.stat().st_size // 1024} КБ)")
@@ -0,0 +1,186 @@
+"""
+Диагностика блокировок цикла событий (DIAGNOSTICS=1, по умолчанию выкл.).
+
+• LoopMonitor — раз в interval засыпает и меряет, насколько позже
+  проснулся (лаг цикла); лаг больше warn пишется в лог. Сторож в
+  отдельном потоке следит за «пульсом» сэмплера: если цикл стоит
+  дольше stall, он снимает стек потока цикла — то есть ровно того
+  синхронного кода, который его держит, пока тот ещё держит.
+• SlowUpdateProfiler — middleware: хэндлер дольше threshold пишется
+  в лог с именем и состоянием FSM; доля rate хэндлеров выполняется под
+  cProfile, и профиль медленного сохраняется в directory.
+"""
+import asyncio
+import cProfile
+import io
+import logging
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+import traceback
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, TelegramObject
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class LoopMonitor:
+    """Сэмплер лага цикла событий + сторож зависаний (start/stop — хуки диспетчера)."""
+
+    def __init__(self, *, interval: float = 0.1, warn: float = 0.1, stall: float = 0.5):
+        self.interval = interval
+        self.warn = warn
+        self.stall = stall
+        self.stats: Dict[str, float] = {"samples": 0, "lagged": 0, "stalls": 0, "max_lag": 0.0, "last_lag": 0.0}
+        self._beat = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._loop_thread = 0
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._sample(), name="loop-monitor")
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+        logger.info(f"[DIAG] Слежу за циклом: лаг > {self.warn * 1e3:.0f} мс, зависание > {self.stall * 1e3:.0f} мс")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        self._stopped.set()
+        logger.info(f"[DIAG] Лаг цикла: {self.stats}")
+
+    async def _sample(self) -> None:
+        while True:
+            before = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - before - self.interval)
+            self._beat = time.monotonic()
+            self.stats["samples"] += 1
+            self.stats["last_lag"] = lag
+            self.stats["max_lag"] = max(self.stats["max_lag"], lag)
+            metrics.LOOP_LAG_SECONDS.observe(lag)
+            if lag > self.warn:
+                self.stats["lagged"] += 1
+                logger.warning(f"[DIAG] Цикл событий отстал на {lag * 1e3:.0f} мс")
+
+    def _watch(self) -> None:
+        """Поток-сторож: цикл не отмечался дольше stall — снимаем стек его потока (раз на зависание)."""
+        reported = None
+        while not self._stopped.wait(self.stall / 4):
+            beat = self._beat
+            stuck = time.monotonic() - beat
+            if stuck < self.stall or beat == reported:
+                continue
+            reported = beat
+            self.stats["stalls"] += 1
+            frame = sys._current_frames().get(self._loop_thread)
+            stack = "".join(traceback.format_stack(frame, limit=15)) if frame is not None else "(стек недоступен)\n"
+            logger.warning(f"[DIAG] Цикл событий заблокирован уже {stuck * 1e3:.0f} мс, стек:\n{stack}")
+
+
+def _safe(part: str) -> str:
+    return re.sub(r"[^\w.-]+", "-", part).strip("-") or "none"
+
+
+class SlowUpdateProfiler(BaseMiddleware):
+    """
+    Медленные хэндлеры (дольше threshold): лог всегда, профиль — выборочно.
+
+    cProfile на каждом апдейте вдвое режет пропускную способность, поэтому
+    под профилем идёт только доля rate апдейтов (1.0 — все). К тому же
+    cProfile в процессе может быть включён только один: апдейт, пришедший
+    пока профилируется другой, проходит без профиля (stats "skipped").
+    Пока профиль включён, в него попадает и работа других задач цикла —
+    если апдейт медленный из-за соседа, сосед будет виден.
+    Файлы: <время>_<хэндлер>_<состояние>_<мс>ms.prof (pstats / snakeviz),
+    хранится не больше keep последних.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        *,
+        threshold: float = 1.0,
+        rate: float = 0.1,
+        keep: int = 50,
+        callback_name: Callable[[Optional[str]], str],
+    ):
+        self.directory = directory
+        self.threshold = threshold
+        self.rate = rate
+        self.keep = keep
+        self.callback_name = callback_name
+        self.stats: Dict[str, int] = {"profiled": 0, "slow": 0, "dumped": 0, "skipped": 0}
+        self._busy = False
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        profile = None
+        if random.random() < self.rate:
+            if self._busy:
+                self.stats["skipped"] += 1
+            else:
+                self._busy = True
+                self.stats["profiled"] += 1
+                profile = cProfile.Profile()
+        start = time.perf_counter()
+        if profile is not None:
+            profile.enable()
+        try:
+            return await handler(event, data)
+        finally:
+            if profile is not None:
+                profile.disable()
+                self._busy = False
+            elapsed = time.perf_counter() - start
+            if elapsed >= self.threshold:
+                self.stats["slow"] += 1
+                if isinstance(event, CallbackQuery):
+                    name = self.callback_name(event.data)
+                else:
+                    name = data["handler"].callback.__name__
+                label = f"{name}_{_safe(data.get('raw_state') or 'none')}"
+                if profile is None:
+                    logger.warning(f"[DIAG] Медленный апдейт {label}: {elapsed * 1e3:.0f} мс (без профиля)")
+                else:
+                    # запись и разбор профиля — в потоке, не в цикле, который и так опоздал
+                    asyncio.get_running_loop().run_in_executor(None, self._dump, profile, label, elapsed)
+
+    def _dump(self, profile: cProfile.Profile, label: str, elapsed: float) -> None:
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            path = self.directory / f"{time.strftime('%Y%m%d-%H%M%S')}_{label}_{elapsed * 1e3:.0f}ms.prof"
+            profile.dump_stats(path)
+            self.stats["dumped"] += 1
+            top = io.StringIO()
+            pstats.Stats(profile, stream=top).sort_stats("tottime").print_stats(5)
+            summary = "\n".join(line for line in top.getvalue().splitlines()[-8:] if line.strip())
+            logger.warning(f"[DIAG] Медленный апдейт {label}: {elapsed * 1e3:.0f} мс → {path}\n{summary}")
+            for old in sorted(self.directory.glob("*.prof"))[:-self.keep]:
+                old.unlink(missing_ok=True)
+        except Exception as e:
+            logger.error(f"[DIAG] Не удалось сохранить профиль {label}: {e}")
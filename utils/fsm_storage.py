@@ -0,0 +1,194 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Mapping, Optional
+
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Record:
+    state: Optional[str] = None
+    data: Dict[str, Any] = field(default_factory=dict)
+    touched: float = 0.0
+    dirty: bool = False
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    FSM-хранилище в локальном SQLite-файле с write-back кэшем.
+
+    • чтения и записи идут в словарь в памяти; с диска запись
+      поднимается только при первом обращении к ключу;
+    • изменённые записи раз в flush_interval секунд пишутся одной
+      транзакцией в фоновом потоке (и при close());
+    • сессии, не тронутые дольше ttl секунд (брошенные на шаге
+      пассажиров и т.п.), считаются пустыми и удаляются при
+      периодической компактификации; заодно из кэша выгружаются
+      давно не использованные записи.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        *,
+        ttl: float = 24 * 3600,
+        flush_interval: float = 1.0,
+        compact_interval: float = 600,
+        cache_idle: float = 900,
+        key_builder: Optional[KeyBuilder] = None,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.compact_interval = compact_interval
+        self.cache_idle = cache_idle
+        self.key_builder = key_builder or DefaultKeyBuilder(with_destiny=True)
+        self.stats: Dict[str, int] = {"loads": 0, "flushes": 0, "written": 0, "expired": 0}
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS fsm ("
+            " key TEXT PRIMARY KEY, state TEXT, data TEXT NOT NULL, touched REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS fsm_touched ON fsm (touched)")
+        self._db_lock = threading.Lock()
+        self._cache: Dict[str, _Record] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    # ───── кэш ─────
+    async def _record(self, key: StorageKey) -> _Record:
+        k = self.key_builder.build(key)
+        rec = self._cache.get(k)
+        if rec is None:
+            loaded = await asyncio.to_thread(self._load, k)
+            rec = self._cache.setdefault(k, loaded)  # пока грузили, мог появиться
+            self._ensure_task()
+        now = time.time()
+        if rec.touched and now - rec.touched > self.ttl:
+            rec.state, rec.data, rec.dirty = None, {}, True  # сессия протухла
+            self.stats["expired"] += 1
+        elif now - rec.touched > self.ttl / 4:
+            rec.dirty = True  # освежаем touched на диске, чтобы компактификация не удалила живую сессию
+        rec.touched = now
+        return rec
+
+    def _load(self, k: str) -> _Record:
+        self.stats["loads"] += 1
+        with self._db_lock:
+            row = self._db.execute("SELECT state, data, touched FROM fsm WHERE key = ?", (k,)).fetchone()
+        if row is None:
+            return _Record()
+        return _Record(state=row[0], data=json.loads(row[1]), touched=row[2])
+
+    # ───── интерфейс BaseStorage ─────
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        rec = await self._record(key)
+        rec.state = state.state if isinstance(state, State) else state
+        rec.dirty = True
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._record(key)).state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise DataNotDictLikeError(
+                f"Data must be a dict or dict-like object, got {type(data).__name__}"
+            )
+        rec = await self._record(key)
+        rec.data = data.copy()
+        rec.dirty = True
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return (await self._record(key)).data.copy()
+
+    async def set_record(self, key: StorageKey, state: StateType, data: Mapping[str, Any]) -> None:
+        """Состояние и данные одной записью (итог BufferedFSMContext.commit)."""
+        rec = await self._record(key)
+        rec.state = state.state if isinstance(state, State) else state
+        rec.data = dict(data)
+        rec.dirty = True
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await asyncio.to_thread(self._flush)
+        with self._db_lock:
+            self._db.close()
+
+    # ───── фоновая запись и компактификация ─────
+    def _ensure_task(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="fsm-sqlite")
+
+    async def _run(self) -> None:
+        last_compact = time.monotonic()
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await asyncio.to_thread(self._flush)
+                if time.monotonic() - last_compact >= self.compact_interval:
+                    last_compact = time.monotonic()
+                    await asyncio.to_thread(self._compact)
+                    self._evict_idle()
+            except sqlite3.Error as e:
+                logger.error(f"[FSM] Ошибка SQLite: {e}")
+
+    def _flush(self) -> None:
+        dirty = [(k, rec) for k, rec in list(self._cache.items()) if rec.dirty]
+        if not dirty:
+            return
+        upserts, deletes = [], []
+        for k, rec in dirty:
+            rec.dirty = False
+            if rec.state is None and not rec.data:
+                deletes.append((k,))
+            else:
+                upserts.append((k, rec.state, json.dumps(rec.data, ensure_ascii=False), rec.touched))
+        with self._db_lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.executemany(
+                    "INSERT INTO fsm (key, state, data, touched) VALUES (?, ?, ?, ?)"
+                    " ON CONFLICT(key) DO UPDATE SET"
+                    " state = excluded.state, data = excluded.data, touched = excluded.touched",
+                    upserts,
+                )
+                self._db.executemany("DELETE FROM fsm WHERE key = ?", deletes)
+                self._db.execute("COMMIT")
+            except sqlite3.Error:
+                self._db.execute("ROLLBACK")
+                for _, rec in dirty:
+                    rec.dirty = True
+                raise
+        self.stats["flushes"] += 1
+        self.stats["written"] += len(dirty)
+
+    def _compact(self) -> None:
+        now = time.time()
+        with self._db_lock:
+            removed = self._db.execute("DELETE FROM fsm WHERE touched < ?", (now - self.ttl,)).rowcount
+            if removed:
+                self._db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        if removed:
+            logger.info(f"[FSM] Удалено протухших сессий: {removed}")
+
+    def _evict_idle(self) -> None:
+        """Выгружает из кэша давно не тронутые, уже записанные сессии (в потоке loop)."""
+        now = time.time()
+        for k, rec in list(self._cache.items()):
+            if not rec.dirty and now - rec.touched > self.cache_idle:
+                del self._cache[k]
@@ -0,0 +1,96 @@
+import math
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from difflib import SequenceMatcher
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+# Сколько лучших по числу общих триграмм кандидатов проверяем точной метрикой
+MAX_CANDIDATES = 32
+
+
+def trigrams(s: str) -> List[str]:
+    """Триграммы строки с пробелами по краям: 'мос' → [' мо', 'мос', 'ос ']."""
+    padded = f" {s} "
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+def length_window(n: int, cutoff: float) -> Tuple[int, int]:
+    """
+    Допустимые длины кандидата: ratio ≤ 2·min(a, b) / (a + b),
+    поэтому при cutoff 0.8 длины отличаются не более чем в 1.5 раза.
+    """
+    k = cutoff / (2 - cutoff)
+    return math.ceil(n * k - 1e-9), math.floor(n / k + 1e-9)
+
+
+class FuzzyIndex:
+    """
+    Постоянный нечёткий индекс: триграмма → id ключей, отсортированные
+    по длине ключа. Строится один раз; поиск смотрит только ключи
+    подходящей длины, берёт ограниченное число кандидатов с наибольшим
+    числом общих триграмм и переранжирует их той же метрикой, что и
+    difflib.get_close_matches (SequenceMatcher.ratio + cutoff).
+    """
+
+    def __init__(self, keys: Sequence[str], values: Sequence[str], postings: Mapping):
+        # keys / values / postings — списки в памяти либо представления
+        # поверх mmap-файла (см. utils.citydb), интерфейс одинаковый
+        self.keys = keys
+        self.values = values
+        self.postings = postings
+
+    @classmethod
+    def build(cls, items: Iterable[Tuple[str, str]]) -> 'FuzzyIndex':
+        values: Dict[str, str] = {}
+        for key, value in items:
+            values[key] = value  # как в dict-е all_names: побеждает последний
+        keys = list(values)
+
+        by_gram: Dict[str, Dict[int, List[int]]] = {}
+        for key_id, key in enumerate(keys):
+            for gram in set(trigrams(key)):
+                by_gram.setdefault(gram, {}).setdefault(len(key), []).append(key_id)
+
+        # gram → (длины, начала блоков каждой длины, id подряд)
+        postings: Dict[str, Tuple[List[int], List[int], List[int]]] = {}
+        for gram, by_len in by_gram.items():
+            lengths, starts, ids = sorted(by_len), [], []
+            for n in lengths:
+                starts.append(len(ids))
+                ids.extend(by_len[n])
+            starts.append(len(ids))
+            postings[gram] = (lengths, starts, ids)
+        return cls(keys, list(values.values()), postings)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def candidates(self, word: str, cutoff: float) -> List[int]:
+        lo, hi = length_window(len(word), cutoff)
+        counts: Counter = Counter()
+        for gram in set(trigrams(word)):
+            posting = self.postings.get(gram)
+            if not posting:
+                continue
+            lengths, starts, ids = posting
+            a, b = bisect_left(lengths, lo), bisect_right(lengths, hi)
+            if a < b:
+                counts.update(ids[starts[a]:starts[b]])
+        return [key_id for key_id, _ in counts.most_common(MAX_CANDIDATES)]
+
+    def match(self, word: str, cutoff: float = 0.8) -> Optional[Tuple[str, str]]:
+        """Лучшее совпадение (ключ, значение) с ratio ≥ cutoff или None."""
+        s = SequenceMatcher()
+        s.set_seq2(word)
+        scored = []
+        for key_id in self.candidates(word, cutoff):
+            key = self.keys[key_id]
+            s.set_seq1(key)
+            if s.real_quick_ratio() >= cutoff and s.quick_ratio() >= cutoff:
+                ratio = s.ratio()
+                if ratio >= cutoff:
+                    scored.append((ratio, key, key_id))
+        if not scored:
+            return None
+        _, key, key_id = max(scored)  # при равном ratio — как в nlargest
+        return key, self.values[key_id]
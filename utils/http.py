@@ -0,0 +1,31 @@
+import logging
+from typing import Optional
+
+import aiohttp
+
+import config
+
+logger = logging.getLogger(__name__)
+
+_session: Optional[aiohttp.ClientSession] = None
+
+
+def get_session() -> aiohttp.ClientSession:
+    """Общая aiohttp-сессия на процесс (пул соединений + таймауты)."""
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(
+                total=config.HTTP_TIMEOUT,
+                connect=min(config.HTTP_TIMEOUT, 5),
+            ),
+        )
+    return _session
+
+
+async def close_session() -> None:
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+        logger.info("[HTTP] Сессия закрыта")
+    _session = None
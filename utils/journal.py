@@ -0,0 +1,261 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: межпроцессной блокировки нет
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+_STAMP = '%Y%m%d-%H%M%S'  # метка ротированной копии: <stem>.<стамп>[-n]<suffix>
+_STAMP_LEN = len('20250101-000000')
+
+
+@contextmanager
+def locked(path: Path):
+    """Эксклюзивная межпроцессная блокировка через соседний .lock-файл."""
+    if fcntl is None:
+        yield
+        return
+    with open(f"{path}.lock", 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def append_lines(path: Path, records: List[dict]) -> None:
+    """Дописывает записи JSONL одной операцией write."""
+    data = ''.join(json.dumps(r, ensure_ascii=False) + '\n' for r in records)
+    with path.open('a', encoding='utf-8') as f:
+        f.write(data)
+
+
+class EventSink:
+    """
+    Асинхронный батч-писатель JSONL-событий.
+
+    emit() только кладёт запись в очередь и не блокирует event loop;
+    фоновая задача сериализует и дописывает записи пачками в потоке —
+    когда набралось batch_size или прошло flush_interval секунд.
+    Очередь ограничена max_queue: при переполнении новые события
+    отбрасываются (счётчик dropped). Файл ротируется по размеру
+    (max_bytes) и/или периоду (rotate_interval), храним backups копий.
+    stop() дописывает всё, что осталось в очереди.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        *,
+        batch_size: int = 200,
+        flush_interval: float = 1.0,
+        max_queue: int = 10_000,
+        max_bytes: int = 0,
+        rotate_interval: float = 0,
+        backups: int = 5,
+    ):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.backups = backups
+        self.stats: Dict[str, int] = {
+            "emitted": 0, "written": 0, "dropped": 0, "failed": 0, "batches": 0, "rotations": 0,
+        }
+        self._buffer: Deque[dict] = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def emit(self, record: dict) -> bool:
+        """Кладёт событие в очередь. False — событие отброшено."""
+        self.stats["emitted"] += 1
+        if not self.running:
+            # вне event loop (скрипты, миграции) — пишем сразу
+            self._write([record])
+            return True
+        if len(self._buffer) >= self.max_queue:
+            self.stats["dropped"] += 1
+            if self.stats["dropped"] % 1000 == 1:
+                logger.warning(f"[LOG] Очередь {self.path.name} переполнена, события теряются")
+            return False
+        self._buffer.append(record)
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name=f"sink:{self.path.name}")
+
+    async def stop(self) -> None:
+        """Останавливает писателя и гарантированно сбрасывает очередь на диск."""
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+        self._wakeup.set()
+        await task
+        if self._buffer:
+            await asyncio.to_thread(self._write, self._drain(len(self._buffer)))
+
+    async def flush(self) -> None:
+        if self._buffer:
+            await asyncio.to_thread(self._write, self._drain(len(self._buffer)))
+
+    def _drain(self, limit: int) -> List[dict]:
+        return [self._buffer.popleft() for _ in range(min(limit, len(self._buffer)))]
+
+    async def _run(self) -> None:
+        while self._task is not None:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            while self._buffer:
+                await asyncio.to_thread(self._write, self._drain(self.batch_size))
+
+    # ───── запись / ротация (в рабочем потоке) ─────
+    def _write(self, batch: List[dict]) -> None:
+        try:
+            with locked(self.path):
+                self._maybe_rotate()
+                append_lines(self.path, batch)
+            self.stats["written"] += len(batch)
+            self.stats["batches"] += 1
+        except (OSError, TypeError, ValueError) as e:
+            self.stats["failed"] += len(batch)
+            logger.error(f"[LOG] Ошибка записи {self.path.name}: {e}")
+
+    def _maybe_rotate(self) -> None:
+        try:
+            st = self.path.stat()
+        except FileNotFoundError:
+            return
+        if st.st_size == 0:
+            return
+        too_big = self.max_bytes and st.st_size >= self.max_bytes
+        # периоды считаются от эпохи (86400 → новый файл после полуночи UTC)
+        stale = self.rotate_interval and (
+            st.st_mtime // self.rotate_interval != time.time() // self.rotate_interval
+        )
+        if not (too_big or stale):
+            return
+        stamp = time.strftime(_STAMP, time.gmtime(st.st_mtime))
+        rotated = self.path.with_name(f"{self.path.stem}.{stamp}{self.path.suffix}")
+        n = 0
+        while rotated.exists():  # несколько ротаций за секунду
+            n += 1
+            rotated = self.path.with_name(f"{self.path.stem}.{stamp}-{n}{self.path.suffix}")
+        os.replace(self.path, rotated)
+        self.stats["rotations"] += 1
+        if self.backups:
+            for old in rotated_files(self.path)[:-self.backups]:
+                old.unlink(missing_ok=True)
+        logger.info(f"[LOG] Ротация: {self.path.name} → {rotated.name}")
+
+
+def rotated_files(path: Path) -> List[Path]:
+    """Архивные копии журнала, от старых к новым."""
+    def order(file: Path) -> Tuple[str, int]:
+        # <stem>.<стамп>[-n]<suffix>: строкой «…-1» встал бы раньше самого стампа
+        label = file.name[len(path.stem) + 1:len(file.name) - len(path.suffix)]
+        stamp, n = label[:_STAMP_LEN], label[_STAMP_LEN + 1:]
+        return stamp, int(n) if n.isdigit() else 0
+
+    return sorted(path.parent.glob(f"{path.stem}.*{path.suffix}"), key=order)
+
+
+def iter_records(path: Path, include_rotated: bool = False, chunk_size: int = 1 << 16) -> Iterator[dict]:
+    """
+    Потоково читает записи журнала в любом из форматов:
+    JSONL, JSON-массив (старый log_action) или их смесь в одном файле.
+    Файл целиком в память не грузится. Битая запись (падение посреди
+    записи, после которого бот дописывал дальше) пропускается до конца
+    строки с предупреждением — записи после неё читаются как обычно.
+    Запись длиннее chunk_size тоже считается битой: буфер не растёт
+    больше двух кусков.
+    """
+    files = (rotated_files(path) if include_rotated else []) + [path]
+    decoder = json.JSONDecoder()
+    for file in files:
+        if not file.exists():
+            continue
+        with file.open(encoding='utf-8') as f:
+            buf, pos, eof = '', 0, False
+            while True:
+                # пропускаем разделители массива и пустые строки
+                while pos < len(buf) and buf[pos] in ' \t\r\n,[]':
+                    pos += 1
+                if pos >= len(buf):
+                    if eof:
+                        break
+                    chunk = f.read(chunk_size)
+                    buf, pos, eof = chunk, 0, not chunk
+                    continue
+                try:
+                    record, end = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    if not eof and len(buf) - pos < chunk_size:
+                        # запись могла оборваться на границе куска — дочитываем один раз
+                        chunk = f.read(chunk_size)
+                        buf, pos, eof = buf[pos:] + chunk, 0, not chunk
+                        continue
+                    torn = buf[pos:pos + 80].split('\n', 1)[0]
+                    logger.warning(f"[LOG] {file.name}: повреждённая запись пропущена: {torn!r}")
+                    end = buf.find('\n', pos)
+                    while end < 0 and not eof:  # строка длиннее буфера — выбрасываем её куски
+                        chunk = f.read(chunk_size)
+                        buf, eof = chunk, not chunk
+                        end = buf.find('\n')
+                    pos = len(buf) if end < 0 else end + 1
+                    continue
+                pos = end
+                if isinstance(record, dict):
+                    yield record
+
+
+def migrate_array(path: Path, journal: Path) -> int:
+    """
+    Разовая миграция: JSON-массив в начале path (формат старого
+    log_action) переносится в конец JSONL-журнала journal, а в path
+    остаются только строки JSONL после массива. Возвращает число
+    перенесённых записей.
+    """
+    with locked(path):
+        if not path.exists():
+            return 0
+        text = path.read_text(encoding='utf-8')
+        start = len(text) - len(text.lstrip())
+        if not text.startswith('[', start):
+            return 0
+        try:
+            records, end = json.JSONDecoder().raw_decode(text, start)
+        except json.JSONDecodeError as e:
+            logger.error(f"[LOG] {path.name}: массив не читается, миграция пропущена: {e}")
+            return 0
+        with locked(journal):
+            append_lines(journal, [r for r in records if isinstance(r, dict)])
+        tmp = path.with_suffix(path.suffix + '.tmp')
+        tmp.write_text(text[end:].lstrip('\n'), encoding='utf-8')
+        os.replace(tmp, path)
+    logger.info(f"[LOG] {path.name}: перенесено {len(records)} записей в {journal.name}")
+    return len(records)
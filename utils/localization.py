@@ -1,10 +1,17 @@
-import json
+import asyncio
 import logging
+import threading
+import time
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Optional
-from difflib import get_close_matches
-import requests
-from transliterate import translit
+from typing import Callable, Dict, List, Optional, Tuple
+
+import config
+from utils import citydb, metrics, remote_cities
+from utils.aliases import AliasStore
+from utils.cache import MISS, TTLCache
+from utils.normalize import canonical, fold
+from utils.outbound import TokenBucket
 
 logger = logging.getLogger(__name__)
 
@@ -13,112 +20,219 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 CITIES_PATH = BASE_DIR / 'data' / 'cities.json'
 ALIASES_PATH = BASE_DIR / 'data' / 'user_aliases.json'
 
-# Aviasales API
-AVIASALES_API_KEY = '773c5f598a965aeea0b4c63f2d30d45a'
-AVIASALES_API_URL = 'https://api.travelpayouts.com/data/ru/cities.json'
+# Тип совпадения → текст для лога
+_MATCH_LABELS = {
+    'code': 'Совпадение по коду',
+    'name': 'Совпадение по имени',
+    'translation': 'Совпадение по переводу',
+    'case': 'Совпадение по падежу',
+}
+
+# Пользовательские алиасы: словарь в памяти + отложенная атомарная запись
+_ALIASES = AliasStore(ALIASES_PATH, max_size=config.ALIASES_MAX, delay=config.ALIASES_FLUSH_DELAY)
+
+# Справочник городов: mmap-артефакт data/cities.bin, если он свежий,
+# иначе индексы строятся из cities.json (см. utils.citydb) — без
+# артефакта это около секунды. Поэтому не при импорте: start_loading()
+# на старте диспетчера грузит справочник и алиасы в потоке, пока бот
+# подключается к Telegram, а хэндлеры ждут готовности (ReadinessMiddleware).
+_DB = None
+_LOAD_LOCK = threading.Lock()
+_LOADING: Optional[asyncio.Task] = None
+_PREPARE: List[Callable[[], None]] = []  # что ещё построить в той же загрузке (on_load)
+
+
+def _load_db():
+    """Справочник и алиасы, синхронно (из потока или как запасной путь)."""
+    global _DB
+    with _LOAD_LOCK:
+        if _DB is None:
+            start = time.perf_counter()
+            _ALIASES.load()
+            db = citydb.load(CITIES_PATH)
+            for prepare in _PREPARE:
+                prepare()
+            _DB = db  # последним: _DB is not None — признак готовности
+            logger.info(f"[CITYDB] Справочник готов за {time.perf_counter() - start:.2f} с")
+    return _DB
+
+
+def on_load(fn: Callable[[], None]) -> Callable[[], None]:
+    """
+    Декоратор: fn выполняется в фоновой загрузке справочника, до готовности,
+    так что ReadinessMiddleware ждёт и её (заранее построенные клавиатуры и т.п.).
+    """
+    _PREPARE.append(fn)
+    if _DB is not None:  # загрузка уже прошла — строим сразу
+        fn()
+    return fn
+
+
+def _db():
+    return _DB if _DB is not None else _load_db()
+
 
-# Загрузка cities.json
-with CITIES_PATH.open(encoding='utf-8') as f:
-    _CITIES = json.load(f)
+def ready() -> bool:
+    return _DB is not None
 
-# Убедимся, что файл user_aliases.json существует и валиден
-if not ALIASES_PATH.exists() or ALIASES_PATH.stat().st_size == 0:
-    with ALIASES_PATH.open('w', encoding='utf-8') as f:
-        json.dump({}, f)
 
-with ALIASES_PATH.open(encoding='utf-8') as f:
+async def start_loading() -> None:
+    """Хук старта: загрузка справочника в потоке, не дожидаясь её."""
+    global _LOADING
+    if _DB is None and _LOADING is None:
+        _LOADING = asyncio.create_task(asyncio.to_thread(_load_db))
+
+
+async def wait_ready() -> None:
+    global _LOADING
+    if _DB is not None:
+        return
+    await start_loading()
     try:
-        _RAW_ALIASES = json.load(f)
-        _ALIASES = {k.lower(): v for k, v in _RAW_ALIASES.items()}
-    except json.JSONDecodeError:
-        _ALIASES = {}
-        with ALIASES_PATH.open('w', encoding='utf-8') as fw:
-            json.dump(_ALIASES, fw)
+        await asyncio.shield(_LOADING)
+    except Exception:
+        _LOADING = None  # следующий апдейт попробует ещё раз
+        raise
+
+# Промахи: ввод, не найденный нигде (включая справочник API), — в
+# негативный кэш, чтобы повтор мусора не проходил все пути заново;
+# поход в API (самый дорогой путь) — по ведру токенов на пользователя
+_MISSES = TTLCache(max_size=config.IATA_MISS_CACHE_SIZE, ttl=config.IATA_MISS_TTL)
+_REMOTE_BUCKETS: Dict[int, TokenBucket] = {}
+_REMOTE_STATS: Dict[str, int] = {"calls": 0, "throttled": 0}
+
+
+def _remote_allowed(user_id: Optional[int]) -> bool:
+    """Ведро токенов пользователя на обращения к API (без user_id — без лимита)."""
+    global _REMOTE_BUCKETS
+    if user_id is None:
+        return True
+    now = time.monotonic()
+    bucket = _REMOTE_BUCKETS.get(user_id)
+    if bucket is None:
+        if len(_REMOTE_BUCKETS) > 10_000:  # выкидываем вёдра давно молчащих пользователей
+            _REMOTE_BUCKETS = {u: b for u, b in _REMOTE_BUCKETS.items() if not b.idle(now)}
+        bucket = _REMOTE_BUCKETS[user_id] = TokenBucket(config.IATA_REMOTE_RATE, config.IATA_REMOTE_BURST)
+    if bucket.delay(now) > 0:
+        return False
+    bucket.take()
+    return True
+
 
 def save_alias(alias: str, iata: str):
-    _ALIASES[alias.lower()] = iata
-    with ALIASES_PATH.open('w', encoding='utf-8') as f:
-        json.dump(_ALIASES, f, ensure_ascii=False, indent=2)
+    _ALIASES.set(alias, iata)
     logger.info(f"[IATA] Сохранено в user_aliases: {alias} → {iata}")
 
-def get_iata(user_input: str) -> Optional[str]:
-    name = user_input.strip().lower()
+
+async def flush_aliases() -> None:
+    await _ALIASES.flush()
+
+
+def lookup_stats() -> Dict[str, int]:
+    """Справочник, алиасы, негативный кэш и обращения к API (для метрик)."""
+    return {
+        "cities": len(_DB) if _DB is not None else 0,
+        "aliases": len(_ALIASES),
+        "miss_cache": len(_MISSES),
+        "miss_cache_hits": _MISSES.stats["hits"],
+        "miss_cache_evicted": _MISSES.stats["evicted"],
+        "remote_calls": _REMOTE_STATS["calls"],
+        "remote_throttled": _REMOTE_STATS["throttled"],
+    }
+
+
+async def get_iata(user_input: str, user_id: Optional[int] = None) -> Optional[str]:
+    """IATA по вводу пользователя; user_id — для лимита обращений к API."""
+    if _DB is None:
+        await wait_ready()
+    start = time.perf_counter()
+    code, path = await _resolve(user_input.strip().lower(), user_id)
+    metrics.IATA_SECONDS.observe(time.perf_counter() - start, path)
+    return code
+
+
+async def _resolve(name: str, user_id: Optional[int] = None) -> Tuple[Optional[str], str]:
+    """(IATA или None, путь разрешения) — путь идёт меткой в метрики."""
     logger.info(f"[IATA] Пользователь ввёл: {name}")
 
-    if name in _ALIASES:
-        logger.info(f"[IATA] Найден в alias: {_ALIASES[name]}")
-        return _ALIASES[name]
-
-    for city in _CITIES:
-        if city.get("code", "").lower() == name:
-            logger.info(f"[IATA] Совпадение по коду: {city['code']}")
-            return city["code"]
-        if city.get("name", "").lower() == name:
-            logger.info(f"[IATA] Совпадение по имени: {city['code']}")
-            return city["code"]
-        if name in [v.lower() for v in city.get("name_translations", {}).values()]:
-            logger.info(f"[IATA] Совпадение по переводу: {city['code']}")
-            return city["code"]
-        if name in [v.lower() for v in city.get("cases", {}).values()]:
-            logger.info(f"[IATA] Совпадение по падежу: {city['code']}")
-            return city["code"]
-
-    translit_name = translit(name, 'ru')
+    alias = _ALIASES.get(name)
+    if alias:
+        logger.info(f"[IATA] Найден в alias: {alias}")
+        return alias, "alias"
+
+    hit = _DB.exact(name)
+    if hit:
+        code, kind = hit
+        logger.info(f"[IATA] {_MATCH_LABELS[kind]}: {code}")
+        return code, kind
+
+    key = canonical(name)
+    code = _DB.canonical(key) if key else None
+    if code:
+        logger.info(f"[IATA] Совпадение после нормализации: {name} → {key} → {code}")
+        return code, "canonical"
+    if code == citydb.AMBIGUOUS:
+        logger.info(f"[IATA] Нормализованный ключ {key} у нескольких городов, ищу дальше: {name}")
+
+    # ключ — сам ввод: нормализованная форма сливает разные написания,
+    # и промах одного глушил бы другое, которое нашлось бы транслитерацией
+    if _MISSES.get(name) is not MISS:
+        logger.info(f"[IATA] Уже не находили недавно: {name}")
+        return None, "cached_miss"
+
+    translit_name = _translit(name)
     logger.info(f"[IATA] Пробую транслитерацию: {name} → {translit_name}")
 
-    for city in _CITIES:
-        city_names = [city.get("name", "").lower()]
-        translations = city.get("name_translations", {})
-        city_names += [v.lower() for v in translations.values() if isinstance(v, str)]
-
-        if translit_name in city_names:
-            code = city["code"]
-            logger.info(f"[IATA] Найден по транслитерации в локальном списке: {name} → {code}")
-            save_alias(name, code)
-            return code
-
-    all_names = {}
-    for city in _CITIES:
-        names = [city.get("name", "")]
-        names += list(city.get("name_translations", {}).values())
-        names += list(city.get("cases", {}).values())
-        names += [city.get("code", "")]
-        for n in names:
-            if n:
-                all_names[n.lower()] = city["code"]
-
-    matches = get_close_matches(name, all_names.keys(), n=1, cutoff=0.8)
-    if matches:
-        found = all_names[matches[0]]
-        logger.info(f"[IATA] Fuzzy match: {name} ≈ {matches[0]} → {found}")
+    code = _DB.translit(translit_name)
+    if code:
+        logger.info(f"[IATA] Найден по транслитерации в локальном списке: {name} → {code}")
+        save_alias(name, code)
+        return code, "translit"
+
+    folded = fold(key) if key else ''
+    code = _DB.folded(folded) if folded else None
+    if code:
+        logger.info(f"[IATA] Совпадение по грубой форме: {name} → {folded} → {code}")
+        return code, "folded"
+    if code == citydb.AMBIGUOUS:
+        logger.info(f"[IATA] Грубый ключ {folded} у нескольких городов, ищу дальше: {name}")
+
+    match = _DB.fuzzy.match(name, cutoff=0.8)
+    if match:
+        matched, found = match
+        logger.info(f"[IATA] Fuzzy match: {name} ≈ {matched} → {found}")
         save_alias(name, found)
-        return found
+        return found, "fuzzy"
+
+    if not _remote_allowed(user_id):
+        _REMOTE_STATS["throttled"] += 1
+        logger.warning(f"[IATA] Не найден локально, лимит обращений к API для {user_id} исчерпан: {name}")
+        return None, "throttled"  # в негативный кэш не кладём: API не спрашивали
 
     logger.info(f"[IATA] Не найден локально, обращаюсь к API…")
-    try:
-        response = requests.get(AVIASALES_API_URL, headers={"X-Access-Token": AVIASALES_API_KEY})
-        if response.status_code == 200:
-            cities_api = response.json()
-
-            for city in cities_api:
-                city_names = [city.get("name", "").lower()]
-                translations = city.get("name_translations", {})
-                city_names += [v.lower() for v in translations.values() if isinstance(v, str)]
-
-                if name in city_names or translit_name in city_names:
-                    code = city["code"]
-                    logger.info(f"[IATA] Найден через API: {name} → {code}")
-                    save_alias(name, code)
-                    return code
-
-            logger.warning(f"[IATA] Не найден в API")
-        else:
-            logger.warning(f"[IATA] Ошибка ответа от API: {response.status_code}")
-    except Exception as e:
-        logger.error(f"[IATA] Ошибка API: {e}")
+    _REMOTE_STATS["calls"] += 1
+    code = await remote_cities.find(name, translit_name)
+    if code is remote_cities.UNAVAILABLE:
+        logger.warning(f"[IATA] Справочник API недоступен, промах не кэширую: {name}")
+        return None, "unavailable"
+    if code:
+        logger.info(f"[IATA] Найден через API: {name} → {code}")
+        save_alias(name, code)
+        return code, "remote"
+    logger.warning(f"[IATA] Не найден в API")
 
     logger.warning(f"[IATA] Не найден: {name}")
-    return None
+    _MISSES.set(name, True)
+    return None, "miss"
+
+
+@lru_cache(maxsize=4096)
+def _translit(name: str) -> str:
+    """Латиница → кириллица (transliterate медленный, а промахи повторяются)."""
+    from transliterate import translit  # нужен только на промахе точного поиска
+
+    return translit(name, 'ru')
+
 
 def city_by_iata(iata: str, lang: str = 'ru') -> Optional[str]:
     """
@@ -126,9 +240,9 @@ def city_by_iata(iata: str, lang: str = 'ru') -> Optional[str]:
     учитывая выбранный язык (ru/uz). Если не найден, возвращает просто IATA.
     """
     iata = iata.upper()
-    for city in _CITIES:
-        if city.get("code") == iata:
-            if lang == 'uz':
-                return f"{city.get('name_translations', {}).get('uz', city.get('name'))} ({iata})"
-            return f"{city.get('name')} ({iata})"
-    return iata
+    return _db().label(iata, lang) or iata
+
+
+def city_record(iata: str) -> Optional[dict]:
+    """Запись города из cities.json по IATA-коду."""
+    return _db().record(iata.upper())
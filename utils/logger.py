@@ -1,16 +1,34 @@
-import json
 import logging
 from pathlib import Path
 from datetime import datetime
 
+import config
+from utils.journal import EventSink, migrate_array
+
 BASE_DIR = Path(__file__).resolve().parent.parent
-LOGS_PATH = BASE_DIR / 'data' / 'user_logs.json'
+# Раньше log_action переписывал JSON-массив в user_logs.json — тот же файл,
+# куда save_flow_log дописывает JSONL. Теперь у действий свой журнал.
+LEGACY_LOGS_PATH = BASE_DIR / 'data' / 'user_logs.json'
+ACTIONS_PATH = BASE_DIR / 'data' / 'user_actions.jsonl'
+
+# Append-only журнал: одна строка JSON на действие (старт/стоп — в bot.py)
+ACTIONS_LOG = EventSink(
+    ACTIONS_PATH,
+    batch_size=config.FLOW_LOG_BATCH,
+    flush_interval=config.FLOW_LOG_INTERVAL,
+    max_queue=config.FLOW_LOG_MAX_QUEUE,
+    max_bytes=config.FLOW_LOG_MAX_BYTES,
+    rotate_interval=config.FLOW_LOG_ROTATE_INTERVAL,
+    backups=config.FLOW_LOG_BACKUPS,
+)
+
+
+async def start() -> None:
+    """Разовая миграция старого массива + запуск фонового писателя."""
+    ACTIONS_PATH.parent.mkdir(parents=True, exist_ok=True)
+    migrate_array(LEGACY_LOGS_PATH, ACTIONS_PATH)
+    await ACTIONS_LOG.start()
 
-# Гарантируем существование директории и файла
-LOGS_PATH.parent.mkdir(parents=True, exist_ok=True)
-if not LOGS_PATH.exists():
-    with LOGS_PATH.open('w', encoding='utf-8') as f:
-        json.dump([], f)
 
 def log_action(user_id: int, step: str, user_input: str = "", bot_reply: str = "", metadata: dict = None):
     try:
@@ -24,13 +42,7 @@ def log_action(user_id: int, step: str, user_input: str = "", bot_reply: str = "
             "metadata": metadata or {}
         }
 
-        with LOGS_PATH.open(encoding='utf-8') as f:
-            logs = json.load(f)
-
-        logs.append(entry)
-
-        with LOGS_PATH.open('w', encoding='utf-8') as f:
-            json.dump(logs, f, ensure_ascii=False, indent=2)
+        ACTIONS_LOG.emit(entry)
 
         logging.info(f"[LOG] Записано действие: {entry}")
 
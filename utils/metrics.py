@@ -0,0 +1,195 @@
+"""
+Метрики процесса в текстовом формате Prometheus.
+
+• гистограммы времени хэндлеров, путей get_iata и вызовов Bot API,
+  счётчики ошибок — их пишут middleware и сами горячие пути;
+• статистика компонентов (журналы, кэши, очередь исходящих, вебхук)
+  не копируется сюда, а читается из их stats в момент запроса — watch().
+
+Отдаются на http://METRICS_HOST:METRICS_PORT/metrics (start/stop —
+хуки диспетчера). При METRICS=0 (по умолчанию) middleware не
+регистрируются, а observe()/inc() в горячих путях возвращаются сразу.
+"""
+import logging
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterator, List, Mapping, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import Response, TelegramMethod
+from aiohttp import web
+
+import config
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "tickets_bot_"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# сек: от попадания в алиас (микросекунды) до похода в API (секунды)
+BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    escape = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")  # noqa: E731
+    return "{" + ",".join(f'{n}="{escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+def _number(v: float) -> str:
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class Counter:
+    """Монотонный счётчик с метками (значения меток — позиционно, в порядке labels)."""
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = PREFIX + name
+        self.help = help
+        self.labels = labels
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, value: float = 1) -> None:
+        if not config.METRICS:
+            return
+        self._values[labels] = self._values.get(labels, 0) + value
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in sorted(self._values.items()):
+            yield f"{self.name}{_labels(self.labels, labels)} {_number(value)}"
+
+
+class Histogram:
+    """Гистограмма с фиксированными границами BUCKETS (сек); _count заодно счётчик событий."""
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = BUCKETS):
+        self.name = PREFIX + name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series: Dict[Tuple[str, ...], List[float]] = {}  # метки → [счётчики корзин…, +Inf, сумма]
+
+    def observe(self, seconds: float, *labels: str) -> None:
+        if not config.METRICS:
+            return
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, seconds)] += 1
+        series[-1] += seconds
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        names = self.labels + ("le",)
+        for labels, series in sorted(self._series.items()):
+            total = 0
+            for le, n in zip(self.buckets + ("+Inf",), series):
+                total += n
+                yield f"{self.name}_bucket{_labels(names, labels + (le,))} {total}"
+            yield f"{self.name}_sum{_labels(self.labels, labels)} {_number(series[-1])}"
+            yield f"{self.name}_count{_labels(self.labels, labels)} {total}"
+
+
+HANDLER_SECONDS = Histogram("handler_seconds", "Время хэндлера апдейта, сек", ("handler",))
+HANDLER_ERRORS = Counter("handler_errors_total", "Исключения в хэндлерах", ("handler",))
+IATA_SECONDS = Histogram(
+    "iata_resolve_seconds",
+    "get_iata по пути разрешения (alias, code, name, translation, case, canonical, cached_miss, translit, folded, fuzzy, throttled, remote, unavailable, miss), сек",
+    ("path",),
+)
+TELEGRAM_SECONDS = Histogram("telegram_request_seconds", "Вызов Bot API вместе с очередью исходящих, сек", ("method",))
+TELEGRAM_ERRORS = Counter("telegram_errors_total", "Вызовы Bot API, завершившиеся исключением", ("method",))
+LOOP_LAG_SECONDS = Histogram("loop_lag_seconds", "Опоздание пробуждения сэмплера цикла событий (DIAGNOSTICS=1), сек")
+_METRICS = [HANDLER_SECONDS, HANDLER_ERRORS, IATA_SECONDS, TELEGRAM_SECONDS, TELEGRAM_ERRORS, LOOP_LAG_SECONDS]
+
+# (имя, метки) → (help, источник): повторная регистрация (новый диспетчер) заменяет старую
+_WATCHED: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], Tuple[str, Callable[[], Mapping[str, Any]]]] = {}
+
+
+def watch(name: str, help: str, source: Callable[[], Mapping[str, Any]], **labels: str) -> None:
+    """
+    Показывать словарь статистики компонента как gauge name{…, stat="ключ"}.
+
+    source вызывается при каждом запросе /metrics; нечисловые значения пропускаются.
+    """
+    _WATCHED[PREFIX + name, tuple(sorted(labels.items()))] = (help, source)
+
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in _METRICS:
+        lines += metric.render()
+    described = set()
+    for (name, labels), (help, source) in sorted(_WATCHED.items(), key=lambda kv: kv[0]):
+        if name not in described:
+            described.add(name)
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} gauge"]
+        try:
+            stats = source()
+        except Exception as e:  # сломанный источник не должен ронять весь /metrics
+            logger.warning(f"[METRICS] Источник {name}{dict(labels)} упал: {e}")
+            continue
+        names = tuple(k for k, _ in labels) + ("stat",)
+        values = tuple(v for _, v in labels)
+        for key, value in stats.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                lines.append(f"{name}{_labels(names, values + (key,))} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+class RequestMetrics(BaseRequestMiddleware):
+    """Middleware сессии Bot API: время и ошибки каждого исходящего вызова по методу."""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType,
+        bot: Bot,
+        method: TelegramMethod,
+    ) -> Response:
+        name = type(method).__name__
+        start = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception:
+            TELEGRAM_ERRORS.inc(name)
+            raise
+        finally:
+            TELEGRAM_SECONDS.observe(time.perf_counter() - start, name)
+
+
+# ───── HTTP endpoint ─────
+_RUNNER: Optional[web.AppRunner] = None
+port = config.METRICS_PORT  # воркеры сдвигают на свой номер, чтобы не делить порт
+
+
+async def _handle(request: web.Request) -> web.Response:
+    return web.Response(body=render().encode(), headers={"Content-Type": CONTENT_TYPE})
+
+
+async def start() -> None:
+    global _RUNNER
+    if not config.METRICS or _RUNNER is not None:
+        return
+    app = web.Application()
+    app.router.add_get("/metrics", _handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, config.METRICS_HOST, port).start()
+    except OSError as e:  # занятый порт — повод для предупреждения, не для падения бота
+        logger.error(f"[METRICS] Не удалось открыть {config.METRICS_HOST}:{port}: {e}")
+        await runner.cleanup()
+        return
+    _RUNNER = runner
+    logger.info(f"[METRICS] Слушаю http://{config.METRICS_HOST}:{port}/metrics")
+
+
+async def stop() -> None:
+    global _RUNNER
+    if _RUNNER is not None:
+        runner, _RUNNER = _RUNNER, None
+        await runner.cleanup()
@@ -0,0 +1,55 @@
+"""
+Нормализованные формы названия города — общие ключи для разных написаний.
+
+canonical() — строгая форма: «Ташкент» и «tashkent», «Ростов на дону»
+и «Ростов-на-Дону», «Farg‘ona» и «fargʻona» сводятся к одной строке:
+• кириллица (русская и узбекская) → латиница по одной таблице;
+• диакритика снимается, апострофы (oʻ, o', gʻ), дефисы, пробелы и
+  прочие разделители выбрасываются;
+• варианты одной буквы сливаются: ё/е, x/kh/h, q/k, zh/dzh/j, щ/ш, w/v.
+
+fold() — грубее, поверх строгой формы: o и a — одна буква (узбекская
+латиница пишет «o» там, где по-русски «а»: Toshkent, Buxoro), -iy и -i.
+Это стирает и настоящие различия (Кали / Колли), поэтому get_iata
+пробует её только после строгой формы и транслитерации. Сдвоенные буквы
+не сливаются нигде: «Хива-Оа» превращалась бы в «Хиву», а «Дерри» в
+«Дери» — такие опечатки остаются нечёткому поиску.
+
+Ключи индекса (utils.citydb) и запрос пользователя проходят через одни
+и те же функции, так что написание без опечаток находится поиском по
+словарю.
+"""
+import re
+import unicodedata
+
+_CYRILLIC = str.maketrans({
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e', 'ж': 'j', 'з': 'z',
+    'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r',
+    'с': 's', 'т': 't', 'у': 'u', 'ф': 'f', 'х': 'h', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sh',
+    'ъ': '', 'ы': 'i', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+    # узбекская кириллица
+    'ў': 'o', 'қ': 'k', 'ғ': 'g', 'ҳ': 'h',
+})
+
+# порядок важен: длинные сочетания раньше их частей
+_FOLDS = (
+    ('shch', 'sh'), ('dzh', 'j'), ('zh', 'j'), ('kh', 'h'), ('x', 'h'),
+    ('q', 'k'), ('w', 'v'),
+)
+_SEPARATORS = re.compile(r'[\W_ʻʼʹ]+')  # ʻ ʼ ʹ — «буквы» для \w, но в oʻ/gʻ это апостроф
+
+
+def canonical(text: str) -> str:
+    """Строгая форма строки; пустая строка — сравнивать не с чем."""
+    s = text.lower().translate(_CYRILLIC)
+    if not s.isascii():
+        s = ''.join(ch for ch in unicodedata.normalize('NFKD', s) if not unicodedata.combining(ch))
+    s = _SEPARATORS.sub('', s)
+    for src, dst in _FOLDS:
+        s = s.replace(src, dst)
+    return s
+
+
+def fold(key: str) -> str:
+    """Грубая форма строгого ключа canonical(): o = a, -iy = -i."""
+    return key.replace('iy', 'i').replace('o', 'a')
@@ -0,0 +1,335 @@
+import asyncio
+import itertools
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Hashable, List, Optional, Set, Tuple
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import AnswerCallbackQuery, EditMessageReplyMarkup, EditMessageText, TelegramMethod
+
+logger = logging.getLogger(__name__)
+
+# приоритеты: меньше — раньше
+PRIO_EDIT = 1  # перерисовка клавиатуры в ответ на нажатие
+PRIO_SEND = 2  # новые сообщения и всё остальное, адресованное чату
+_MERGEABLE = (EditMessageReplyMarkup, EditMessageText)
+_MAX_RETRIES = 3
+
+
+class TokenBucket:
+    """Классическое ведро токенов: rate токенов в секунду, не больше capacity."""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated", "blocked_until")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0  # после 429 — пауза на retry_after
+
+    def delay(self, now: float) -> float:
+        """Сколько секунд ждать до свободного токена (0 — можно сейчас)."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        if self.blocked_until:
+            if self.blocked_until > now:
+                return max(wait, self.blocked_until - now)
+            self.blocked_until = 0.0
+        return wait
+
+    def take(self) -> None:
+        self.tokens -= 1
+
+    def idle(self, now: float) -> bool:
+        return self.tokens + (now - self.updated) * self.rate >= self.capacity and self.blocked_until <= now
+
+
+@dataclass
+class _Job:
+    bot: Bot
+    method: TelegramMethod
+    timeout: Optional[int]
+    chat: Hashable
+    priority: int
+    seq: int
+    queued: float
+    futures: List[asyncio.Future] = field(default_factory=list)
+    merge_key: Optional[Tuple] = None
+    attempts: int = 0
+
+
+class ScheduledSession(BaseSession):
+    """
+    Обёртка над сессией Bot API с планировщиком исходящих запросов.
+
+    • глобальное ведро (≈30 сообщений/с) и ведро на каждый чат (≈1/с
+      с небольшим запасом на всплеск) — запросы ждут очереди, а не
+      ловят 429;
+    • answerCallbackQuery не тратит токены и уходит сразу, минуя
+      очередь; когда упираемся в глобальный лимит, правки клавиатур
+      других чатов идут раньше новых сообщений;
+    • несколько ещё не отправленных правок одного сообщения, идущих в
+      очереди чата подряд, сливаются: уходит только последняя, все
+      вызвавшие получают её ответ;
+    • порядок запросов внутри одного чата сохраняется;
+    • на 429 чат ставится на паузу retry_after, запрос возвращается
+      в начало очереди чата (не больше трёх повторов); правка, которую
+      за это время сменила более новая правка того же сообщения, не
+      повторяется — её вызвавшие ждут новую.
+
+    Метрики — stats и snapshot(): глубина очереди, время ожидания.
+    """
+
+    def __init__(
+        self,
+        inner: BaseSession,
+        *,
+        global_rate: float = 30,
+        chat_rate: float = 1,
+        chat_burst: float = 3,
+        report_interval: float = 60,
+    ):
+        super().__init__(api=inner.api, json_loads=inner.json_loads, json_dumps=inner.json_dumps, timeout=inner.timeout)
+        self.inner = inner
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.report_interval = report_interval
+        self.stats: Dict[str, float] = {
+            "queued": 0, "sent": 0, "bypassed": 0, "merged": 0, "retried": 0, "failed": 0,
+            "max_depth": 0, "wait_max": 0.0,
+        }
+        self.waits: Deque[float] = deque(maxlen=2048)  # последние ожидания в очереди, сек
+        self._global = TokenBucket(global_rate, global_rate)
+        self._buckets: Dict[Hashable, TokenBucket] = {}
+        self._chats: Dict[Hashable, Deque[_Job]] = {}
+        self._edits: Dict[Tuple, _Job] = {}
+        self._newest: Dict[Tuple, int] = {}  # merge_key → seq последней правки сообщения (до её ответа)
+        self._depth = 0
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._sending: set = set()
+
+    @property
+    def depth(self) -> int:
+        return self._depth
+
+    def snapshot(self) -> Dict[str, float]:
+        waits = sorted(self.waits)
+        pct = lambda q: waits[min(len(waits) - 1, int(q * len(waits)))] if waits else 0.0  # noqa: E731
+        return {**self.stats, "depth": self._depth, "wait_p50": pct(0.5), "wait_p95": pct(0.95)}
+
+    # ───── BaseSession ─────
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None) -> Any:
+        chat = getattr(method, "chat_id", None)
+        if isinstance(method, AnswerCallbackQuery) or chat is None:
+            # ответы на нажатия и служебные вызовы (getUpdates, getMe, …) — без очереди
+            self.stats["bypassed"] += 1
+            return await self.inner.make_request(bot, method, timeout)
+
+        future = asyncio.get_running_loop().create_future()
+        merge_key = None
+        if isinstance(method, _MERGEABLE):
+            merge_key = (type(method).__name__, chat, method.message_id)
+            pending = self._edits.get(merge_key)
+            queue = self._chats.get(chat)
+            # сливаем, только если за правкой в чате ничего не стоит:
+            # иначе новая правка обогнала бы отправленное после неё сообщение
+            if pending is not None and queue and queue[-1] is pending:
+                pending.method = method  # старую правку вытесняет новая
+                pending.futures.append(future)
+                self.stats["merged"] += 1
+                return await future
+
+        job = _Job(
+            bot, method, timeout, chat,
+            priority=PRIO_EDIT if merge_key else PRIO_SEND,
+            seq=next(self._seq),
+            queued=time.monotonic(),
+            futures=[future],
+            merge_key=merge_key,
+        )
+        if merge_key:
+            self._newest[merge_key] = job.seq
+        self._enqueue(job)
+        return await future
+
+    def stream_content(self, *args: Any, **kwargs: Any):
+        return self.inner.stream_content(*args, **kwargs)
+
+    async def close(self) -> None:
+        if self._task is not None:
+            # даём очереди досылаться, но не бесконечно
+            deadline = time.monotonic() + 5
+            while (self._depth or self._sending) and time.monotonic() < deadline:
+                await asyncio.sleep(0.05)
+            self._task.cancel()
+            self._task = None
+            for queue in self._chats.values():
+                for job in queue:
+                    self._resolve(job, exc=RuntimeError("session closed"))
+            self._chats.clear()
+            self._edits.clear()
+            self._newest.clear()
+            logger.info(f"[OUT] Планировщик остановлен: {self.snapshot()}")
+        await self.inner.close()
+
+    # ───── очередь ─────
+    def _enqueue(self, job: _Job, retry: bool = False) -> None:
+        queue = self._chats.setdefault(job.chat, deque())
+        if retry:
+            # повтор после 429 — в начало очереди чата; с ним больше не сливаем:
+            # в _edits может стоять более новая правка того же сообщения
+            queue.appendleft(job)
+        else:
+            queue.append(job)
+            if job.merge_key:
+                self._edits[job.merge_key] = job
+            self.stats["queued"] += 1
+        self._depth += 1
+        self.stats["max_depth"] = max(self.stats["max_depth"], self._depth)
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run(), name="outbound-scheduler")
+        self._wakeup.set()
+
+    def _bucket(self, chat: Hashable) -> TokenBucket:
+        bucket = self._buckets.get(chat)
+        if bucket is None:
+            if len(self._buckets) > 10_000:  # выкидываем вёдра давно молчащих чатов
+                now = time.monotonic()
+                self._buckets = {c: b for c, b in self._buckets.items() if not b.idle(now) or c in self._chats}
+            bucket = self._buckets[chat] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def _pick(self) -> Tuple[Optional[_Job], Optional[float]]:
+        """Лучшая из голов очередей чатов, которую можно отправить сейчас, или через сколько проверить снова."""
+        now = time.monotonic()
+        global_wait = self._global.delay(now)
+        best, soonest = None, None
+        for chat, queue in self._chats.items():
+            job = queue[0]
+            wait = max(global_wait, self._bucket(chat).delay(now))
+            if wait > 0:
+                soonest = wait if soonest is None else min(soonest, wait)
+            elif best is None or (job.priority, job.seq) < (best.priority, best.seq):
+                best = job
+        return best, soonest
+
+    async def _run(self) -> None:
+        last_report = time.monotonic()
+        while True:
+            job, wait = self._pick()
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                self._dispatch(job)
+            if time.monotonic() - last_report >= self.report_interval:
+                last_report = time.monotonic()
+                if self.stats["queued"]:
+                    logger.info(f"[OUT] {self.snapshot()}")
+
+    def _dispatch(self, job: _Job) -> None:
+        queue = self._chats[job.chat]
+        queue.popleft()
+        if not queue:
+            del self._chats[job.chat]
+        if job.merge_key and self._edits.get(job.merge_key) is job:
+            del self._edits[job.merge_key]
+        self._depth -= 1
+        self._global.take()
+        self._bucket(job.chat).take()
+        waited = time.monotonic() - job.queued
+        self.waits.append(waited)
+        self.stats["wait_max"] = max(self.stats["wait_max"], waited)
+        task = asyncio.create_task(self._send(job))
+        self._sending.add(task)
+        task.add_done_callback(self._sending.discard)
+
+    async def _send(self, job: _Job) -> None:
+        try:
+            result = await self.inner.make_request(job.bot, job.method, job.timeout)
+        except TelegramRetryAfter as e:
+            self.stats["retried"] += 1
+            job.attempts += 1
+            if job.attempts > _MAX_RETRIES:
+                self._resolve(job, exc=e)
+                return
+            logger.warning(f"[OUT] 429 для чата {job.chat}: пауза {e.retry_after} с")
+            self._bucket(job.chat).blocked_until = time.monotonic() + e.retry_after
+            if job.merge_key and self._newest.get(job.merge_key) != job.seq:
+                self._supersede(job)
+                return
+            self._enqueue(job, retry=True)
+            return
+        except Exception as e:
+            self._resolve(job, exc=e)
+            return
+        self.stats["sent"] += 1
+        self._resolve(job, result=result)
+
+    def _supersede(self, job: _Job) -> None:
+        """Повтор правки, которую уже сменила более новая: старое содержимое не шлём."""
+        self.stats["merged"] += 1
+        pending = self._edits.get(job.merge_key)
+        if pending is not None:
+            pending.futures.extend(job.futures)  # вызвавшие получат ответ новой правки
+        else:
+            self._resolve(job, result=True)  # новая уже ушла или в полёте
+
+    def _resolve(self, job: _Job, result: Any = None, exc: Optional[BaseException] = None) -> None:
+        if job.merge_key and self._newest.get(job.merge_key) == job.seq:
+            del self._newest[job.merge_key]
+        if exc is not None:
+            self.stats["failed"] += 1
+        for future in job.futures:
+            if future.done():
+                continue  # вызвавший уже отменён
+            if exc is not None:
+                future.set_exception(exc)
+            else:
+                future.set_result(result)
+
+
+# ───── отправка без ожидания ─────
+_BACKGROUND: Set[asyncio.Task] = set()
+
+
+def _log_failure(task: asyncio.Task) -> None:
+    _BACKGROUND.discard(task)
+    if task.cancelled():
+        return
+    e = task.exception()
+    if e is not None and "message is not modified" not in str(e):
+        logger.warning(f"[OUT] Фоновый запрос не удался: {e!r}")
+
+
+async def submit(bot: Bot, method: TelegramMethod) -> None:
+    """
+    Запрос, ответ на который хэндлеру не нужен (перерисовка клавиатуры).
+
+    С планировщиком хэндлер не ждёт отправки: апдейты одного пользователя
+    обрабатываются по очереди, и если ждать каждую правку, в очереди чата
+    никогда не окажется двух правок одного сообщения — сливать будет нечего,
+    а следующее нажатие ждёт лимит чата. Порядок внутри чата сохраняет сама
+    очередь. Без планировщика параллельные правки могли бы прийти не в том
+    порядке — тогда ждём, как раньше. Ошибки фоновой отправки — в лог
+    («message is not modified» после слияния правок — не ошибка).
+    """
+    if not isinstance(bot.session, ScheduledSession):
+        await bot(method)
+        return
+    task = asyncio.ensure_future(bot(method))
+    _BACKGROUND.add(task)
+    task.add_done_callback(_log_failure)
+    await asyncio.sleep(0)  # задача успевает встать в очередь чата раньше следующих запросов хэндлера
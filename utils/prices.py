@@ -0,0 +1,254 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import aiohttp
+
+import config
+from utils.cache import MISS, SingleFlight, TTLCache
+from utils.http import get_session
+
+logger = logging.getLogger(__name__)
+
+PRICES_FOR_DATES = "/aviasales/v3/prices_for_dates"
+MONTH_MATRIX = "/v2/prices/month-matrix"
+
+# цены Travelpayouts — кэш поисков за последние дни, для превью этого достаточно
+_CACHE = TTLCache(max_size=config.PRICES_CACHE_SIZE, ttl=config.PRICES_TTL)
+_FLIGHTS = SingleFlight()
+# календарь цен на месяц: (откуда, куда, "YYYY-MM") → {день: цена}
+_MONTHS = TTLCache(max_size=config.PRICES_CACHE_SIZE, ttl=config.PRICES_TTL)
+stats: Dict[str, int] = {"requests": 0, "month_requests": 0, "errors": 0, "timeouts": 0, "bad_rows": 0}
+
+
+@dataclass(frozen=True)
+class Fare:
+    price: int  # за одного взрослого, в currency
+    currency: str
+    airline: str
+    transfers: int
+    departure_at: str
+    return_at: str = ""
+
+
+def _key(origin: str, destination: str, depart: str, ret: str) -> Tuple[str, str, str, str]:
+    return origin.upper(), destination.upper(), depart, ret
+
+
+async def cheapest(origin: str, destination: str, depart: str, ret: str = "") -> Optional[Fare]:
+    """
+    Самая дешёвая известная цена для маршрута и дат (или None).
+
+    Ключ кэша — (откуда, куда, даты): API отдаёт цену за одного
+    взрослого, а итог на всех пассажиров считается при отрисовке.
+    Одинаковые одновременные запросы склеиваются в один.
+    """
+    key = _key(origin, destination, depart, ret)
+    fare = _CACHE.get(key)
+    if fare is not MISS:
+        return fare
+    return await _FLIGHTS.do(key, lambda: _fetch(key))
+
+
+def fresh_for(origin: str, destination: str, depart: str, ret: str = "") -> float:
+    """Сколько секунд цена ещё пролежит в кэше (0 — нет или протухла)."""
+    return _CACHE.fresh_for(_key(origin, destination, depart, ret))
+
+
+async def refresh(origin: str, destination: str, depart: str, ret: str = "") -> Optional[Fare]:
+    """Загрузить цену из апстрима мимо кэша (и положить в кэш) — для прогрева."""
+    key = _key(origin, destination, depart, ret)
+    return await _FLIGHTS.do(key, lambda: _fetch(key))
+
+
+async def cheapest_within(origin: str, destination: str, depart: str, ret: str = "",
+                          budget: float = config.PRICES_BUDGET) -> Optional[Fare]:
+    """
+    cheapest() с ограничением по времени: если апстрим не успел за budget
+    секунд, возвращаем None, а запрос досчитывается в фоне и кладёт цену
+    в кэш — следующий показ уже будет с ней.
+    """
+    try:
+        return await asyncio.wait_for(asyncio.shield(cheapest(origin, destination, depart, ret)), budget)
+    except asyncio.TimeoutError:
+        stats["timeouts"] += 1
+        logger.info(f"[PRICE] {origin}→{destination} {depart}: не уложились в {budget} с")
+        return None
+
+
+def _rows(payload) -> List[dict]:
+    """Строки data из ответа API; ответ не того вида — пусто (как «нет цен»)."""
+    if not isinstance(payload, dict) or not payload.get("success", True):
+        return []
+    rows = payload.get("data") or []
+    return [row for row in rows if isinstance(row, dict)] if isinstance(rows, list) else []
+
+
+def _parse_fare(row: dict, currency: str) -> Optional[Fare]:
+    """Fare из строки prices_for_dates; битая строка — None."""
+    try:
+        return Fare(
+            price=int(row["price"]),
+            currency=currency,
+            airline=str(row.get("airline") or ""),
+            transfers=int(row.get("transfers") or 0),
+            departure_at=str(row.get("departure_at") or ""),
+            return_at=str(row.get("return_at") or ""),
+        )
+    except (KeyError, TypeError, ValueError):
+        stats["bad_rows"] += 1
+        logger.warning(f"[PRICE] Пропускаю битую строку ответа: {row!r:.200}")
+        return None
+
+
+async def _fetch(key: Tuple[str, str, str, str]) -> Optional[Fare]:
+    origin, destination, depart, ret = key
+    params = {
+        "origin": origin,
+        "destination": destination,
+        "departure_at": depart,
+        "one_way": "false" if ret else "true",
+        "sorting": "price",
+        "limit": 1,
+        "currency": config.PRICES_CURRENCY,
+    }
+    if ret:
+        params["return_at"] = ret
+    stats["requests"] += 1
+    try:
+        async with get_session().get(
+            config.TRAVELPAYOUTS_API_URL + PRICES_FOR_DATES,
+            params=params,
+            headers={"X-Access-Token": config.TRAVELPAYOUTS_API_KEY},  # в заголовке, чтобы токен не попадал в логи с URL
+        ) as resp:
+            resp.raise_for_status()
+            payload = await resp.json(content_type=None)
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+        stats["errors"] += 1
+        logger.warning(f"[PRICE] Ошибка запроса {origin}→{destination} {depart}: {e}")
+        _CACHE.set(key, None, ttl=config.PRICES_NEGATIVE_TTL)
+        return None
+
+    fare = None
+    rows = _rows(payload)
+    if rows:
+        currency = str(payload.get("currency") or config.PRICES_CURRENCY).upper()
+        # строки отсортированы по цене: берём первую целую
+        fare = next(filter(None, (_parse_fare(row, currency) for row in rows)), None)
+    _CACHE.set(key, fare, ttl=None if fare else config.PRICES_NEGATIVE_TTL)
+    logger.info(f"[PRICE] {origin}→{destination} {depart}/{ret or '-'}: {fare.price if fare else 'нет цены'}")
+    return fare
+
+
+# ─────────────────────────────────────────────
+#        Календарь цен на месяц (month-matrix)
+# ─────────────────────────────────────────────
+def _month_key(origin: str, destination: str, year: int, month: int) -> Tuple[str, str, str]:
+    return origin.upper(), destination.upper(), f"{year}-{month:02d}"
+
+
+def prefetch_months(origin: str, destination: str, months: Iterable[Tuple[int, int]]) -> None:
+    """
+    Запустить в фоне загрузку календарей цен, которых ещё нет в кэше.
+    Вызывается при показе клавиатуры месяцев: пока пользователь выбирает,
+    цены уже едут. Повторный вызов для идущей загрузки ничего не делает.
+    """
+    for year, month in months:
+        key = _month_key(origin, destination, year, month)
+        if _MONTHS.fresh_for(key) or _FLIGHTS.inflight(key):
+            continue
+        _FLIGHTS.start(key, lambda key=key: _fetch_month(key))
+
+
+def month_fresh_for(origin: str, destination: str, year: int, month: int) -> float:
+    return _MONTHS.fresh_for(_month_key(origin, destination, year, month))
+
+
+async def refresh_month(origin: str, destination: str, year: int, month: int) -> Dict[int, int]:
+    key = _month_key(origin, destination, year, month)
+    return await _FLIGHTS.do(key, lambda: _fetch_month(key))
+
+
+async def month_prices(origin: str, destination: str, year: int, month: int,
+                       budget: float = config.PRICES_MONTH_BUDGET) -> Dict[int, int]:
+    """
+    {день: самая дешёвая цена} за месяц, одним запросом на маршрут×месяц.
+    Ждём не дольше budget (обычно данные уже предзагружены); не успели —
+    пустой словарь, загрузка досчитается в фоне.
+    """
+    key = _month_key(origin, destination, year, month)
+    days = _MONTHS.get(key)
+    if days is not MISS:
+        return days
+    try:
+        return await asyncio.wait_for(_FLIGHTS.do(key, lambda: _fetch_month(key)), budget)
+    except asyncio.TimeoutError:
+        stats["timeouts"] += 1
+        return {}
+
+
+async def _fetch_month(key: Tuple[str, str, str]) -> Dict[int, int]:
+    origin, destination, month = key
+    params = {
+        "origin": origin,
+        "destination": destination,
+        "month": f"{month}-01",
+        "currency": config.PRICES_CURRENCY,
+        "show_to_affiliates": "true",
+    }
+    stats["month_requests"] += 1
+    try:
+        async with get_session().get(
+            config.TRAVELPAYOUTS_API_URL + MONTH_MATRIX,
+            params=params,
+            headers={"X-Access-Token": config.TRAVELPAYOUTS_API_KEY},
+        ) as resp:
+            resp.raise_for_status()
+            payload = await resp.json(content_type=None)
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+        stats["errors"] += 1
+        logger.warning(f"[PRICE] Ошибка календаря {origin}→{destination} {month}: {e}")
+        _MONTHS.set(key, {}, ttl=config.PRICES_NEGATIVE_TTL)
+        return {}
+
+    days: Dict[int, int] = {}
+    for row in _rows(payload):
+        depart = row.get("depart_date")
+        if not isinstance(depart, str) or not depart.startswith(month):
+            continue
+        try:
+            day, price = int(depart[8:10]), int(row["value"])
+        except (KeyError, TypeError, ValueError):
+            stats["bad_rows"] += 1
+            logger.warning(f"[PRICE] Пропускаю битую строку календаря {origin}→{destination}: {row!r:.200}")
+            continue
+        if price < days.get(day, price + 1):
+            days[day] = price
+    _MONTHS.set(key, days, ttl=None if days else config.PRICES_NEGATIVE_TTL)
+    logger.info(f"[PRICE] Календарь {origin}→{destination} {month}: {len(days)} дн.")
+    return days
+
+
+def cheapest_days(days: Dict[int, int], first_day: int = 1, n: int = config.PRICES_CHEAP_DAYS) -> frozenset:
+    """Дни (от first_day) с n самыми низкими ценами; при равенстве цен — все такие дни."""
+    visible = sorted(p for d, p in days.items() if d >= first_day)
+    if not visible:
+        return frozenset()
+    limit = visible[min(n, len(visible)) - 1]
+    return frozenset(d for d, p in days.items() if d >= first_day and p <= limit)
+
+
+def snapshot() -> Dict[str, int]:
+    """Запросы в апстрим и состояние обоих кэшей (для метрик)."""
+    return {
+        **stats,
+        **{f"fares_{k}": v for k, v in _CACHE.stats.items()}, "fares_size": len(_CACHE),
+        **{f"months_{k}": v for k, v in _MONTHS.stats.items()}, "months_size": len(_MONTHS),
+        **{f"flights_{k}": v for k, v in _FLIGHTS.stats.items()},
+    }
+
+
+def format_price(amount: int, currency: str) -> str:
+    """1234567, 'UZS' → '1 234 567 UZS'"""
+    return f"{amount:,}".replace(",", " ") + f" {currency}"
@@ -0,0 +1,162 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Union
+
+import aiohttp
+
+import config
+from utils.http import get_session
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+CACHE_PATH = BASE_DIR / 'data' / 'cities_remote.json'
+META_PATH = BASE_DIR / 'data' / 'cities_remote.meta.json'
+
+# Пауза после неудачной загрузки, чтобы промахи не долбили API
+RETRY_AFTER = 60  # сек
+
+_index: Optional[Dict[str, Tuple[int, str]]] = None  # имя → (позиция, IATA)
+_meta: dict = {}
+_inflight: Optional[asyncio.Task] = None
+_disk_task: Optional[asyncio.Task] = None
+_failed_at = 0.0
+
+UNAVAILABLE = object()  # find(): справочника нет (не загрузился, пауза RETRY_AFTER) — искать было негде
+
+
+def _build_index(cities: list) -> Dict[str, Tuple[int, str]]:
+    """Имя / переводы (lower) → (позиция города в списке, IATA)."""
+    index = {}
+    for pos, city in enumerate(cities):
+        code = city.get("code")
+        if not code:
+            continue
+        names = [city.get("name", "")]
+        names += list((city.get("name_translations") or {}).values())
+        for n in names:
+            if isinstance(n, str) and n:
+                index.setdefault(n.lower(), (pos, code))
+    return index
+
+
+def _load_cache() -> Optional[Tuple[dict, Dict[str, Tuple[int, str]]]]:
+    """Читает закэшированный справочник с диска (в потоке)."""
+    if not CACHE_PATH.exists():
+        return None
+    try:
+        meta = json.loads(META_PATH.read_text(encoding='utf-8')) if META_PATH.exists() else {}
+        with CACHE_PATH.open(encoding='utf-8') as f:
+            cities = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        logger.warning(f"[IATA-API] Кэш справочника повреждён: {e}")
+        return None
+    return meta, _build_index(cities)
+
+
+def _store_cache(body: bytes, meta: dict) -> Dict[str, Tuple[int, str]]:
+    """Атомарно сохраняет ответ API на диск и строит индекс (в потоке)."""
+    index = _build_index(json.loads(body))
+    CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp = CACHE_PATH.with_suffix('.tmp')
+    tmp.write_bytes(body)
+    os.replace(tmp, CACHE_PATH)
+    _store_meta(meta)
+    return index
+
+
+def _store_meta(meta: dict) -> None:
+    tmp = META_PATH.with_suffix('.tmp')
+    tmp.write_text(json.dumps(meta), encoding='utf-8')
+    os.replace(tmp, META_PATH)
+
+
+def _is_fresh() -> bool:
+    return time.time() - _meta.get("fetched_at", 0) < config.REMOTE_CITIES_TTL
+
+
+async def _fetch() -> None:
+    """
+    Скачивает справочник с ревалидацией по ETag / Last-Modified.
+    304 — продлеваем TTL без перекачки.
+    """
+    global _index, _meta, _failed_at
+    headers = {"X-Access-Token": config.TRAVELPAYOUTS_API_KEY}
+    if _index is not None and _meta.get("etag"):
+        headers["If-None-Match"] = _meta["etag"]
+    if _index is not None and _meta.get("last_modified"):
+        headers["If-Modified-Since"] = _meta["last_modified"]
+
+    try:
+        async with get_session().get(config.TRAVELPAYOUTS_DATA_URL, headers=headers) as resp:
+            if resp.status == 304:
+                _meta = {**_meta, "fetched_at": time.time()}
+                await asyncio.to_thread(_store_meta, _meta)
+                logger.info("[IATA-API] Справочник не изменился (304)")
+                return
+            if resp.status != 200:
+                logger.warning(f"[IATA] Ошибка ответа от API: {resp.status}")
+                _failed_at = time.monotonic()
+                return
+            body = await resp.read()
+            meta = {
+                "etag": resp.headers.get("ETag"),
+                "last_modified": resp.headers.get("Last-Modified"),
+                "fetched_at": time.time(),
+            }
+        _index = await asyncio.to_thread(_store_cache, body, meta)
+        _meta = meta
+        logger.info(f"[IATA-API] Справочник обновлён: {len(_index)} названий")
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError, OSError) as e:
+        logger.error(f"[IATA] Ошибка API: {e!r}")
+        _failed_at = time.monotonic()
+
+
+def _refresh() -> asyncio.Task:
+    """Одна загрузка на все одновременные промахи."""
+    global _inflight
+    if _inflight is None or _inflight.done():
+        _inflight = asyncio.create_task(_fetch())
+    return _inflight
+
+
+async def _read_disk() -> None:
+    global _index, _meta
+    cached = await asyncio.to_thread(_load_cache)
+    if cached and _index is None:
+        _meta, _index = cached
+
+
+async def _ensure_loaded() -> None:
+    global _disk_task
+    if _disk_task is None:
+        _disk_task = asyncio.create_task(_read_disk())
+    if not _disk_task.done():
+        await asyncio.shield(_disk_task)
+
+    if _index is not None and _is_fresh():
+        return
+    if time.monotonic() - _failed_at < RETRY_AFTER:
+        return
+
+    task = _refresh()
+    if _index is None:
+        # данных ещё нет — ждём загрузку (shield: отмена хэндлера не рвёт её)
+        await asyncio.shield(task)
+    # иначе отвечаем по устаревшему справочнику, обновление идёт в фоне
+
+
+async def find(name: str, translit_name: str) -> Union[str, None, object]:
+    """
+    IATA по имени или транслитерации из справочника API (с дисковым кэшем).
+    None — в справочнике нет; UNAVAILABLE — справочник не загружен.
+    """
+    await _ensure_loaded()
+    if _index is None:
+        return UNAVAILABLE
+    hits = [h for h in (_index.get(name), _index.get(translit_name)) if h]
+    return min(hits)[1] if hits else None
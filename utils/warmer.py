@@ -0,0 +1,230 @@
+"""
+Прогрев кэша цен для популярных направлений.
+
+Раз в interval секунд фоновая задача читает журнал кликов
+(data/user_logs.json вместе с архивами), находит top_n самых частых
+маршрутов за последние window_days дней и заранее загружает для них:
+• цены на конкретные даты, по которым недавно отправлялись ссылки
+  (link_sent) — их покажет экран проверки;
+• календари цен на ближайшие месяцы в обе стороны — для сетки дней.
+
+Запросов в апстрим за цикл — не больше budget, между ними пауза
+spacing; свежие записи (доживут до следующего цикла) не трогаем.
+Пока живой трафик выше pause_rate событий/с, прогрев стоит на паузе:
+апстрим в пик нужен пользователям.
+"""
+import asyncio
+import logging
+import re
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from utils import prices
+from utils.journal import iter_records
+
+logger = logging.getLogger(__name__)
+
+# /search/TAS2308MOW17092 → TAS, 23.08, MOW, 17.09, 2 взрослых (обратная дата необязательна)
+_SEARCH_PATH = re.compile(r"/search/([A-Z]{3})(\d{2})(\d{2})([A-Z]{3})(?:(\d{2})(\d{2}))?\d(?:\?|$)")
+
+
+class Trip(NamedTuple):
+    origin: str
+    destination: str
+    depart: str  # YYYY-MM-DD
+    ret: str = ""
+
+
+def _next_date(day: int, month: int, not_before: date) -> Optional[date]:
+    """Ближайшая дата dd.mm не раньше not_before (в ссылке год не пишется)."""
+    for year in (not_before.year, not_before.year + 1):
+        try:
+            d = date(year, month, day)
+        except ValueError:
+            continue
+        if d >= not_before:
+            return d
+    return None
+
+
+def parse_link(url: str, sent: date) -> Optional[Trip]:
+    m = _SEARCH_PATH.search(url)
+    if not m:
+        return None
+    origin, dd, mm, destination, rdd, rmm = m.groups()
+    dep = _next_date(int(dd), int(mm), sent)
+    if dep is None:
+        return None
+    ret = _next_date(int(rdd), int(rmm), dep) if rdd else None
+    return Trip(origin, destination, dep.isoformat(), ret.isoformat() if ret else "")
+
+
+def popular(path: Path, top_n: int, window_days: float) -> Tuple[List[Tuple[str, str]], List[Trip]]:
+    """
+    Популярные маршруты и поездки (маршрут + даты) из журнала кликов.
+
+    Маршрут — пара «origin → destination» одного пользователя (+1) или
+    отправленная ссылка (+2, поиск дошёл до конца). Поездки — из ссылок,
+    только с датой вылета не раньше сегодняшней, по убыванию частоты.
+    Работает потоково — вызывать в потоке (asyncio.to_thread).
+    """
+    since = (datetime.utcnow() - timedelta(days=window_days)).isoformat()
+    today = date.today()
+    routes: Counter = Counter()
+    trips: Counter = Counter()
+    last_origin: Dict[int, str] = {}
+    for rec in iter_records(path, include_rotated=True):
+        if rec.get("ts", "") < since:
+            continue
+        step, payload, user = rec.get("step"), rec.get("payload") or {}, rec.get("user_id")
+        if step == "origin":
+            # старые записи: {"origin": "TAS"}, новые: {"iata": "TAS"}
+            last_origin[user] = payload.get("iata") or payload.get("origin")
+        elif step == "destination" and last_origin.get(user):
+            dest = payload.get("iata") or payload.get("destination")
+            if dest:
+                routes[last_origin[user], dest] += 1
+        elif step == "link_sent":
+            trip = parse_link(payload.get("url", ""), date.fromisoformat(rec["ts"][:10]))
+            if trip is None:
+                continue
+            routes[trip.origin, trip.destination] += 2
+            if trip.depart >= today.isoformat():
+                trips[trip] += 1
+
+    top = [route for route, _ in routes.most_common(top_n)]
+    allowed = set(top)
+    return top, [t for t, _ in trips.most_common() if (t.origin, t.destination) in allowed]
+
+
+class CacheWarmer:
+    """
+    Фоновый прогрев (start/stop — хуки диспетчера, как у EventSink).
+
+    traffic — монотонный счётчик живых событий (например, emitted журнала
+    кликов): по его приросту считается текущая нагрузка.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        *,
+        traffic: Callable[[], int],
+        interval: float = 900,
+        top_n: int = 20,
+        window_days: float = 14,
+        months: int = 3,
+        trips_per_route: int = 3,
+        budget: int = 60,
+        spacing: float = 0.2,
+        pause_rate: float = 5.0,
+    ):
+        self.path = path
+        self.traffic = traffic
+        self.interval = interval
+        self.top_n = top_n
+        self.window_days = window_days
+        self.months = months
+        self.trips_per_route = trips_per_route
+        self.budget = budget
+        self.spacing = spacing
+        self.pause_rate = pause_rate
+        self.stats: Dict[str, int] = {
+            "cycles": 0, "warmed": 0, "fresh": 0, "paused": 0, "over_budget": 0, "failed": 0,
+        }
+        self._task: Optional[asyncio.Task] = None
+        self._mark: Tuple[float, int] = (time.monotonic(), 0)
+        self._rate: Optional[float] = None  # None — ещё не замеряли
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._mark = (time.monotonic(), self.traffic())
+        self._task = asyncio.create_task(self._run(), name="cache-warmer")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.cycle()
+            except Exception as e:  # прогрев — не повод ронять бота
+                logger.exception(f"[WARM] Цикл прогрева упал: {e}")
+            await asyncio.sleep(self.interval)
+
+    # ───── нагрузка ─────
+    def rate(self) -> float:
+        """Событий в секунду с прошлого замера (замер сдвигается не чаще раза в секунду)."""
+        now, count = time.monotonic(), self.traffic()
+        then, before = self._mark
+        if now - then < 1.0:
+            return self._rate or 0.0
+        self._rate = (count - before) / (now - then)
+        self._mark = (now, count)
+        return self._rate
+
+    async def _wait_quiet(self) -> None:
+        if self._rate is None:  # до первого полного замера нагрузку не знаем — ждём его
+            await asyncio.sleep(max(0.0, 1.0 - (time.monotonic() - self._mark[0])))
+        paused = False
+        while self.rate() > self.pause_rate:
+            if not paused:
+                paused = True
+                self.stats["paused"] += 1
+                logger.info(f"[WARM] Пауза: трафик {self._rate:.1f} соб/с > {self.pause_rate}")
+            await asyncio.sleep(1.0)
+
+    # ───── цикл ─────
+    def plan(self, routes: List[Tuple[str, str]], trips: List[Trip]) -> List[Tuple[str, tuple]]:
+        """Задания по убыванию популярности маршрута: поездки, затем календари туда/обратно."""
+        by_route: Dict[Tuple[str, str], List[Trip]] = {}
+        for trip in trips:
+            by_route.setdefault((trip.origin, trip.destination), []).append(trip)
+        today = date.today()
+        months = [((today.month - 1 + i) // 12 + today.year, (today.month - 1 + i) % 12 + 1)
+                  for i in range(self.months)]
+        jobs: List[Tuple[str, tuple]] = []
+        for origin, destination in routes:
+            jobs += [("fare", tuple(t)) for t in by_route.get((origin, destination), [])[:self.trips_per_route]]
+            jobs += [("month", (origin, destination, y, m)) for y, m in months]
+            jobs += [("month", (destination, origin, y, m)) for y, m in months]
+        return jobs
+
+    async def cycle(self) -> None:
+        self.stats["cycles"] += 1
+        routes, trips = await asyncio.to_thread(popular, self.path, self.top_n, self.window_days)
+        jobs = self.plan(routes, trips)
+        spent = 0
+        for kind, args in jobs:
+            fresh = prices.fresh_for(*args) if kind == "fare" else prices.month_fresh_for(*args)
+            if fresh > self.interval:  # доживёт до следующего цикла
+                self.stats["fresh"] += 1
+                continue
+            if spent >= self.budget:
+                self.stats["over_budget"] += 1
+                continue
+            await self._wait_quiet()
+            spent += 1
+            fetch: Callable[..., Awaitable] = prices.refresh if kind == "fare" else prices.refresh_month
+            before = prices.stats["errors"]
+            await fetch(*args)
+            self.stats["failed" if prices.stats["errors"] > before else "warmed"] += 1
+            await asyncio.sleep(self.spacing)
+        logger.info(
+            f"[WARM] Цикл: маршрутов {len(routes)}, заданий {len(jobs)}, запросов {spent}/{self.budget}"
+        )
@@ -0,0 +1,152 @@
+import asyncio
+import logging
+import secrets
+import time
+from typing import Any, Dict, Optional, Set
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+import config
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class BoundedRequestHandler(SimpleRequestHandler):
+    """
+    Приём апдейтов через вебхук с ограничением параллелизма.
+
+    Ответ 200 отдаётся сразу, обработка идёт фоновой задачей. Одновременно
+    в обработке не больше max_concurrency апдейтов; когда все слоты
+    заняты, ответ Telegram придерживается до освобождения слота — это
+    естественный backpressure (Telegram не шлёт больше max_connections
+    запросов параллельно). Неверный X-Telegram-Bot-Api-Secret-Token → 401.
+    """
+
+    def __init__(
+        self,
+        dispatcher: Dispatcher,
+        bot: Bot,
+        *,
+        max_concurrency: int = 64,
+        secret_token: Optional[str] = None,
+        drain_timeout: float = 10.0,
+        **data: Any,
+    ):
+        super().__init__(dispatcher, bot, handle_in_background=True, secret_token=secret_token, **data)
+        self.max_concurrency = max_concurrency
+        self.drain_timeout = drain_timeout
+        self.stats: Dict[str, int] = {"received": 0, "rejected": 0, "waited": 0, "failed": 0, "peak": 0}
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._tasks: Set[asyncio.Task] = set()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        response = await super().handle(request)
+        if response.status == 401:
+            self.stats["rejected"] += 1
+        return response
+
+    async def _handle_request_background(self, bot: Bot, request: web.Request) -> web.Response:
+        update = await request.json(loads=bot.session.json_loads)
+        self.stats["received"] += 1
+        if self._slots.locked():
+            self.stats["waited"] += 1
+        await self._slots.acquire()
+        task = asyncio.create_task(self._process(bot, update))
+        self._tasks.add(task)
+        self.stats["peak"] = max(self.stats["peak"], len(self._tasks))
+        task.add_done_callback(self._release)
+        return web.json_response({}, dumps=bot.session.json_dumps)
+
+    async def _process(self, bot: Bot, update: Dict[str, Any]) -> None:
+        try:
+            await self._background_feed_update(bot=bot, update=update)
+        except Exception as e:
+            self.stats["failed"] += 1
+            logger.exception(f"[HOOK] Ошибка обработки апдейта {update.get('update_id')}: {e}")
+
+    def _release(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        self._slots.release()
+
+    async def close(self) -> None:
+        """Дожидается апдейтов в обработке (не дольше drain_timeout), затем закрывает сессию бота."""
+        if self._tasks:
+            logger.info(f"[HOOK] Дожидаемся {len(self._tasks)} апдейтов в обработке")
+            _, pending = await asyncio.wait(set(self._tasks), timeout=self.drain_timeout)
+            for task in pending:
+                task.cancel()
+        await super().close()
+
+
+WEBHOOK_HANDLER = web.AppKey("webhook_handler", BoundedRequestHandler)
+
+
+def make_webhook_app(dp: Dispatcher, bot: Bot, *, secret_token: Optional[str] = None) -> web.Application:
+    """
+    aiohttp-приложение с вебхуком на config.WEBHOOK_PATH.
+
+    Если задан config.WEBHOOK_BASE_URL, на старте вызывается setWebhook
+    (секрет по умолчанию — случайный на каждый запуск); без него вебхук
+    считается настроенным снаружи (reverse proxy, тесты).
+    """
+    if secret_token is None:
+        secret_token = config.WEBHOOK_SECRET or (secrets.token_urlsafe(32) if config.WEBHOOK_BASE_URL else None)
+    if not secret_token:
+        logger.warning("[HOOK] WEBHOOK_SECRET не задан — заголовок секрета не проверяется")
+
+    app = web.Application()
+    handler = BoundedRequestHandler(
+        dp, bot,
+        max_concurrency=config.WEBHOOK_MAX_CONCURRENCY,
+        secret_token=secret_token,
+    )
+    handler.register(app, path=config.WEBHOOK_PATH)
+    app[WEBHOOK_HANDLER] = handler
+    if config.METRICS:
+        metrics.watch(
+            "webhook", "Вебхук: принято, отклонено, ждали слот, в обработке",
+            lambda: {**handler.stats, "in_flight": handler.in_flight},
+        )
+
+    async def set_webhook(bot: Bot, dispatcher: Dispatcher) -> None:
+        if not config.WEBHOOK_BASE_URL:
+            return
+        url = config.WEBHOOK_BASE_URL.rstrip("/") + config.WEBHOOK_PATH
+        await bot.set_webhook(
+            url,
+            secret_token=secret_token,
+            max_connections=config.WEBHOOK_MAX_CONNECTIONS,
+            allowed_updates=dispatcher.resolve_used_update_types(),
+            drop_pending_updates=True,
+        )
+        logger.info(f"[HOOK] Вебхук установлен: {url}")
+
+    dp.startup.register(set_webhook)
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+async def serve(app: web.Application, host: str, port: int) -> None:
+    """Поднимает приложение и держит его до отмены (Ctrl+C)."""
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    logger.info(f"[HOOK] Слушаю http://{host}:{port}{config.WEBHOOK_PATH}")
+    started = time.monotonic()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        handler = app.get(WEBHOOK_HANDLER)
+        logger.info(
+            f"[HOOK] Остановка через {time.monotonic() - started:.0f} с"
+            + (f", статистика: {handler.stats}" if handler else "")
+        )
+        await runner.cleanup()
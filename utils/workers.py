@@ -0,0 +1,295 @@
+import asyncio
+import logging
+import multiprocessing as mp
+import queue
+import secrets
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from aiogram import Bot
+from aiohttp import web
+
+import config
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+_ctx = mp.get_context("spawn")  # без fork: у родителя уже есть потоки и открытые сокеты
+_STOP = None  # сигнал воркеру завершиться
+
+
+def shard_key(update: Dict[str, Any]) -> int:
+    """user_id отправителя апдейта (или id чата); 0 — если апдейт ни к кому не относится."""
+    for field, event in update.items():
+        if field == "update_id" or not isinstance(event, dict):
+            continue
+        user = event.get("from") or event.get("user") or {}
+        if "id" in user:
+            return user["id"]
+        chat = event.get("chat") or (event.get("message") or {}).get("chat") or {}
+        if "id" in chat:
+            return chat["id"]
+    return 0
+
+
+def _qsize(q: Any) -> int:
+    try:
+        return q.qsize()
+    except NotImplementedError:  # macOS
+        return 0
+
+
+# ─────────────────────────────────────────────
+#                   Воркер
+# ─────────────────────────────────────────────
+def worker_main(
+    index: int,
+    n: int,
+    updates: "mp.Queue",
+    heartbeat: "mp.Value",
+    token: str,
+    api_base: str,
+    initializer: Optional[Callable] = None,
+    initargs: Tuple = (),
+) -> None:
+    """Точка входа процесса-воркера: свой Dispatcher, апдейты — из очереди."""
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f"%(asctime)s [%(levelname)s] [w{index}] %(message)s",
+    )
+    if initializer is not None:
+        initializer(*initargs)
+    asyncio.run(_worker_loop(index, n, updates, heartbeat, token, api_base))
+
+
+async def _worker_loop(index: int, n: int, updates: "mp.Queue", heartbeat: "mp.Value", token: str, api_base: str) -> None:
+    from bot import make_bot, make_dispatcher, make_storage
+
+    metrics.port = config.METRICS_PORT + 1 + index  # порт METRICS_PORT — у супервизора
+    bot = make_bot(api_base, token=token)
+    dp = make_dispatcher(make_storage(), workers=n)  # бюджет прогрева — на всех воркеров
+    await dp.emit_startup(bot=bot, dispatcher=dp)
+
+    async def beat():
+        while True:
+            heartbeat.value = time.time()
+            await asyncio.sleep(1)
+
+    beat_task = asyncio.create_task(beat())
+    slots = asyncio.Semaphore(config.WORKER_MAX_CONCURRENCY)
+    tasks: set = set()
+
+    async def process(update: Dict[str, Any]) -> None:
+        try:
+            await dp.feed_raw_update(bot, update)
+        except Exception as e:
+            logger.exception(f"[WORKER] Ошибка обработки апдейта {update.get('update_id')}: {e}")
+        finally:
+            slots.release()
+
+    logger.info(f"[WORKER] Воркер {index} готов")
+    try:
+        while True:
+            try:
+                update = await asyncio.to_thread(updates.get, True, 1.0)
+            except queue.Empty:
+                continue
+            if update is _STOP:
+                break
+            await slots.acquire()
+            task = asyncio.create_task(process(update))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+    finally:
+        if tasks:
+            await asyncio.wait(tasks, timeout=10)
+        beat_task.cancel()
+        await dp.emit_shutdown(bot=bot, dispatcher=dp)
+        await bot.session.close()
+        logger.info(f"[WORKER] Воркер {index} остановлен")
+
+
+# ─────────────────────────────────────────────
+#                  Супервизор
+# ─────────────────────────────────────────────
+@dataclass
+class _Worker:
+    index: int
+    updates: Any  # mp.Queue входящих апдейтов
+    heartbeat: Any  # mp.Value('d'): время последнего «пульса» event loop воркера
+    process: Optional[mp.Process] = None
+    started: float = 0.0
+    restarts: int = 0
+    retry_at: float = 0.0
+
+
+class Supervisor:
+    """
+    Запускает n процессов-воркеров и раскладывает по ним апдейты по user_id:
+    все апдейты одного пользователя (и его FSM-сценарий) попадают в один
+    воркер, а разные пользователи распределяются по ядрам.
+
+    Раз в секунду проверяет здоровье: упавший процесс или воркер, чей
+    event loop не подавал «пульс» дольше health_timeout секунд,
+    перезапускается (с нарастающей паузой при повторных падениях).
+    """
+
+    def __init__(
+        self,
+        n: int,
+        token: str,
+        *,
+        api_base: str = "",
+        health_timeout: float = 10.0,
+        start_timeout: float = 60.0,
+        queue_size: int = 1000,
+        initializer: Optional[Callable] = None,
+        initargs: Tuple = (),
+    ):
+        self.n = n
+        self.token = token
+        self.api_base = api_base
+        self.health_timeout = health_timeout
+        self.start_timeout = start_timeout  # импорт + загрузка справочника до первого «пульса»
+        self.queue_size = queue_size
+        self.initializer = initializer  # как у multiprocessing.Pool: вызывается в воркере до старта
+        self.initargs = initargs
+        self.stats: Dict[str, int] = {"routed": 0, "restarts": 0, "full": 0}
+        self.workers: List[_Worker] = [
+            _Worker(i, _ctx.Queue(queue_size), _ctx.Value("d", 0.0, lock=False)) for i in range(n)
+        ]
+        self._monitor: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        for w in self.workers:
+            self._spawn(w)
+        self._monitor = asyncio.create_task(self._watch(), name="supervisor-watch")
+
+    def _spawn(self, w: _Worker) -> None:
+        if w.process is not None:
+            # убитый воркер мог держать блокировку чтения очереди — берём новую;
+            # то, что в старой не успели забрать, теряется
+            lost = _qsize(w.updates)
+            if lost:
+                logger.warning(f"[SUPER] Воркер {w.index}: потеряно апдейтов в очереди: {lost}")
+            w.updates.close()
+            w.updates = _ctx.Queue(self.queue_size)
+        w.heartbeat.value = 0.0
+        w.process = _ctx.Process(
+            target=worker_main,
+            args=(w.index, self.n, w.updates, w.heartbeat, self.token, self.api_base, self.initializer, self.initargs),
+            name=f"bot-worker-{w.index}",
+            daemon=True,
+        )
+        w.process.start()
+        w.started = time.time()
+
+    def ready(self) -> bool:
+        """Все воркеры подали хотя бы один «пульс»."""
+        return all(w.heartbeat.value for w in self.workers)
+
+    def healthy(self, w: _Worker) -> bool:
+        if w.process is None or not w.process.is_alive():
+            return False
+        if not w.heartbeat.value:
+            return time.time() - w.started < self.start_timeout
+        return time.time() - w.heartbeat.value < self.health_timeout
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(1)
+            now = time.time()
+            for w in self.workers:
+                if w.retry_at:
+                    if now >= w.retry_at:
+                        w.retry_at = 0.0
+                        self._spawn(w)
+                        self.stats["restarts"] += 1
+                    continue
+                if self.healthy(w):
+                    continue
+                code = w.process.exitcode if w.process else None
+                if w.process is not None and w.process.is_alive():
+                    w.process.kill()  # завис: процесс жив, но loop не отвечает
+                    await asyncio.to_thread(w.process.join, 5)
+                # падения подряд (прожил меньше минуты) — пауза 0, 1, 3, 7 … 30 с
+                w.restarts = w.restarts + 1 if now - w.started < 60 else 0
+                delay = min(30, 2 ** w.restarts - 1)
+                logger.error(f"[SUPER] Воркер {w.index} нездоров (exitcode={code}), перезапуск через {delay} с")
+                w.retry_at = now + delay
+
+    async def route(self, update: Dict[str, Any]) -> None:
+        """Кладёт апдейт в очередь воркера; если очередь полна — ждёт (backpressure)."""
+        w = self.workers[shard_key(update) % self.n]
+        while True:
+            try:
+                w.updates.put_nowait(update)
+                break
+            except queue.Full:
+                self.stats["full"] += 1
+                await asyncio.sleep(0.01)
+        self.stats["routed"] += 1
+
+    async def stop(self, timeout: float = 15.0) -> None:
+        if self._monitor is not None:
+            self._monitor.cancel()
+        deadline = time.monotonic() + timeout
+        # put ждёт, пока в полной очереди освободится место, — в потоках, чтобы не встал event loop
+        sent = await asyncio.gather(
+            *(asyncio.to_thread(w.updates.put, _STOP, True, timeout) for w in self.workers),
+            return_exceptions=True,
+        )
+        for w, result in zip(self.workers, sent):
+            if isinstance(result, queue.Full):
+                logger.warning(f"[SUPER] Воркер {w.index} не разобрал очередь за {timeout} с — будет остановлен принудительно")
+        for w in self.workers:
+            if w.process is None:
+                continue
+            await asyncio.to_thread(w.process.join, max(0.0, deadline - time.monotonic()))
+            if w.process.is_alive():
+                w.process.kill()
+        logger.info(f"[SUPER] Остановлен, статистика: {self.stats}")
+
+    # ───── приём апдейтов ─────
+    async def poll(self, bot: Bot) -> None:
+        """Long polling в супервизоре: апдейты не обрабатываются, а раздаются воркерам."""
+        await bot.delete_webhook(drop_pending_updates=True)
+        offset = None
+        while True:
+            try:
+                updates = await bot.get_updates(offset=offset, timeout=30)
+            except Exception as e:
+                logger.error(f"[SUPER] getUpdates: {e}")
+                await asyncio.sleep(1)
+                continue
+            for update in updates:
+                offset = update.update_id + 1
+                await self.route(update.model_dump(mode="json", by_alias=True, exclude_none=True))
+
+    def webhook_app(self, bot: Bot) -> web.Application:
+        """Вебхук-приёмник супервизора: проверка секрета и раздача апдейтов воркерам."""
+        secret = config.WEBHOOK_SECRET or (secrets.token_urlsafe(32) if config.WEBHOOK_BASE_URL else "")
+
+        async def handle(request: web.Request) -> web.Response:
+            token = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+            if secret and not secrets.compare_digest(token, secret):
+                return web.Response(body="Unauthorized", status=401)
+            await self.route(await request.json())
+            return web.json_response({})
+
+        async def set_webhook(app: web.Application) -> None:
+            if config.WEBHOOK_BASE_URL:
+                url = config.WEBHOOK_BASE_URL.rstrip("/") + config.WEBHOOK_PATH
+                await bot.set_webhook(
+                    url,
+                    secret_token=secret,
+                    max_connections=config.WEBHOOK_MAX_CONNECTIONS,
+                    drop_pending_updates=True,
+                )
+                logger.info(f"[SUPER] Вебхук установлен: {url}")
+
+        app = web.Application()
+        app.router.add_post(config.WEBHOOK_PATH, handle)
+        app.on_startup.append(set_webhook)
+        return app